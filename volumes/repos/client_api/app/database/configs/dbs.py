@@ -1,8 +1,18 @@
 import logging
+import os
 from functools import lru_cache
-from redis_om import get_redis_connection
-from sqlalchemy import create_engine, Engine
-from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator, Iterator
+from redis import asyncio as redis_asyncio
+from sqlalchemy import create_engine, Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker, Session
+from app.database.configs.pool_metrics import attach_pool_metrics, TimedQueuePool, TimedAsyncAdaptedQueuePool
+from app.database.configs.query_timing import attach_query_timing
+from app.database.configs.redis_timing import TimedRedis
+from app.database.configs.replicas import (
+    attach_read_your_writes, register_replica_set, Replica, ReplicaRoutingSession, ReplicaSet,
+)
+from app.database.configs.statement_timeout import attach_statement_timeout
 from config import get_app_env_config
 
 
@@ -23,11 +33,40 @@ def get_redis_cache():
     # Note: Indexing only works for data stored in Redis logical database 0. If you are using a
     # different database number when connecting to Redis, you can expect the code to raise a
     # MigrationError when you run the migrator.
-    return get_redis_connection(
-        # url=f"{app_env_config.REDIS_CACHE_DRIVERNAME}://{app_env_config.REDIS_CACHE_USERNAME}:{app_env_config.REDIS_CACHE_PASSWORD.get_secret_value()}@{app_env_config.REDIS_CACHE_HOST}:{app_env_config.REDIS_CACHE_PORT}",
-        db=app_env_config.REDIS_CACHE_PRIMARY_DB,
-        encoding="utf8",
-    )
+    # Built like redis_om's get_redis_connection, but with a client that times its commands
+    # url=f"{app_env_config.REDIS_CACHE_DRIVERNAME}://{app_env_config.REDIS_CACHE_USERNAME}:{app_env_config.REDIS_CACHE_PASSWORD.get_secret_value()}@{app_env_config.REDIS_CACHE_HOST}:{app_env_config.REDIS_CACHE_PORT}",
+    kwargs = {
+        "db": app_env_config.REDIS_CACHE_PRIMARY_DB,
+        "encoding": "utf8",
+        "decode_responses": True,
+    }
+    url = os.environ.get("REDIS_OM_URL")
+    if url:
+        return TimedRedis.from_url(url, **kwargs)
+
+    return TimedRedis(**kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_redis_rate_limit() -> redis_asyncio.Redis:
+    """
+    Retrieving the asyncio redis connection of the rate limiter, to the cache's server.
+    Every request waits on it before anything else runs, so it never blocks the event
+    loop, and gives up after APP_RATE_LIMIT_REDIS_TIMEOUT_SECONDS for the limiter to fail open.
+    :return: redis.asyncio.Redis
+    """
+    kwargs = {
+        "db": app_env_config.REDIS_CACHE_PRIMARY_DB,
+        "encoding": "utf8",
+        "decode_responses": True,
+        "socket_timeout": app_env_config.APP_RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+        "socket_connect_timeout": app_env_config.APP_RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+    }
+    url = os.environ.get("REDIS_OM_URL")
+    if url:
+        return redis_asyncio.Redis.from_url(url, **kwargs)
+
+    return redis_asyncio.Redis(**kwargs)
 
 
 # MySQL
@@ -35,56 +74,258 @@ def get_redis_cache():
 def get_mysql_db_engine()-> Engine:
     """
     Retrieving the MySQL db engine.
+    The engine owns the connection pool and is shared by the whole process.
     :return: Engine - sqlalchemy.engine.Engine
     """
     log.debug("Retrieving the MySQL db engine.")
-    return create_engine(
+    engine = create_engine(
         f"{app_env_config.MYSQLDB_DRIVERNAME}://{app_env_config.MYSQLDB_USERNAME}:{app_env_config.MYSQLDB_PASSWORD.get_secret_value()}@{app_env_config.MYSQLDB_HOST}:{app_env_config.MYSQLDB_PORT}/{app_env_config.MYSQLDB_DATABASE}",
         echo=app_env_config.MYSQLDB_ECHO_LOG_LEVEL,
-        future=app_env_config.MYSQLDB_FUTURE
+        future=app_env_config.MYSQLDB_FUTURE,
+        poolclass=TimedQueuePool,
+        pool_size=app_env_config.MYSQLDB_POOL_SIZE,
+        max_overflow=app_env_config.MYSQLDB_MAX_OVERFLOW,
+        pool_timeout=app_env_config.MYSQLDB_POOL_TIMEOUT,
+        pool_recycle=app_env_config.MYSQLDB_POOL_RECYCLE,
+        pool_pre_ping=app_env_config.MYSQLDB_POOL_PRE_PING,
     )
+    attach_pool_metrics("mysql", engine)
+    attach_query_timing(engine)
+
+    return engine
 
 @lru_cache(maxsize=None)
-def get_mysql_db():
+def get_mysql_db_sessionmaker() -> sessionmaker[Session]:
     """
-    Retrieving the mysql db connection.
-    :return: A SqlAlchemy Session - sqlalchemy.orm.session.sessionmaker
+    Retrieving the mysql session factory.
+    :return: sessionmaker - sqlalchemy.orm.session.sessionmaker
     """
-    log.debug("Retrieving the MySQL db session.")
-    mysql_session = sessionmaker(
+    log.debug("Retrieving the MySQL db session factory.")
+    return sessionmaker(
         bind=get_mysql_db_engine(),
         autocommit=app_env_config.MYSQLDB_SESSION_AUTOCOMMIT,
         autoflush=app_env_config.MYSQLDB_SESSION_AUTOFLUSH,
     )
 
-    return mysql_session()
+def get_mysql_db() -> Session:
+    """
+    Retrieving a new mysql db session. The caller owns it and must close it.
+    Use get_mysql_db_session as a FastAPI dependency instead.
+    :return: A SqlAlchemy Session - sqlalchemy.orm.session.Session
+    """
+    log.debug("Retrieving the MySQL db session.")
+    return get_mysql_db_sessionmaker()()
+
+def get_mysql_db_session() -> Iterator[Session]:
+    """
+    FastAPI dependency yielding a pooled mysql session for the duration of a request.
+    :return: A SqlAlchemy Session - sqlalchemy.orm.session.Session
+    """
+    with get_mysql_db_sessionmaker()() as mysql_session:
+        yield mysql_session
 
 
 # Postgres
+class PostgresSyncSession(ReplicaRoutingSession):
+    """
+    The Session of the postgres session factory, routing the reads marked for it to the replicas.
+    """
+
+
 @lru_cache(maxsize=None)
 def get_postgres_db_engine()-> Engine:
     """
     Retrieving the postgres db engine.
+    The engine owns the connection pool and is shared by the whole process.
     :return: Engine - sqlalchemy.engine.Engine
     """
     log.debug("Retrieving the postgres db engine.")
-    return create_engine(
+    engine = create_engine(
         f"{app_env_config.POSTGRESDB_DRIVERNAME}://{app_env_config.POSTGRESDB_USERNAME}:{app_env_config.POSTGRESDB_PASSWORD.get_secret_value()}@{app_env_config.POSTGRESDB_HOST}:{app_env_config.POSTGRESDB_PORT}/{app_env_config.POSTGRESDB_DATABASE}",
         echo=app_env_config.POSTGRESDB_ECHO_LOG_LEVEL,
-        future=app_env_config.POSTGRESDB_FUTURE
+        future=app_env_config.POSTGRESDB_FUTURE,
+        poolclass=TimedQueuePool,
+        pool_size=app_env_config.POSTGRESDB_POOL_SIZE,
+        max_overflow=app_env_config.POSTGRESDB_MAX_OVERFLOW,
+        pool_timeout=app_env_config.POSTGRESDB_POOL_TIMEOUT,
+        pool_recycle=app_env_config.POSTGRESDB_POOL_RECYCLE,
+        pool_pre_ping=app_env_config.POSTGRESDB_POOL_PRE_PING,
+        query_cache_size=app_env_config.POSTGRESDB_QUERY_CACHE_SIZE,
     )
+    attach_pool_metrics("postgres", engine)
+    attach_query_timing(engine)
+
+    return engine
 
 @lru_cache(maxsize=None)
-def get_postgres_db():
+def get_postgres_db_replicas() -> ReplicaSet | None:
     """
-    Retrieving the postgres db session.
-    :return: A SqlAlchemy Session - sqlalchemy.orm.session.sessionmaker
+    Retrieving the postgres read replicas, one engine and pool each, set up like the primary's.
+    :return: ReplicaSet - None when no replica is configured
     """
-    log.debug("Retrieving the postgres db session.")
-    postgres_session = sessionmaker(
+    if not app_env_config.POSTGRESDB_REPLICA_DSNS:
+        return None
+
+    log.debug("Retrieving the postgres db replicas.")
+    replicas = []
+    for index, dsn in enumerate(app_env_config.POSTGRESDB_REPLICA_DSNS):
+        engine = create_engine(
+            make_url(dsn.get_secret_value()).set(drivername=app_env_config.POSTGRESDB_DRIVERNAME),
+            echo=app_env_config.POSTGRESDB_ECHO_LOG_LEVEL,
+            future=app_env_config.POSTGRESDB_FUTURE,
+            poolclass=TimedQueuePool,
+            pool_size=app_env_config.POSTGRESDB_POOL_SIZE,
+            max_overflow=app_env_config.POSTGRESDB_MAX_OVERFLOW,
+            pool_timeout=app_env_config.POSTGRESDB_POOL_TIMEOUT,
+            pool_recycle=app_env_config.POSTGRESDB_POOL_RECYCLE,
+            pool_pre_ping=app_env_config.POSTGRESDB_POOL_PRE_PING,
+            query_cache_size=app_env_config.POSTGRESDB_QUERY_CACHE_SIZE,
+        )
+        attach_pool_metrics(f"postgres_replica_{index}", engine)
+        attach_query_timing(engine)
+        replicas.append(Replica(f"replica_{index}", engine))
+
+    return register_replica_set(ReplicaSet(
+        "postgres",
+        replicas,
+        app_env_config.POSTGRESDB_REPLICA_SELECTION,
+        app_env_config.POSTGRESDB_REPLICA_MAX_LAG_SECONDS,
+    ))
+
+@lru_cache(maxsize=None)
+def get_postgres_db_sessionmaker() -> sessionmaker[Session]:
+    """
+    Retrieving the postgres session factory.
+    Reads marked with the read_replica execution option go to the replicas, when there are any.
+    :return: sessionmaker - sqlalchemy.orm.session.sessionmaker
+    """
+    log.debug("Retrieving the postgres db session factory.")
+    PostgresSyncSession.replicas = get_postgres_db_replicas()
+    if PostgresSyncSession.replicas is not None:
+        attach_read_your_writes(PostgresSyncSession, app_env_config.POSTGRESDB_REPLICA_STICKY_SECONDS)
+
+    return sessionmaker(
         bind=get_postgres_db_engine(),
         autocommit=app_env_config.POSTGRESDB_SESSION_AUTOCOMMIT,
         autoflush=app_env_config.POSTGRESDB_SESSION_AUTOFLUSH,
+        class_=PostgresSyncSession,
     )
 
-    return postgres_session()
+def get_postgres_db() -> Session:
+    """
+    Retrieving a new postgres db session. The caller owns it and must close it.
+    Use get_postgres_db_session as a FastAPI dependency instead.
+    :return: A SqlAlchemy Session - sqlalchemy.orm.session.Session
+    """
+    log.debug("Retrieving the postgres db session.")
+    return get_postgres_db_sessionmaker()()
+
+def get_postgres_db_session() -> Iterator[Session]:
+    """
+    FastAPI dependency yielding a pooled postgres session for the duration of a request.
+    :return: A SqlAlchemy Session - sqlalchemy.orm.session.Session
+    """
+    with get_postgres_db_sessionmaker()() as postgres_session:
+        yield postgres_session
+
+
+# Postgres (async)
+class PostgresAsyncSyncSession(ReplicaRoutingSession):
+    """
+    The Session every async postgres session runs on, so session events can target them alone.
+    It routes the reads marked for them to the replicas.
+    """
+
+
+@lru_cache(maxsize=None)
+def get_postgres_async_db_engine() -> AsyncEngine:
+    """
+    Retrieving the async postgres db engine (asyncpg driver).
+    asyncpg prepares every statement on the server once per connection and keeps the
+    POSTGRESDB_ASYNC_PREPARED_STATEMENT_CACHE_SIZE most recent, so hot queries skip parsing and planning.
+    :return: AsyncEngine - sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    log.debug("Retrieving the async postgres db engine.")
+    engine = create_async_engine(
+        f"{app_env_config.POSTGRESDB_ASYNC_DRIVERNAME}://{app_env_config.POSTGRESDB_USERNAME}:{app_env_config.POSTGRESDB_PASSWORD.get_secret_value()}@{app_env_config.POSTGRESDB_HOST}:{app_env_config.POSTGRESDB_PORT}/{app_env_config.POSTGRESDB_DATABASE}",
+        echo=app_env_config.POSTGRESDB_ECHO_LOG_LEVEL,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=app_env_config.POSTGRESDB_POOL_SIZE,
+        max_overflow=app_env_config.POSTGRESDB_MAX_OVERFLOW,
+        pool_timeout=app_env_config.POSTGRESDB_POOL_TIMEOUT,
+        pool_recycle=app_env_config.POSTGRESDB_POOL_RECYCLE,
+        pool_pre_ping=app_env_config.POSTGRESDB_POOL_PRE_PING,
+        query_cache_size=app_env_config.POSTGRESDB_QUERY_CACHE_SIZE,
+        connect_args={"prepared_statement_cache_size": app_env_config.POSTGRESDB_ASYNC_PREPARED_STATEMENT_CACHE_SIZE},
+    )
+    attach_pool_metrics("postgres_async", engine.sync_engine)
+    attach_query_timing(engine.sync_engine)
+
+    return engine
+
+@lru_cache(maxsize=None)
+def get_postgres_async_db_replicas() -> ReplicaSet | None:
+    """
+    Retrieving the async postgres read replicas, one engine and pool each, set up like the primary's.
+    :return: ReplicaSet - None when no replica is configured
+    """
+    if not app_env_config.POSTGRESDB_REPLICA_DSNS:
+        return None
+
+    log.debug("Retrieving the async postgres db replicas.")
+    replicas = []
+    for index, dsn in enumerate(app_env_config.POSTGRESDB_REPLICA_DSNS):
+        engine = create_async_engine(
+            make_url(dsn.get_secret_value()).set(drivername=app_env_config.POSTGRESDB_ASYNC_DRIVERNAME),
+            echo=app_env_config.POSTGRESDB_ECHO_LOG_LEVEL,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            pool_size=app_env_config.POSTGRESDB_POOL_SIZE,
+            max_overflow=app_env_config.POSTGRESDB_MAX_OVERFLOW,
+            pool_timeout=app_env_config.POSTGRESDB_POOL_TIMEOUT,
+            pool_recycle=app_env_config.POSTGRESDB_POOL_RECYCLE,
+            pool_pre_ping=app_env_config.POSTGRESDB_POOL_PRE_PING,
+            query_cache_size=app_env_config.POSTGRESDB_QUERY_CACHE_SIZE,
+            connect_args={"prepared_statement_cache_size": app_env_config.POSTGRESDB_ASYNC_PREPARED_STATEMENT_CACHE_SIZE},
+        )
+        attach_pool_metrics(f"postgres_async_replica_{index}", engine.sync_engine)
+        attach_query_timing(engine.sync_engine)
+        replicas.append(Replica(f"replica_{index}", engine))
+
+    return register_replica_set(ReplicaSet(
+        "postgres_async",
+        replicas,
+        app_env_config.POSTGRESDB_REPLICA_SELECTION,
+        app_env_config.POSTGRESDB_REPLICA_MAX_LAG_SECONDS,
+    ))
+
+@lru_cache(maxsize=None)
+def get_postgres_async_db_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """
+    Retrieving the async postgres session factory.
+    expire_on_commit is off because attributes cannot be lazy loaded
+    on an AsyncSession once a commit has expired them.
+    Transactions begun during a request get a statement_timeout of the request's remaining deadline.
+    Reads marked with the read_replica execution option go to the replicas, when there are any.
+    :return: async_sessionmaker - sqlalchemy.ext.asyncio.async_sessionmaker
+    """
+    log.debug("Retrieving the async postgres db session factory.")
+    attach_statement_timeout(PostgresAsyncSyncSession)
+    PostgresAsyncSyncSession.replicas = get_postgres_async_db_replicas()
+    if PostgresAsyncSyncSession.replicas is not None:
+        attach_read_your_writes(PostgresAsyncSyncSession, app_env_config.POSTGRESDB_REPLICA_STICKY_SECONDS)
+
+    return async_sessionmaker(
+        bind=get_postgres_async_db_engine(),
+        autoflush=app_env_config.POSTGRESDB_SESSION_AUTOFLUSH,
+        expire_on_commit=False,
+        sync_session_class=PostgresAsyncSyncSession,
+    )
+
+async def get_postgres_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency yielding an async postgres session for the duration of a request.
+    An AsyncSession must never be shared between concurrent requests.
+    :return: AsyncSession - sqlalchemy.ext.asyncio.AsyncSession
+    """
+    async with get_postgres_async_db_sessionmaker()() as postgres_session:
+        yield postgres_session
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from sqlalchemy import event, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+from app.library.Metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_CONNECTIONS, DB_POOL_EVENTS
+
+
+log = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """
+    Checkout/checkin counters and checkout wait times for one engine's connection pool.
+    Used to size pool_size/max_overflow under load. Everything is also exported to Prometheus.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.pool: Pool | None = None
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+        DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(seconds)
+
+    def record_timeout(self, seconds: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += seconds
+        DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(seconds)
+        DB_POOL_EVENTS.labels(self.name, "timeouts").inc()
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        DB_POOL_EVENTS.labels(self.name, counter).inc()
+
+    def update_connection_gauges(self) -> None:
+        if isinstance(self.pool, QueuePool):
+            DB_POOL_CONNECTIONS.labels(self.name, "checked_in").set(self.pool.checkedin())
+            DB_POOL_CONNECTIONS.labels(self.name, "checked_out").set(self.pool.checkedout())
+
+    def snapshot(self) -> dict:
+        """
+        A point in time view of the counters and the current pool status.
+        :return: dict
+        """
+        with self._lock:
+            output = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+        if isinstance(self.pool, QueuePool):
+            output |= {
+                "size": self.pool.size(),
+                "checked_in": self.pool.checkedin(),
+                "checked_out": self.pool.checkedout(),
+                "overflow": self.pool.overflow(),
+            }
+
+        return output
+
+
+# One PoolMetrics per engine, keyed by the engine's name
+POOL_METRICS: dict[str, PoolMetrics] = {}
+
+
+class _TimedPoolMixin:
+    """
+    Times how long a caller waits for a connection to be handed out by the pool.
+    SQLAlchemy has no "before checkout" event, so the wait is measured around _do_get.
+    """
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection_record = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - started)
+
+        return connection_record
+
+    def recreate(self):
+        # dispose() replaces the pool; keep reporting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def attach_pool_metrics(name: str, engine: Engine) -> PoolMetrics:
+    """
+    Register pool listeners on a (sync) engine and start collecting its metrics.
+    For an AsyncEngine pass engine.sync_engine.
+    :param name:
+    :param engine:
+    :return: PoolMetrics
+    """
+    metrics = PoolMetrics(name)
+    metrics.pool = engine.pool
+    if isinstance(engine.pool, _TimedPoolMixin):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment("connects")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.increment("checkouts")
+        metrics.update_connection_gauges()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.increment("checkins")
+        metrics.update_connection_gauges()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+    POOL_METRICS[name] = metrics
+    log.debug("Collecting pool metrics for the %s engine.", name)
+
+    return metrics
+
+
+def get_pool_metrics() -> dict:
+    """
+    Snapshot the metrics of every engine created so far.
+    :return: dict
+    """
+    return {name: metrics.snapshot() for name, metrics in POOL_METRICS.items()}
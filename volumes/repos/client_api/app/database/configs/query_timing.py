@@ -0,0 +1,26 @@
+import time
+from sqlalchemy import event, Engine
+from app.library.RequestContext import record_postgres_time
+
+
+def attach_query_timing(engine: Engine) -> None:
+    """
+    Add the time every statement spends executing on the database to the current
+    request's context. For an AsyncEngine pass engine.sync_engine.
+    :param engine:
+    :return: None
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_postgres_time(time.perf_counter() - conn.info["query_started_at"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started_at"):
+            record_postgres_time(time.perf_counter() - conn.info["query_started_at"].pop())
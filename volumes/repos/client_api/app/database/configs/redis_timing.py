@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from redis import Redis
+from redis.client import Pipeline
+from redis.connection import AbstractConnection
+from app.library.Metrics import REDIS_COMMAND_DURATION
+from app.library.RequestContext import get_remaining_budget, record_redis_time
+
+
+@contextmanager
+def deadline_socket_timeout(conn: AbstractConnection, operation: str) -> Iterator[None]:
+    """
+    Lower the connection's socket timeout to what is left of the request's deadline
+    for one command or pipeline. The client is synchronous, so this, not the asyncio
+    deadline, is what stops a slow Redis from blocking the event loop past it.
+    A timed out connection is disconnected by redis-py, so no late reply is left on it.
+    :param conn:
+    :param operation: What is about to run, for the exception's message
+    :return:
+    """
+    remaining = get_remaining_budget(operation)
+    if remaining is None or (conn.socket_timeout is not None and conn.socket_timeout <= remaining):
+        yield
+        return
+
+    if conn._sock is None:
+        conn.connect()
+    conn._sock.settimeout(remaining)
+    try:
+        yield
+    finally:
+        if conn._sock is not None:
+            conn._sock.settimeout(conn.socket_timeout)
+
+
+class TimedPipeline(Pipeline):
+    """
+    A pipeline that adds the time its round trip takes to the current request's context
+    and to the redis_command_duration_seconds histogram, and that is given no more than
+    what is left of the request's deadline.
+    """
+
+    def execute(self, raise_on_error: bool = True):
+        commands = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error=raise_on_error)
+        finally:
+            if commands:
+                seconds = time.perf_counter() - started
+                record_redis_time(seconds, commands)
+                REDIS_COMMAND_DURATION.labels("PIPELINE").observe(seconds)
+
+    def _execute_transaction(self, connection, commands, raise_on_error):
+        with deadline_socket_timeout(connection, "a Redis transaction"):
+            return super()._execute_transaction(connection, commands, raise_on_error)
+
+    def _execute_pipeline(self, connection, commands, raise_on_error):
+        with deadline_socket_timeout(connection, "a Redis pipeline"):
+            return super()._execute_pipeline(connection, commands, raise_on_error)
+
+
+class TimedRedis(Redis):
+    """
+    A Redis client that adds the time every command, and every pipeline, takes
+    to the current request's context and to the redis_command_duration_seconds histogram.
+    Commands get no more than what is left of the request's deadline.
+    """
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            seconds = time.perf_counter() - started
+            record_redis_time(seconds)
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(seconds)
+
+    def _send_command_parse_response(self, conn, command_name, *args, **options):
+        with deadline_socket_timeout(conn, f"the Redis command {command_name}"):
+            return super()._send_command_parse_response(conn, command_name, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,267 @@
+import asyncio
+import itertools
+import logging
+from typing import ClassVar
+
+from redis.exceptions import RedisError
+from sqlalchemy import Engine, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from app.library.Metrics import DB_READ_ROUTES, DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+from app.library.RequestContext import REQUEST_CONTEXT
+from app.log.loggers.app_logger import log_exception
+from config import ReplicaSelectionEnum
+
+
+log = logging.getLogger(__name__)
+
+# Execution option marking a read that may be served by a replica, e.g.
+# select(PostsModel).execution_options(read_replica=True). Everything else goes to the primary.
+READ_REPLICA_OPTION = "read_replica"
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received,
+# so a replica of an idle primary is not reported as lagging. Also 0 on a server that is not
+# a replica at all, e.g. a local stand-in.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() IS NOT DISTINCT FROM pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    """
+    One read replica's engine and its last health check.
+    """
+    __slots__ = ("name", "engine", "healthy", "lag_seconds")
+
+    def __init__(self, name: str, engine: Engine | AsyncEngine) -> None:
+        self.name = name
+        self.engine = engine
+        # Healthy until a check says otherwise, so reads are spread from the first request
+        self.healthy = True
+        self.lag_seconds = 0.0
+
+    @property
+    def bind(self) -> Engine:
+        """
+        :return: The (sync) engine a Session binds to; the AsyncEngine's own for an AsyncSession
+        """
+        return self.engine.sync_engine if isinstance(self.engine, AsyncEngine) else self.engine
+
+    def checked_out(self) -> int:
+        pool = self.bind.pool
+        return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+class ReplicaSet:
+    """
+    The read replicas of one primary, and how reads are spread over the healthy ones:
+    round_robin, or least_connections (fewest connections checked out of its pool).
+    A replica fails its health check when it cannot be reached or lags by more than
+    max_lag_seconds; reads then skip it until it passes again, and go to the primary
+    when no replica is healthy.
+    """
+
+    def __init__(
+            self, name: str, replicas: list[Replica], selection: ReplicaSelectionEnum, max_lag_seconds: float
+    ) -> None:
+        self.name = name
+        self.replicas = replicas
+        self.selection = selection
+        self.max_lag_seconds = max_lag_seconds
+        self._turns = itertools.count()
+
+    def choose(self) -> Replica | None:
+        """
+        :return: The replica to read from, None when none is healthy
+        """
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.selection == ReplicaSelectionEnum.least_connections:
+            return min(healthy, key=Replica.checked_out)
+
+        return healthy[next(self._turns) % len(healthy)]
+
+    async def check_health(self) -> None:
+        for replica in self.replicas:
+            try:
+                if isinstance(replica.engine, AsyncEngine):
+                    async with replica.engine.connect() as connection:
+                        lag_seconds = (await connection.execute(REPLICA_LAG_SQL)).scalar_one()
+                else:
+                    lag_seconds = await asyncio.to_thread(self.replica_lag, replica.engine)
+                replica.lag_seconds = float(lag_seconds)
+                healthy = replica.lag_seconds <= self.max_lag_seconds
+            except Exception as e:
+                log.warning("The %s replica %s failed its health check: %s", self.name, replica.name, e)
+                healthy = False
+
+            if healthy != replica.healthy:
+                log.warning("The %s replica %s is now %s.", self.name, replica.name, "healthy" if healthy else "unhealthy")
+            replica.healthy = healthy
+            DB_REPLICA_HEALTHY.labels(self.name, replica.name).set(int(healthy))
+            DB_REPLICA_LAG.labels(self.name, replica.name).set(replica.lag_seconds)
+
+    @staticmethod
+    def replica_lag(engine: Engine) -> float:
+        with engine.connect() as connection:
+            return connection.execute(REPLICA_LAG_SQL).scalar_one()
+
+    def snapshot(self) -> dict:
+        return {
+            replica.name: {
+                "healthy": replica.healthy,
+                "lag_seconds": round(replica.lag_seconds, 3),
+                "checked_out": replica.checked_out(),
+            }
+            for replica in self.replicas
+        }
+
+
+# Every replica set created so far, keyed by its name
+REPLICA_SETS: dict[str, ReplicaSet] = {}
+
+
+def register_replica_set(replica_set: ReplicaSet) -> ReplicaSet:
+    REPLICA_SETS[replica_set.name] = replica_set
+    return replica_set
+
+
+def get_replica_status() -> dict:
+    return {name: replica_set.snapshot() for name, replica_set in REPLICA_SETS.items()}
+
+
+async def keep_replicas_checked(interval_seconds: float) -> None:
+    """
+    Health check every replica set every interval_seconds, for the lifetime of the app.
+    :param interval_seconds:
+    :return: None
+    """
+    while True:
+        for replica_set in list(REPLICA_SETS.values()):
+            try:
+                await replica_set.check_health()
+            except Exception as e:
+                log_exception(log, e)
+
+        await asyncio.sleep(interval_seconds)
+
+
+class ReadYourWrites:
+    """
+    After a client writes to the primary, its reads stay on the primary for
+    sticky_seconds, longer than a healthy replica lags, so it always reads what it
+    wrote. Clients are told apart by RequestContext.client_key, and the mark is kept in
+    Redis so it holds on every worker. ReadYourWritesMiddleware looks the mark up once
+    per request, before any session picks a bind. When Redis fails reads go to the primary.
+    """
+    KEY_PREFIX = "postgres:primary"
+
+    def __init__(self, sticky_seconds: float) -> None:
+        self.sticky_milliseconds = max(1, int(sticky_seconds * 1000))
+
+    def mark(self) -> None:
+        context = REQUEST_CONTEXT.get()
+        if context is None or context.client_key is None:
+            return
+
+        context.reads_primary = True
+        try:
+            self.redis_cache().set(f"{self.KEY_PREFIX}:{context.client_key}", 1, px=self.sticky_milliseconds)
+        except RedisError as e:
+            log.warning("Could not keep the reads of client %s on the primary: %s", context.client_key, e)
+
+    @classmethod
+    def resolve(cls) -> None:
+        """
+        Record in the request context whether its client's reads must stay on the primary.
+        :return: None
+        """
+        context = REQUEST_CONTEXT.get()
+        if context is None or context.client_key is None:
+            return
+
+        try:
+            context.reads_primary = bool(cls.redis_cache().exists(f"{cls.KEY_PREFIX}:{context.client_key}"))
+        except RedisError as e:
+            log.warning("Reading from the primary, the read-your-writes mark could not be read: %s", e)
+            context.reads_primary = True
+
+    @staticmethod
+    def is_sticky() -> bool:
+        """
+        No I/O: what resolve found for this request, or the session's own commit marked.
+        :return: bool - False outside of a request
+        """
+        context = REQUEST_CONTEXT.get()
+        return context is not None and bool(context.reads_primary)
+
+    @staticmethod
+    def redis_cache():
+        # Imported here: dbs imports this module
+        from app.database.configs.dbs import get_redis_cache
+        return get_redis_cache()
+
+
+class ReplicaRoutingSession(Session):
+    """
+    A Session that sends the reads marked with the read_replica execution option to a
+    replica, and everything else to the primary it is bound to. Once a session has
+    written, all of its statements go to the primary, and so do the client's reads
+    for a while after it commits (see ReadYourWrites).
+    Subclass it per sessionmaker and set replicas and read_your_writes on the subclass.
+    """
+    replicas: ClassVar[ReplicaSet | None] = None
+    read_your_writes: ClassVar[ReadYourWrites | None] = None
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self.replicas is not None and not self._flushing and self.wants_replica(clause):
+            target = self.read_target()
+            DB_READ_ROUTES.labels(self.replicas.name, target if isinstance(target, str) else "replica").inc()
+            if not isinstance(target, str):
+                return target.bind
+
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def wants_replica(self, clause) -> bool:
+        return (
+            not self.info.get("wrote", False)
+            and clause is not None
+            and hasattr(clause, "get_execution_options")
+            and clause.get_execution_options().get(READ_REPLICA_OPTION, False)
+        )
+
+    def read_target(self) -> Replica | str:
+        """
+        :return: The replica to read from, or why the read goes to the primary
+        """
+        if self.read_your_writes is not None and self.read_your_writes.is_sticky():
+            return "primary_sticky"
+
+        return self.replicas.choose() or "primary_unhealthy"
+
+
+def attach_read_your_writes(session_class: type[ReplicaRoutingSession], sticky_seconds: float) -> None:
+    """
+    Track the sessions of session_class that write, and keep their client on the primary
+    once they commit. For an async_sessionmaker pass its sync_session_class.
+    :param session_class:
+    :param sticky_seconds:
+    :return: None
+    """
+    session_class.read_your_writes = ReadYourWrites(sticky_seconds)
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def do_orm_execute(orm_execute_state):
+        if not orm_execute_state.is_select:
+            orm_execute_state.session.info["wrote"] = True
+
+    @event.listens_for(session_class, "after_flush")
+    def after_flush(session, flush_context):
+        session.info["wrote"] = True
+
+    @event.listens_for(session_class, "after_commit")
+    def after_commit(session):
+        if session.info.pop("wrote", False):
+            session_class.read_your_writes.mark()
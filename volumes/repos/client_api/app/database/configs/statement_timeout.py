@@ -0,0 +1,21 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.library.RequestContext import get_remaining_budget
+
+
+def attach_statement_timeout(session_class: type[Session]) -> None:
+    """
+    Start every Postgres transaction opened during a request with a statement_timeout
+    of whatever is left of the request's deadline, so the server stops working on a
+    query the client has already given up on. SET LOCAL ends with the transaction.
+    For an async_sessionmaker pass its sync_session_class.
+    :param session_class:
+    :return: None
+    """
+
+    @event.listens_for(session_class, "after_begin")
+    def after_begin(session, transaction, connection):
+        remaining = get_remaining_budget("a Postgres transaction")
+        if remaining is not None:
+            # An int of milliseconds, never 0 which would turn the timeout off
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}")
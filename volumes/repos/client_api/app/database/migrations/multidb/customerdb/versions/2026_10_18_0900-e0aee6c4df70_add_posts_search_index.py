@@ -0,0 +1,35 @@
+"""add posts search index
+
+Revision ID: e0aee6c4df70
+Revises: d1ba78e2b5ad
+Create Date: 2026-10-18 09:00:12.481302+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0aee6c4df70'
+down_revision: Union[str, None] = 'd1ba78e2b5ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A GIN index on the expression rather than a stored tsvector column, so the table is not
+    # rewritten. Must stay identical to POSTS_SEARCH_VECTOR in posts_async_repository, or the
+    # planner will not use it. CONCURRENTLY cannot run inside the migration's transaction.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_search ON posts USING GIN ("
+            "(setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', content), 'B'))"
+            ")"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_posts_search")
@@ -0,0 +1,43 @@
+"""add posts live indexes
+
+Revision ID: ef0036cd4ff1
+Revises: e0aee6c4df70
+Create Date: 2026-10-18 10:00:41.906215+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ef0036cd4ff1'
+down_revision: Union[str, None] = 'e0aee6c4df70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partial, so they only hold the posts every read asks for, and covering: the published and
+# rating filters are checked in the index, and PostsAsyncRepository.page_statement reads the
+# ids of a page with an index only scan, in the (created_at, id) order of the keyset cursor.
+# A btree is scanned backward as well, so the ascending columns serve the descending pages.
+POSTS_LIVE_INDEXES = {
+    "ix_posts_live_created_at_id": "(created_at, id) INCLUDE (published, rating)",
+    "ix_posts_live_published_created_at_id": "(published, created_at, id) INCLUDE (rating)",
+}
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside the migration's transaction. A build that fails leaves
+    # an invalid index behind, which IF NOT EXISTS would keep: drop it before running again.
+    with op.get_context().autocommit_block():
+        for name, columns in POSTS_LIVE_INDEXES.items():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON posts {columns} WHERE deleted_at IS NULL"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in POSTS_LIVE_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
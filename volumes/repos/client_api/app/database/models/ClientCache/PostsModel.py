@@ -1,15 +1,25 @@
 from redis_om import Field, HashModel, Migrator
+from app.database.configs.dbs import get_redis_cache
 
 
 class PostsCacheModel(HashModel):
-    id: int = Field(index=True)
+    id: int = Field(index=True, sortable=True)
     uuid: str = Field(index=True)
-    title: str = Field(index=True)
+    title: str = Field(index=True, full_text_search=True)
     content: str
-    published: str
+    published: str = Field(index=True)
     rating: float = Field(index=True)
     created_at: str
+    # created_at as a unix timestamp, the sortable half of the (created_at, id) keyset
+    created_ts: float = Field(index=True, sortable=True, default=0.0)
     updated_at: str
     deleted_at: str
+    # When the key expires and how long the post took to load, for probabilistic early refresh
+    expires_ts: float = 0.0
+    compute_seconds: float = 0.0
 
-Migrator().run()
\ No newline at end of file
+    class Meta:
+        # The shared, timed client instead of one redis_om creates per model
+        database = get_redis_cache()
+
+Migrator().run()
@@ -0,0 +1,531 @@
+import datetime
+import logging
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import select, insert, update, delete, func, lambda_stmt, literal_column, tuple_, Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from app.database.models.CustomerData.PostsModel import PostsModel
+from app.database.repositories.BaseAppRepository import RepoResponse
+from app.exceptions.data.PostsExceptions import InsertException
+from app.log.loggers.app_logger import log_exception
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+# The text search document of a post, title weighted over content. Written out as SQL so it is
+# the very expression the ix_posts_search GIN index is built on (see the customerdb migration
+# adding it): the planner only uses the index for an identical expression with no bound parameters.
+POSTS_SEARCH_CONFIG = "english"
+POSTS_SEARCH_VECTOR = literal_column(
+    f"(setweight(to_tsvector('{POSTS_SEARCH_CONFIG}', posts.title), 'A') || "
+    f"setweight(to_tsvector('{POSTS_SEARCH_CONFIG}', posts.content), 'B'))"
+)
+
+# Read as plain Rows of its columns, the posts table skips the ORM's entity loading
+POSTS_TABLE = PostsModel.__table__
+# The posts columns by name, in the order select(POSTS_TABLE) returns them
+POSTS_COLUMNS: tuple[str, ...] = tuple(POSTS_TABLE.c.keys())
+
+
+def row_fields(row: Row) -> dict:
+    """
+    A post read as a Row, as a dict of its columns. pydantic validates a dict several times
+    faster than it reads a Row's attributes, and the cache repository takes the dict as it is.
+    :param row: A row of select(POSTS_TABLE); columns added after the posts', e.g. a search's score, are left out
+    :return: dict
+    """
+    return dict(zip(POSTS_COLUMNS, row))
+
+
+class PostsAsyncRepository:
+    """
+    The async variant of the PostsRepository.
+    Every database round trip is awaited on the asyncpg driver so a slow
+    query no longer blocks the event loop for every other in-flight request.
+    The hot lookups are lambda statements: SQLAlchemy builds each one once, caches it
+    by the lambda's code, and only binds the values the lambda closes over on later calls.
+    Extend them with `statement += lambda s: ...`, never a method call like
+    statement.execution_options(), which returns the cached statement with the first call's values.
+    With as_rows, the read methods return the posts as Rows of the posts columns rather
+    than PostsModel entities: no identity map, instance state or change tracking, just
+    tuples with the same attributes. Rows are read-only; writes are not affected.
+    """
+    postgresdb: AsyncSession
+    as_rows: bool
+
+    def __init__(self, postgresdb: AsyncSession, as_rows: bool = False) -> None:
+        super().__init__()
+        self.postgresdb = postgresdb
+        self.as_rows = as_rows
+
+    def select_posts(self) -> Select:
+        return select(POSTS_TABLE) if self.as_rows else select(PostsModel)
+
+    def lambda_select_posts(self) -> StatementLambdaElement:
+        # Two lambdas, so each shape is cached on its own
+        if self.as_rows:
+            return lambda_stmt(lambda: select(POSTS_TABLE))
+        return lambda_stmt(lambda: select(PostsModel))
+
+    async def fetch_posts(self, statement) -> Sequence[PostsModel | Row]:
+        result = await self.postgresdb.execute(statement)
+        return (result if self.as_rows else result.scalars()).all()
+
+
+    async def insert(
+            self,
+            title: str,
+            content: str,
+            rating: float,
+            published: bool,
+    ):
+        """
+        Also save, store
+        :return: RepoResponse
+        """
+
+        log.debug('%s - Received data for a new post.', self.__class__.__name__)
+
+        try:
+            new_model = PostsModel(
+                title=title,
+                content=content,
+                rating=rating,
+                published=published
+            )
+            log.debug('%s - Created a posts model with the new post data.', self.__class__.__name__)
+
+            self.postgresdb.add(new_model)
+            await self.postgresdb.commit()
+            await self.postgresdb.refresh(new_model)
+            log.debug('%s - Added and commited to the postgres db.', self.__class__.__name__)
+
+            return RepoResponse(
+                status=True,
+                data=new_model,
+                errors={},
+                meta={},
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise InsertException("The posts repository could not insert a post")
+
+
+    async def insert_many(self, posts: list[dict]):
+        """
+        Insert many posts with multi-row INSERT ... RETURNING statements in a single transaction.
+        :param posts: dicts of title, content, rating, published
+        :return: RepoResponse - data is the new models in the order of posts
+        """
+        log.debug('%s - Received data for %s new posts.', self.__class__.__name__, len(posts))
+
+        try:
+            new_models = (await self.postgresdb.scalars(
+                insert(PostsModel).returning(PostsModel, sort_by_parameter_order=True),
+                posts,
+            )).all()
+            await self.postgresdb.commit()
+            log.debug('%s - Added and commited %s posts to the postgres db.', self.__class__.__name__, len(new_models))
+
+            return RepoResponse(
+                status=True,
+                data=new_models,
+                errors={},
+                meta={
+                    "count": len(new_models),
+                },
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise InsertException("The posts repository could not insert many posts")
+
+
+    async def find_all(self):
+        """
+        alias for get_all
+        alias for list
+        :return: RepoResponse
+        """
+        log.debug('%s - Finding all posts.', self.__class__.__name__)
+        try:
+            statement = self.lambda_select_posts()
+            statement += lambda s: s.where(PostsModel.deleted_at.is_(None)).execution_options(read_replica=True)
+
+            posts = await self.fetch_posts(statement)
+
+            return RepoResponse(
+                status=True,
+                data=posts,
+                errors={},
+                meta={},
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts repository could not find all posts")
+
+
+    def page_statement(
+            self,
+            limit: int,
+            cursor: tuple[datetime.datetime, int] | None = None,
+            title: str | None = None,
+            published: bool | None = None,
+            rating_min: float | None = None,
+            rating_max: float | None = None,
+    ) -> Select:
+        """
+        The statement of find_page, in two steps: the ids of the page are read from one of
+        the partial covering indexes on the live posts, ix_posts_live_created_at_id or
+        ix_posts_live_published_created_at_id (see the customerdb migration adding them),
+        which hold the published and rating filters' columns, so the scan filters and
+        orders with an index only scan; then only the posts of the page are read from the
+        table. The subquery must keep filtering on deleted_at IS NULL, the indexes' predicate.
+        :return: Select
+        """
+        page = select(PostsModel.id).where(PostsModel.deleted_at.is_(None))
+
+        if cursor is not None:
+            page = page.where(tuple_(PostsModel.created_at, PostsModel.id) < tuple_(*cursor))
+        if title:
+            page = page.where(PostsModel.title.ilike(f"%{title}%"))
+        if published is not None:
+            page = page.where(PostsModel.published.is_(published))
+        if rating_min is not None:
+            page = page.where(PostsModel.rating >= rating_min)
+        if rating_max is not None:
+            page = page.where(PostsModel.rating <= rating_max)
+
+        page = (page
+            .order_by(PostsModel.created_at.desc(), PostsModel.id.desc())
+            .limit(limit + 1)
+            .subquery("page"))
+
+        return (self.select_posts()
+            .join(page, PostsModel.id == page.c.id)
+            .order_by(PostsModel.created_at.desc(), PostsModel.id.desc())
+            .execution_options(read_replica=True))
+
+    async def find_page(
+            self,
+            limit: int,
+            cursor: tuple[datetime.datetime, int] | None = None,
+            title: str | None = None,
+            published: bool | None = None,
+            rating_min: float | None = None,
+            rating_max: float | None = None,
+    ):
+        """
+        Get one page of posts ordered by (created_at, id) descending.
+        Keyset pagination: the page starts strictly after the cursor, so deep pages
+        cost the same as the first one.
+        :param limit:
+        :param cursor: The (created_at, id) of the last post of the previous page
+        :param title: Case insensitive substring of the title
+        :param published:
+        :param rating_min:
+        :param rating_max:
+        :return: RepoResponse - data is limit + 1 posts at most, the extra one signals a next page
+        """
+        log.debug('%s - Finding a page of posts.', self.__class__.__name__)
+        try:
+            posts = await self.fetch_posts(
+                self.page_statement(limit, cursor, title, published, rating_min, rating_max)
+            )
+
+            return RepoResponse(
+                status=True,
+                data=posts,
+                errors={},
+                meta={
+                    "count": min(len(posts), limit),
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts repository could not find a page of posts")
+
+
+    async def search(
+            self,
+            text: str,
+            limit: int,
+            offset: int = 0,
+            published: bool | None = None,
+            rating_min: float | None = None,
+            rating_max: float | None = None,
+    ):
+        """
+        One page of the posts matching text, best match first, with the full text search
+        of Postgres: websearch syntax ("quoted phrases", or, -excluded) ranked by ts_rank_cd.
+        Every match is ranked to sort them, so the cost grows with the number of matches.
+        :param text:
+        :param limit:
+        :param offset:
+        :param published:
+        :param rating_min:
+        :param rating_max:
+        :return: RepoResponse - data is (PostsModel, score) pairs; meta holds the total matches
+        """
+        log.debug('%s - Searching posts.', self.__class__.__name__)
+        try:
+            query = func.websearch_to_tsquery(literal_column(f"'{POSTS_SEARCH_CONFIG}'"), text)
+            score = func.ts_rank_cd(POSTS_SEARCH_VECTOR, query)
+            statement = (
+                self.select_posts()
+                .add_columns(score.label("score"), func.count().over().label("total"))
+                .where(
+                    POSTS_SEARCH_VECTOR.op("@@")(query),
+                    PostsModel.deleted_at.is_(None),
+                )
+            )
+
+            if published is not None:
+                statement = statement.where(PostsModel.published.is_(published))
+            if rating_min is not None:
+                statement = statement.where(PostsModel.rating >= rating_min)
+            if rating_max is not None:
+                statement = statement.where(PostsModel.rating <= rating_max)
+
+            statement = (statement
+                .order_by(score.desc(), PostsModel.id.desc())
+                .offset(offset)
+                .limit(limit)
+                .execution_options(read_replica=True))
+
+            rows = (await self.postgresdb.execute(statement)).all()
+
+            return RepoResponse(
+                status=True,
+                # A Row holds the post's columns next to its score and total
+                data=[(row if self.as_rows else row.PostsModel, row.score) for row in rows],
+                errors={},
+                meta={
+                    # The window count comes with every row, so an offset past the last match reads as 0
+                    "total": rows[0].total if rows else 0,
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts repository could not search posts")
+
+
+    async def stream_all(self, batch_size: int) -> AsyncIterator[PostsModel]:
+        """
+        Stream every post through a server side cursor, batch_size rows at a time,
+        so memory stays flat regardless of the number of rows.
+        The session must stay open for as long as the stream is being consumed.
+        Always reads the primary: the stream fills the cache, where a replica's stale rows would stay.
+        :param batch_size:
+        :return: AsyncIterator[PostsModel | Row]
+        """
+        log.debug('%s - Streaming all posts.', self.__class__.__name__)
+        try:
+            statement = (self.select_posts()
+                .where(PostsModel.deleted_at.is_(None))
+                .order_by(PostsModel.id)
+                .execution_options(yield_per=batch_size))
+            posts = await self.postgresdb.stream(statement)
+            async for post in (posts if self.as_rows else posts.scalars()):
+                yield post
+
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts repository could not stream all posts")
+
+
+    async def find_one_by_uuid(self, post_uuid, read_replica: bool = True):
+        """
+        :param post_uuid:
+        :param read_replica: False to read the primary, e.g. for a post about to be cached
+        :return: RepoResponse - data is the post, None when it does not exist
+        """
+        log.debug('%s - Finding a post by its uuid: %s.', self.__class__.__name__, post_uuid)
+        try:
+            statement = self.lambda_select_posts()
+            statement += lambda s: s.where(
+                PostsModel.uuid == post_uuid,
+                PostsModel.deleted_at.is_(None)
+            ).limit(1)
+            if read_replica:
+                statement += lambda s: s.execution_options(read_replica=True)
+
+            posts = await self.fetch_posts(statement)
+            post = posts[0] if posts else None
+
+            return RepoResponse(
+                status=True,
+                data=post,
+                errors={},
+                meta={},
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception(f"The posts repository could not find the post identified by uuid {post_uuid}")
+
+    async def find_many_by_uuid(self, post_uuids: list, read_replica: bool = True):
+        """
+        :param post_uuids:
+        :param read_replica: False to read the primary, e.g. for posts about to be cached
+        :return: RepoResponse - data is the posts found, in no particular order
+        """
+        log.debug('%s - Finding %s posts by their uuids.', self.__class__.__name__, len(post_uuids))
+        try:
+            statement = self.lambda_select_posts()
+            statement += lambda s: s.where(
+                PostsModel.uuid.in_(post_uuids),
+                PostsModel.deleted_at.is_(None)
+            )
+            if read_replica:
+                statement += lambda s: s.execution_options(read_replica=True)
+
+            posts = await self.fetch_posts(statement)
+
+            return RepoResponse(
+                status=True,
+                data=posts,
+                errors={},
+                meta={
+                    "count": len(posts),
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts repository could not find posts by their uuids")
+
+    async def delete_post_by_uuid(self, post_uuid):
+        """
+        :param post_uuid:
+        :return: RepoResponse - data is the id of the deleted post, or None when it was not found
+        """
+        log.debug("Repository is deleting a post by the uuid %s", post_uuid)
+
+        try:
+            deleted_id = (await self.postgresdb.scalars(
+                delete(PostsModel)
+                .where(PostsModel.uuid == post_uuid)
+                .returning(PostsModel.id)
+                .execution_options(synchronize_session=False)
+            )).first()
+            await self.postgresdb.commit()
+
+            return RepoResponse(
+                status=True,
+                data=deleted_id,
+                errors={},
+                meta={},
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise Exception(f"The posts repository could not delete the post identified by uuid {post_uuid}")
+
+    def _update_returning(self, post_uuid, patch: dict):
+        """
+        A partial UPDATE of a single post that only sets the fields in the patch
+        and returns the new row, so no read is needed before or after it.
+        :param post_uuid:
+        :param patch: The fields to update
+        :return: Update - sqlalchemy.sql.expression.Update
+        """
+        return (update(PostsModel)
+            .where(
+                PostsModel.uuid == post_uuid,
+                PostsModel.deleted_at.is_(None)
+            )
+            .values(patch | {"updated_at": func.now()})
+            .returning(PostsModel)
+            .execution_options(synchronize_session=False))
+
+    async def patch_one_by_uuid(self, post_uuid, patch: dict):
+        """
+        Patch a post in one UPDATE ... RETURNING round trip.
+        :param post_uuid:
+        :param patch: The fields to update
+        :return: RepoResponse - data is the updated model, or None when it was not found
+        """
+        log.debug("Repository is patching a post by the uuid %s", post_uuid)
+        log.debug(patch)
+
+        try:
+            updated_post = (await self.postgresdb.scalars(self._update_returning(post_uuid, patch))).first()
+            await self.postgresdb.commit()
+
+            return RepoResponse(
+                status=True,
+                data=updated_post,
+                errors={},
+                meta={},
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise Exception(f"The posts repository could not patch the post identified by uuid {post_uuid}")
+
+    async def patch_many_by_uuid(self, patches: list[dict]):
+        """
+        Patch many posts in a single transaction. Each UPDATE only sets the fields
+        present in its patch and hands the new row back with RETURNING.
+        :param patches: dicts holding a uuid and the fields to update
+        :return: RepoResponse - data maps each uuid to its updated model, or None when it was not found
+        """
+        log.debug("Repository is patching %s posts", len(patches))
+
+        try:
+            updated_models = {}
+            for patch in patches:
+                values = {key: value for key, value in patch.items() if key != "uuid"}
+                updated_models[patch["uuid"]] = (await self.postgresdb.scalars(
+                    self._update_returning(patch["uuid"], values)
+                )).first()
+            await self.postgresdb.commit()
+
+            return RepoResponse(
+                status=True,
+                data=updated_models,
+                errors={},
+                meta={},
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise Exception("The posts repository could not patch many posts")
+
+    async def delete_many_by_uuid(self, post_uuids: list):
+        """
+        Delete many posts with one DELETE ... WHERE uuid IN (...) RETURNING uuid, id.
+        :param post_uuids:
+        :return: RepoResponse - data maps the uuid of each deleted post to its id
+        """
+        log.debug("Repository is deleting %s posts", len(post_uuids))
+
+        try:
+            deleted_rows = (await self.postgresdb.execute(
+                delete(PostsModel)
+                .where(PostsModel.uuid.in_(post_uuids))
+                .returning(PostsModel.uuid, PostsModel.id)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await self.postgresdb.commit()
+
+            return RepoResponse(
+                status=True,
+                data={deleted_uuid: deleted_id for deleted_uuid, deleted_id in deleted_rows},
+                errors={},
+                meta={
+                    "count": len(deleted_rows),
+                },
+            )
+
+        except Exception as e:
+            log_exception(log, e)
+            await self.postgresdb.rollback()
+            raise Exception("The posts repository could not delete many posts")
@@ -1,17 +1,98 @@
+import datetime
+import itertools
+import json
 import logging
+import math
+import random
+import time
+import uuid
+from functools import lru_cache
 from typing import Final
 
 from fastapi import Depends
 from pydantic import ValidationError
-from redis.exceptions import ConnectionError
+from redis.exceptions import ConnectionError, LockError
+from redis.lock import Lock
+from redis.client import PubSub, PubSubWorkerThread
+from redis.commands.core import Script
 from redis_om import NotFoundError
+from redis_om.model.encoders import jsonable_encoder
 from app.database.configs.dbs import get_redis_cache
 from app.database.models.ClientCache.PostsModel import PostsCacheModel
 from app.database.repositories.BaseAppRepository import RepoResponse
+from app.library.LocalCache import CacheStats, LocalCache, register_cache_stats
 from app.log.loggers.app_logger import log_exception
+from config import get_app_env_config
 
 
 log = logging.getLogger(__name__)
+app_env_config = get_app_env_config()
+
+
+# Lookups of cached posts that reached Redis
+REDIS_CACHE_STATS = register_cache_stats(CacheStats("posts_redis"))
+
+# Moves a legacy cached post (KEYS[1]) to its uuid key (KEYS[2]) and adds it to the posts
+# index (KEYS[3]), atomically. A post cached again under its uuid since is newer than the
+# legacy hash, which is then only deleted. RENAME keeps the key's TTL, and the fields the
+# legacy hash lacks are only set once it is moved, so no partial hash is ever left behind.
+# ARGV: the uuid (the new pk), created_ts, and the post's index member ('' for none).
+# Returns 1 when the post was moved, 0 when the legacy key was dropped or is gone.
+REKEY_POST_SCRIPT: Final[str] = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('HSET', KEYS[2], 'pk', ARGV[1], 'created_ts', ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+end
+
+return 1
+"""
+
+
+@lru_cache(maxsize=None)
+def get_posts_local_cache() -> LocalCache | None:
+    """
+    The per worker (L1) cache of hot posts that sits in front of Redis.
+    :return: LocalCache | None - None when REDIS_CACHE_LOCAL_ENABLED is off
+    """
+    if not app_env_config.REDIS_CACHE_LOCAL_ENABLED:
+        return None
+
+    return LocalCache(
+        name="posts_local",
+        max_items=app_env_config.REDIS_CACHE_LOCAL_MAX_ITEMS,
+        ttl_seconds=app_env_config.REDIS_CACHE_LOCAL_TTL_SECONDS,
+    )
+
+# Caches a post the warm-up read from Postgres (KEYS[1]) and adds it to the posts index
+# (KEYS[3]), atomically. The row may be as old as the warm-up, so it never replaces a
+# cached post: that one was written through by a create or patch since, and is newer.
+# A post deleted since left a tombstone (KEYS[2]) and is neither cached nor indexed.
+# ARGV: the expiration seconds, created_ts, the index member, then the hash's field
+# value pairs. Returns 1 when the post was cached, 0 when it was already or was deleted.
+WARM_UP_POST_SCRIPT: Final[str] = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+
+local cached = 0
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    cached = 1
+end
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+
+return cached
+"""
 
 
 class PostsCacheRepository:
@@ -22,6 +103,7 @@ class PostsCacheRepository:
 
     def __init__(self):
         self.redis_cache = get_redis_cache()
+        self.local_cache = get_posts_local_cache()
 
 
     @staticmethod
@@ -46,24 +128,113 @@ class PostsCacheRepository:
         }
 
 
-    def store_post(self, post: dict):
-        # assert PostsCacheModel.get(new_cache_post.pk) == new_cache_post
+    @staticmethod
+    def make_cache_model(post: dict) -> PostsCacheModel:
+        """
+        Convert the attributes of a PostsModel row into a PostsCacheModel.
+        The pk is the post uuid, so a post is always cached under the same key
+        and can be read back with a single HGETALL.
+        :param post: The row's attributes, e.g. PostsModel.__dict__
+        :return: PostsCacheModel
+        """
+        return PostsCacheModel(
+            pk=str(post["uuid"]),
+            id=post["id"],
+            uuid=str(post["uuid"]),
+            title=post["title"],
+            content=post["content"],
+            published="TRUE" if post["published"] else "FALSE",
+            rating=post["rating"],
+            created_at=post["created_at"].isoformat(),
+            created_ts=post["created_at"].timestamp(),
+            updated_at=post["updated_at"].isoformat(),
+            deleted_at="NULL" if post["deleted_at"] is None else post["deleted_at"].isoformat(),
+        )
+
+
+    def model_expiration_seconds(self) -> int:
+        """
+        MODEL_EXPIRATION_SECONDS with REDIS_CACHE_TTL_JITTER applied, so posts cached
+        together (e.g. a seeded batch) do not all expire in the same instant.
+        :return: int
+        """
+        jitter = app_env_config.REDIS_CACHE_TTL_JITTER
+        return round(self.MODEL_EXPIRATION_SECONDS * random.uniform(1 - jitter, 1 + jitter))
+
+    def make_expiring_cache_model(self, post: dict, compute_seconds: float = 0.0) -> tuple[PostsCacheModel, int]:
+        """
+        A cache model that records its own expiry and load time for should_refresh_early.
+        :param post: The row's attributes, e.g. PostsModel.__dict__
+        :param compute_seconds: How long it took to load the post from the database
+        :return: The cache model and the TTL to set on its key
+        """
+        expiration_seconds = self.model_expiration_seconds()
+        new_cache_post = self.make_cache_model(post)
+        new_cache_post.expires_ts = time.time() + expiration_seconds
+        new_cache_post.compute_seconds = compute_seconds
+
+        return new_cache_post, expiration_seconds
+
+    @staticmethod
+    def should_refresh_early(cache_model: PostsCacheModel) -> bool:
+        """
+        Probabilistic early expiration (XFetch): the closer a post is to expiring, and
+        the longer it takes to load, the likelier one request reloads it ahead of time,
+        so a hot post is refreshed by a single request instead of expiring under all of them.
+        :param cache_model:
+        :return: bool
+        """
+        if not cache_model.expires_ts:
+            # Cached before expiries were recorded
+            return False
+
+        # 1 - random() is in (0, 1], so the log is defined and never positive
+        early_by = -cache_model.compute_seconds * app_env_config.REDIS_CACHE_EARLY_REFRESH_BETA * math.log(1.0 - random.random())
+
+        return time.time() + early_by >= cache_model.expires_ts
+
+
+    @staticmethod
+    def index_member(post_id: int, post_uuid) -> str:
+        """
+        The member of a post in the posts index. Members sharing a score (created_at)
+        sort by their zero padded id, matching the (created_at, id) order of the database.
+        :param post_id:
+        :param post_uuid:
+        :return: str
+        """
+        return f"{post_id:020d}:{post_uuid}"
+
+    @staticmethod
+    def parse_index_member(member: str) -> tuple[int, str]:
+        """
+        :param member: A member made by index_member
+        :return: tuple - (id, uuid)
+        """
+        post_id, post_uuid = member.split(":", 1)
+        return int(post_id), post_uuid
+
+    def index_post(self, new_cache_post: PostsCacheModel, pipeline) -> None:
+        pipeline.zadd(
+            app_env_config.REDIS_CACHE_POSTS_INDEX_KEY,
+            {self.index_member(new_cache_post.id, new_cache_post.uuid): new_cache_post.created_ts},
+        )
+
+
+    def store_post(self, post: dict, compute_seconds: float = 0.0):
         log.debug('%s - Storing a post.', self.__class__.__name__)
 
         try:
-            new_cache_post = PostsCacheModel(
-                id=post["id"],
-                uuid=str(post["uuid"]),
-                title=post["title"],
-                content=post["content"],
-                published="TRUE" if post["published"] else "FALSE",
-                rating=post["rating"],
-                created_at=post["created_at"].isoformat(),
-                updated_at=post["updated_at"].isoformat(),
-                deleted_at="NULL" if post["deleted_at"] is None else post["deleted_at"].isoformat(),
-            )
-            new_cache_post.expire(self.MODEL_EXPIRATION_SECONDS)
-            new_cache_post.save()
+            new_cache_post, expiration_seconds = self.make_expiring_cache_model(post, compute_seconds)
+            # The key must exist before an expiry can be set on it, the pipeline keeps the order
+            pipeline = PostsCacheModel.db().pipeline(transaction=False)
+            new_cache_post.save(pipeline=pipeline)
+            new_cache_post.expire(expiration_seconds, pipeline=pipeline)
+            self.index_post(new_cache_post, pipeline)
+            pipeline.execute()
+
+            if self.local_cache is not None:
+                self.local_cache.set(new_cache_post.pk, new_cache_post)
             log.debug('%s - The post was successfully cached.', self.__class__.__name__)
             log.debug(new_cache_post)
 
@@ -80,26 +251,124 @@ class PostsCacheRepository:
             raise Exception("The posts cache repository could not cache a post")
 
 
-    def find_one_wt_cache_key(self, cache_key: str):
-        log.debug("%s - Retrieving a post using the cache key %s.", self.__class__.__name__, cache_key)
+    def store_posts(self, posts: list[dict]):
+        """
+        Store many posts, and add them to the posts index, in one pipelined round trip.
+        :param posts: The attributes of each PostsModel row
+        :return: RepoResponse - data is the cached models in the order of posts
+        """
+        log.debug('%s - Storing %s posts.', self.__class__.__name__, len(posts))
 
         try:
-            cached_post = PostsCacheModel.get(cache_key)
-            log.debug(cached_post)
-            log.debug(type(cached_post))
+            pipeline = PostsCacheModel.db().pipeline(transaction=False)
+            new_cache_posts = []
+            for post in posts:
+                new_cache_post, expiration_seconds = self.make_expiring_cache_model(post)
+                new_cache_post.save(pipeline=pipeline)
+                new_cache_post.expire(expiration_seconds, pipeline=pipeline)
+                self.index_post(new_cache_post, pipeline)
+                new_cache_posts.append(new_cache_post)
+            pipeline.execute()
+            log.debug('%s - %s posts were successfully cached.', self.__class__.__name__, len(new_cache_posts))
 
             return RepoResponse(
                 status=True,
-                data=cached_post,
-                meta={},
+                data=new_cache_posts,
+                meta={
+                    "count": len(new_cache_posts),
+                },
                 errors={},
             )
-        except NotFoundError as e:
+        except Exception as e:
             log_exception(log, e)
-            raise Exception("Someting don happen ohh!")
+            raise Exception("The posts cache repository could not cache many posts")
+
+
+    def warm_up_posts(self, posts: list[dict]):
+        """
+        Cache many posts read by the warm-up, and add them to the posts index, in one
+        pipelined round trip of WARM_UP_POST_SCRIPT: posts already cached or deleted
+        since they were read are left as they are.
+        :param posts: The attributes of each PostsModel row
+        :return: RepoResponse - meta holds the count of posts cached
+        """
+        log.debug('%s - Warming up %s posts.', self.__class__.__name__, len(posts))
+
+        try:
+            db = PostsCacheModel.db()
+            warm_up_post: Script = db.register_script(WARM_UP_POST_SCRIPT)
+            pipeline = db.pipeline(transaction=False)
+            for post in posts:
+                new_cache_post, expiration_seconds = self.make_expiring_cache_model(post)
+                # What HashModel.save would write
+                document = {field: value for field, value in jsonable_encoder(new_cache_post.dict()).items() if value is not None}
+                warm_up_post(
+                    keys=[new_cache_post.key(), self.tombstone_key(new_cache_post.uuid), app_env_config.REDIS_CACHE_POSTS_INDEX_KEY],
+                    args=[
+                        expiration_seconds,
+                        new_cache_post.created_ts,
+                        self.index_member(new_cache_post.id, new_cache_post.uuid),
+                        *itertools.chain.from_iterable(document.items()),
+                    ],
+                    client=pipeline,
+                )
+            cached = sum(pipeline.execute())
+            log.debug('%s - %s of %s posts were cached.', self.__class__.__name__, cached, len(posts))
+
+            return RepoResponse(
+                status=True,
+                data=None,
+                meta={
+                    "count": cached,
+                },
+                errors={},
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The posts cache repository could not warm up many posts")
+
+    @staticmethod
+    def tombstone_key(post_uuid) -> str:
+        """
+        Marks a deleted post for as long as a warm-up may run (its lock), so a warm-up
+        that read the post before it was deleted does not cache it again.
+        :param post_uuid:
+        :return: str
+        """
+        return f"{app_env_config.REDIS_CACHE_POSTS_INDEX_KEY}:deleted:{post_uuid}"
+
+    def add_tombstones(self, post_uuids, pipeline) -> None:
+        for post_uuid in post_uuids:
+            pipeline.set(self.tombstone_key(post_uuid), 1, ex=math.ceil(app_env_config.REDIS_CACHE_WARM_UP_LOCK_SECONDS))
+
+
+    def delete_posts_by_uuid(self, post_ids_by_uuid: dict):
+        """
+        Delete many cached posts and remove them from the posts index in one round trip.
+        :param post_ids_by_uuid: The id of each deleted post, keyed by its uuid
+        :return: RepoResponse - data is the number of cached posts deleted
+        """
+        log.debug("%s - Deleting %s cached posts.", self.__class__.__name__, len(post_ids_by_uuid))
+
+        try:
+            pipeline = PostsCacheModel.db().pipeline(transaction=False)
+            pipeline.delete(*[PostsCacheModel.make_primary_key(str(post_uuid)) for post_uuid in post_ids_by_uuid])
+            pipeline.zrem(
+                app_env_config.REDIS_CACHE_POSTS_INDEX_KEY,
+                *[self.index_member(post_id, post_uuid) for post_uuid, post_id in post_ids_by_uuid.items()],
+            )
+            self.add_tombstones(post_ids_by_uuid, pipeline)
+            deleted_cache_models = pipeline.execute()[0]
+
+            return RepoResponse(
+                status=True,
+                data=deleted_cache_models,
+                meta={},
+                errors={},
+            )
         except Exception as e:
             log_exception(log, e)
-            raise Exception("Unknown tin don happen!!")
+            raise Exception("The posts cache repository could not delete many cached posts")
 
 
     def find_all(self):
@@ -112,9 +381,7 @@ class PostsCacheRepository:
         log.debug('%s - Retrieving all posts from the cache.', self.__class__.__name__)
 
         try:
-            cached_posts = []
-            for pk in PostsCacheModel.all_pks():
-                cached_posts.append(PostsCacheModel.get(pk))
+            cached_posts, round_trips = self.find_many_by_pks(list(PostsCacheModel.all_pks()))
             log.debug("The posts cache repo has retrieved all cached posts.")
             log.debug("cached_posts = ")
             log.debug(cached_posts)
@@ -123,7 +390,8 @@ class PostsCacheRepository:
                 status=True,
                 data=cached_posts,
                 meta={
-                    "count": len(cached_posts)
+                    "count": len(cached_posts),
+                    "round_trips": round_trips,
                 },
                 errors={},
             )
@@ -138,17 +406,131 @@ class PostsCacheRepository:
             raise Exception("Could not get all posts for the current API user.")
 
 
-    def delete_post_by_uuid(self, post_uuid):
+    def find_index_page(self, limit: int, cursor: tuple[datetime.datetime, int] | None = None) -> list[tuple[int, str]]:
+        """
+        Read one page of the posts index, ordered by (created_at, id) descending,
+        in a single round trip without touching the cached posts themselves.
+        The score only holds created_at, so the posts sharing the cursor's created_at
+        are read separately and the ones at or before the cursor's id are dropped.
+        :param limit:
+        :param cursor: The (created_at, id) of the last post of the previous page
+        :return: list - (id, uuid) of limit + 1 posts at most, the extra one signals a next page
+        """
+        log.debug('%s - Reading a page of the posts index.', self.__class__.__name__)
+
+        index_key = app_env_config.REDIS_CACHE_POSTS_INDEX_KEY
+        db = PostsCacheModel.db()
+
+        try:
+            if cursor is None:
+                members = db.zrevrangebyscore(index_key, "+inf", "-inf", start=0, num=limit + 1)
+            else:
+                cursor_ts, cursor_id = cursor[0].timestamp(), cursor[1]
+                pipeline = db.pipeline(transaction=False)
+                pipeline.zrevrangebyscore(index_key, cursor_ts, cursor_ts)
+                pipeline.zrevrangebyscore(index_key, f"({cursor_ts}", "-inf", start=0, num=limit + 1)
+                same_ts, older = pipeline.execute()
+                members = [member for member in same_ts if self.parse_index_member(member)[0] < cursor_id] + older
+
+            return [self.parse_index_member(member) for member in members[:limit + 1]]
+
+        except ConnectionError as e:
+            log.critical("Could not connect to the cache repository resource. e.args = %s", e.args)
+            raise Exception(f"Could not connect to the cache repository resource. {e.args}")
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("Could not read a page of the posts index.")
+
+    def remove_from_index(self, posts: list[tuple[int, str]]) -> None:
+        """
+        :param posts: (id, uuid) of posts that no longer exist
+        :return: None
+        """
+        PostsCacheModel.db().zrem(
+            app_env_config.REDIS_CACHE_POSTS_INDEX_KEY,
+            *[self.index_member(post_id, post_uuid) for post_id, post_uuid in posts],
+        )
+
+    @staticmethod
+    def index_is_ready() -> bool:
+        """
+        The index only holds every post once a warm-up has completed; until then
+        pages must come from the database.
+        :return: bool
+        """
+        return bool(PostsCacheModel.db().exists(f"{app_env_config.REDIS_CACHE_POSTS_INDEX_KEY}:ready"))
+
+    @classmethod
+    def mark_index_ready(cls) -> None:
+        # Expires well before the posts cached by the warm-up do, so keep_cache_warm caches them
+        # again before any of them drops out of the posts index and the search index
+        ready_seconds = round(cls.MODEL_EXPIRATION_SECONDS * (1 - app_env_config.REDIS_CACHE_TTL_JITTER) / 2)
+        PostsCacheModel.db().set(
+            f"{app_env_config.REDIS_CACHE_POSTS_INDEX_KEY}:ready",
+            datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            ex=ready_seconds,
+        )
+
+    @staticmethod
+    def lock_warm_up() -> Lock | None:
+        """
+        Try to become the one worker that warms the cache up.
+        :return: Lock | None - None when another worker is already warming it up
+        """
+        lock = PostsCacheModel.db().lock(
+            f"{app_env_config.REDIS_CACHE_POSTS_INDEX_KEY}:warming",
+            timeout=app_env_config.REDIS_CACHE_WARM_UP_LOCK_SECONDS,
+            blocking=False,
+        )
+
+        return lock if lock.acquire() else None
+
+
+    @staticmethod
+    def find_many_by_pks(pks: list[str], batch_size: int = None) -> tuple[list[PostsCacheModel], int]:
+        """
+        Read many cached posts with one pipelined round trip of HGETALLs per batch
+        instead of one PostsCacheModel.get() round trip per key.
+        Keys that expired between listing and reading are skipped.
+        :param pks: The cache model primary keys
+        :param batch_size: Defaults to REDIS_CACHE_READ_BATCH_SIZE
+        :return: The cached posts, in the order of pks, and the number of round trips made
+        """
+        batch_size = batch_size or app_env_config.REDIS_CACHE_READ_BATCH_SIZE
+        cached_posts = []
+        round_trips = 0
+
+        for offset in range(0, len(pks), batch_size):
+            pipeline = PostsCacheModel.db().pipeline(transaction=False)
+            for pk in pks[offset:offset + batch_size]:
+                pipeline.hgetall(PostsCacheModel.make_primary_key(pk))
+
+            documents = pipeline.execute()
+            round_trips += 1
+
+            for document in documents:
+                if document:
+                    cached_posts.append(PostsCacheModel(**document))
+
+        return cached_posts, round_trips
+
+
+    def delete_post_by_uuid(self, post_uuid, post_id: int | None = None):
+        """
+        Delete a cached post and, when its id is known, remove it from the posts index.
+        :param post_uuid:
+        :param post_id:
+        :return: RepoResponse
+        """
         log.debug("%s - Deleting a post with the uuid %s.", self.__class__.__name__, post_uuid)
-        log.debug(post_uuid)
-        log.debug(type(post_uuid))
 
         try:
-            deleted_cache_model =  (
-                PostsCacheModel
-                .find(PostsCacheModel.uuid == str(post_uuid))
-                .delete()
-            )
+            pipeline = PostsCacheModel.db().pipeline(transaction=False)
+            PostsCacheModel.delete(str(post_uuid), pipeline=pipeline)
+            if post_id is not None:
+                pipeline.zrem(app_env_config.REDIS_CACHE_POSTS_INDEX_KEY, self.index_member(post_id, post_uuid))
+            self.add_tombstones([post_uuid], pipeline)
+            deleted_cache_model = pipeline.execute()[0]
 
             return RepoResponse(
                 status=True,
@@ -157,34 +539,51 @@ class PostsCacheRepository:
                 errors={},
             )
 
-        except NotFoundError as e:
+        except Exception as e:
             log_exception(log, e)
-            raise Exception("Someting don happen ohh!")
+            raise Exception("The posts cache repository could not delete a cached post.")
 
 
     def find_one_wt_uuid(self, post_uuid):
         log.debug("%s - Retrieving a post using the uuid %s.", self.__class__.__name__, post_uuid)
 
+        if self.local_cache is not None:
+            cache_model = self.local_cache.get(str(post_uuid))
+            if cache_model is not None:
+                return RepoResponse(
+                    status=True,
+                    data=cache_model,
+                    meta={
+                        "tier": "local",
+                    },
+                    errors={},
+                )
+
         try:
-            cache_model = (
-                PostsCacheModel
-                .find(PostsCacheModel.uuid == str(post_uuid))
-                .first()
-            )
+            cache_model = PostsCacheModel.get(str(post_uuid))
+            REDIS_CACHE_STATS.hit()
+
+            if self.local_cache is not None:
+                self.local_cache.set(str(post_uuid), cache_model)
 
             return RepoResponse(
                 status=True,
                 data=cache_model,
-                meta={},
+                meta={
+                    "tier": "redis",
+                },
                 errors={},
             )
-        except NotFoundError as e:
-            log_exception(log, e)
+        except NotFoundError:
+            log.debug("%s - No cached post has the uuid %s.", self.__class__.__name__, post_uuid)
+            REDIS_CACHE_STATS.miss()
 
             return RepoResponse(
                 status=True,
                 data=None,
-                meta={},
+                meta={
+                    "tier": None,
+                },
                 errors={},
             )
         except Exception as e:
@@ -192,42 +591,127 @@ class PostsCacheRepository:
             raise Exception("Unknown exception while retrieving a cached post using a uuid.")
 
 
-    def patch_one_by_uuid(self, post_uuid, patched_merged_model):
-        log.debug("%s - Patching a cached post with the uuid %s.", self.__class__.__name__, post_uuid)
-        log.debug(post_uuid)
-        log.debug(type(post_uuid))
-        log.debug(patched_merged_model)
-        log.debug(type(patched_merged_model))
+    def lock_post(self, post_uuid) -> Lock | None:
+        """
+        Try to become the one worker that loads a post into the cache.
+        The lock expires on its own after REDIS_CACHE_LOCK_TIMEOUT_SECONDS in case its holder dies.
+        :param post_uuid:
+        :return: Lock | None - None when another worker holds it; release it with unlock_post
+        """
+        lock = PostsCacheModel.db().lock(
+            f"{PostsCacheModel.make_primary_key(str(post_uuid))}:lock",
+            timeout=app_env_config.REDIS_CACHE_LOCK_TIMEOUT_SECONDS,
+            blocking=False,
+        )
+
+        return lock if lock.acquire() else None
 
+    @staticmethod
+    def unlock_post(lock: Lock) -> None:
         try:
-            updated_cache_model =  (
-                PostsCacheModel
-                .find(PostsCacheModel.uuid == str(post_uuid))
-                .update(
-                    title=patched_merged_model['title'],
-                    content=patched_merged_model['content'],
-                    published="TRUE" if patched_merged_model["published"] else "FALSE",
-                    rating=patched_merged_model['rating'],
-                    updated_at=patched_merged_model['updated_at'].isoformat(),
-                )
-            )
+            lock.release()
+        except LockError as e:
+            # It expired and may already belong to another worker; nothing to undo
+            log.warning("Could not release the cache lock %s: %s", lock.name, e)
 
-            log.debug("updated_cache_model = ")
-            log.debug(updated_cache_model)
-            log.debug(type(updated_cache_model))
 
-            return RepoResponse(
-                status=True,
-                data=True,
-                meta={},
-                errors={},
-            )
+    def invalidate_local_posts(self, post_uuids: list) -> None:
+        """
+        Drop posts from this worker's local cache and tell every other worker to
+        do the same. Call it whenever a cached post is changed or deleted.
+        :param post_uuids:
+        :return: None
+        """
+        if self.local_cache is None:
+            return
 
-        except ValidationError as e:
-            log.debug(e)
+        keys = [str(post_uuid) for post_uuid in post_uuids]
+        self.local_cache.delete(*keys)
+
+        try:
+            PostsCacheModel.db().publish(app_env_config.REDIS_CACHE_INVALIDATION_CHANNEL, json.dumps(keys))
         except Exception as e:
+            # The local TTL still bounds how long other workers can serve the old post
+            log_exception(log, e)
+
+    @staticmethod
+    def listen_for_invalidations() -> PubSubWorkerThread | None:
+        """
+        Subscribe to the invalidation channel in a background thread and drop the
+        posts other workers changed or deleted from this worker's local cache.
+        :return: PubSubWorkerThread | None - stop it on shutdown; None when the local cache is off
+        """
+        local_cache = get_posts_local_cache()
+        if local_cache is None:
+            return None
+
+        def on_invalidation(message: dict) -> None:
+            try:
+                local_cache.delete(*json.loads(message["data"]))
+            except (TypeError, ValueError) as e:
+                log.warning("Ignoring a malformed cache invalidation message: %s", e)
+
+        pubsub: PubSub = PostsCacheModel.db().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{app_env_config.REDIS_CACHE_INVALIDATION_CHANNEL: on_invalidation})
+        log.info("Listening for posts cache invalidations on %s.", app_env_config.REDIS_CACHE_INVALIDATION_CHANNEL)
+
+        def on_error(e: Exception, pubsub: PubSub, thread: PubSubWorkerThread) -> None:
+            # Keep listening; the next read reconnects and resubscribes
             log_exception(log, e)
-            raise Exception("Someting don happen ohh!")
+            time.sleep(1.0)
 
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=on_error)
 
 
+    def rekey_legacy_posts(self) -> int:
+        """
+        Move posts cached before keys were derived from the post uuid (random ULID pks)
+        to their uuid key, and add them to the posts index, with REKEY_POST_SCRIPT. A post
+        already cached under its uuid keeps that newer hash. Safe to run repeatedly and from
+        several workers at once; a key another worker already moved is skipped.
+        :return: The number of cached posts that were moved
+        """
+        log.debug("%s - Re-keying legacy cached posts.", self.__class__.__name__)
+
+        db = PostsCacheModel.db()
+        rekey_post: Script = db.register_script(REKEY_POST_SCRIPT)
+        batch_size = app_env_config.REDIS_CACHE_READ_BATCH_SIZE
+        legacy_pks = [pk for pk in PostsCacheModel.all_pks() if not self.is_uuid(pk)]
+        moved = 0
+
+        for offset in range(0, len(legacy_pks), batch_size):
+            pks = legacy_pks[offset:offset + batch_size]
+
+            pipeline = db.pipeline(transaction=False)
+            for pk in pks:
+                pipeline.hmget(PostsCacheModel.make_primary_key(pk), "uuid", "created_at", "id")
+            documents = pipeline.execute()
+
+            pipeline = db.pipeline(transaction=False)
+            for pk, (post_uuid, created_at, post_id) in zip(pks, documents):
+                if post_uuid:
+                    # Legacy posts also predate the sortable created_ts field
+                    created_ts = datetime.datetime.fromisoformat(created_at).timestamp() if created_at else 0.0
+                    rekey_post(
+                        keys=[
+                            PostsCacheModel.make_primary_key(pk),
+                            PostsCacheModel.make_primary_key(post_uuid),
+                            app_env_config.REDIS_CACHE_POSTS_INDEX_KEY,
+                        ],
+                        args=[post_uuid, created_ts, self.index_member(int(post_id), post_uuid) if post_id else ""],
+                        client=pipeline,
+                    )
+            results = pipeline.execute(raise_on_error=False)
+            moved += sum(1 for result in results if result == 1)
+
+        log.info("%s - Re-keyed %s legacy cached posts.", self.__class__.__name__, moved)
+
+        return moved
+
+    @staticmethod
+    def is_uuid(value: str) -> bool:
+        try:
+            uuid.UUID(value)
+            return True
+        except ValueError:
+            return False
@@ -1,9 +1,8 @@
 import logging
 
-from fastapi import Depends
+from sqlalchemy import lambda_stmt, select
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
-from app.database.configs.dbs import get_mysql_db, get_postgres_db
 from app.database.models.CustomerData.PostsModel import PostsModel
 from app.database.repositories.BaseAppRepository import RepoResponse
 from app.exceptions.data.PostsExceptions import InsertException
@@ -15,13 +14,18 @@ log = logging.getLogger(__name__)
 
 
 class PostsRepository:
-    mysqldb: Session = Depends(get_mysql_db)
-    postgresdb: Session = Depends(get_postgres_db)
-
-    def __init__(self) -> None:
+    """
+    The sessions are owned by the caller, e.g. the get_postgres_db_session and
+    get_mysql_db_session request scoped dependencies in dbs.py.
+    The lookups are lambda statements, built once and cached by SQLAlchemy (see PostsAsyncRepository).
+    """
+    mysqldb: Session | None
+    postgresdb: Session
+
+    def __init__(self, postgresdb: Session, mysqldb: Session | None = None) -> None:
         super().__init__()
-        self.mysqldb = get_mysql_db()
-        self.postgresdb = get_postgres_db()
+        self.mysqldb = mysqldb
+        self.postgresdb = postgresdb
 
 
     def insert(
@@ -73,7 +77,11 @@ class PostsRepository:
         """
         log.debug('%s - Finding all posts.', self.__class__.__name__)
         try:
-            posts = self.postgresdb.query(PostsModel).filter(PostsModel.deleted_at == None).all()
+            posts = self.postgresdb.scalars(lambda_stmt(
+                lambda: select(PostsModel)
+                .where(PostsModel.deleted_at.is_(None))
+                .execution_options(read_replica=True)
+            )).all()
 
             return RepoResponse(
                 status=True,
@@ -90,12 +98,15 @@ class PostsRepository:
     def find_one_by_uuid(self, post_uuid):
         log.debug('%s - Finding a post by its uuid: %s.', self.__class__.__name__, post_uuid)
         try:
-            post = (self.postgresdb.query(PostsModel)
-                     .filter(
-                        PostsModel.uuid == post_uuid,
-                        PostsModel.deleted_at.is_(None)
-                    )
-                    .first())
+            post = self.postgresdb.scalars(lambda_stmt(
+                lambda: select(PostsModel)
+                .where(
+                    PostsModel.uuid == post_uuid,
+                    PostsModel.deleted_at.is_(None)
+                )
+                .limit(1)
+                .execution_options(read_replica=True)
+            )).first()
 
             return RepoResponse(
                 status=True,
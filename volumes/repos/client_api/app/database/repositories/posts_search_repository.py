@@ -0,0 +1,140 @@
+import logging
+import re
+from typing import Final
+
+from redis.commands.search.field import NumericField, TagField, TextField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+from redis.exceptions import ResponseError
+from app.database.configs.dbs import get_redis_cache
+from app.database.models.ClientCache.PostsModel import PostsCacheModel
+from app.database.repositories.BaseAppRepository import RepoResponse
+from config import get_app_env_config
+
+
+log = logging.getLogger(__name__)
+app_env_config = get_app_env_config()
+
+# Words only: everything else is RediSearch query syntax, and a separator to its tokenizer anyway
+QUERY_TERMS = re.compile(r"\w+")
+
+# The hash fields a search returns. RediSearch drops a field named id from its results, so the
+# post's id comes back as post_id
+RETURN_FIELDS: Final[tuple[str, ...]] = (
+    "pk", "uuid", "title", "content", "published", "rating",
+    "created_at", "created_ts", "updated_at", "deleted_at",
+)
+
+
+class PostsSearchRepository:
+    """
+    Full text search over the cached posts with RediSearch.
+    The posts are the PostsCacheModel hashes the cache already holds; this index reads
+    them with the title weighted over the content. It is separate from the one redis_om's
+    Migrator keeps, whose full text fields also become TAG fields: a TAG index of every
+    post's content would cost more memory than the posts themselves.
+    """
+
+    def __init__(self):
+        self.redis_cache = get_redis_cache()
+        self.index = self.redis_cache.ft(app_env_config.REDIS_CACHE_SEARCH_INDEX)
+
+    def create_index(self) -> bool:
+        """
+        Create the search index unless it exists. RediSearch indexes the posts already
+        cached in the background, and every post cached from then on as it is written.
+        Change REDIS_CACHE_SEARCH_INDEX along with the schema, so the new index is built
+        next to the old one instead of failing to be created.
+        :return: bool - whether the index was created
+        """
+        try:
+            self.index.create_index(
+                (
+                    TextField("title", weight=2.0),
+                    TextField("content"),
+                    TagField("published"),
+                    NumericField("rating"),
+                    NumericField("created_ts", sortable=True),
+                ),
+                definition=IndexDefinition(prefix=[PostsCacheModel.make_key("")], index_type=IndexType.HASH),
+            )
+            log.info("Created the %s search index.", app_env_config.REDIS_CACHE_SEARCH_INDEX)
+            return True
+
+        except ResponseError as e:
+            if "already exists" not in str(e).lower():
+                # e.g. a Redis without the search module; searches then fall back to Postgres
+                log.warning("Could not create the %s search index: %s", app_env_config.REDIS_CACHE_SEARCH_INDEX, e)
+            return False
+
+    @staticmethod
+    def build_query(
+            terms: list[str],
+            published: bool | None = None,
+            rating_min: float | None = None,
+            rating_max: float | None = None,
+    ) -> str:
+        """
+        :param terms: Words that must all appear in the title or the content
+        :param published:
+        :param rating_min:
+        :param rating_max:
+        :return: str - e.g. "@title|content:(red fox) @published:{TRUE} @rating:[2.5 +inf]"
+        """
+        clauses = [f"@title|content:({' '.join(terms)})"]
+        if published is not None:
+            clauses.append(f"@published:{{{'TRUE' if published else 'FALSE'}}}")
+        if rating_min is not None or rating_max is not None:
+            low = "-inf" if rating_min is None else repr(float(rating_min))
+            high = "+inf" if rating_max is None else repr(float(rating_max))
+            clauses.append(f"@rating:[{low} {high}]")
+
+        return " ".join(clauses)
+
+    def search(
+            self,
+            text: str,
+            limit: int,
+            offset: int = 0,
+            published: bool | None = None,
+            rating_min: float | None = None,
+            rating_max: float | None = None,
+    ) -> RepoResponse:
+        """
+        One page of the cached posts matching text, best match first, in one round trip.
+        :param text: Free text; only its words are used
+        :param limit:
+        :param offset:
+        :param published:
+        :param rating_min:
+        :param rating_max:
+        :return: RepoResponse - data is (PostsCacheModel, BM25 score) pairs; meta holds the total matches
+        """
+        terms = QUERY_TERMS.findall(text)
+        if not terms:
+            return RepoResponse(status=True, data=[], errors={}, meta={"total": 0})
+
+        query = (
+            Query(self.build_query(terms, published, rating_min, rating_max))
+            .scorer("BM25")
+            .with_scores()
+            .return_fields(*RETURN_FIELDS)
+            .return_field("id", as_field="post_id")
+            .paging(offset, limit)
+        )
+        log.debug('%s - Searching the cached posts for %s.', self.__class__.__name__, query.query_string())
+        result = self.index.search(query)
+
+        matches = []
+        for document in result.docs:
+            fields = {name: getattr(document, name) for name in RETURN_FIELDS}
+            matches.append((PostsCacheModel(id=document.post_id, **fields), document.score))
+
+        return RepoResponse(
+            status=True,
+            data=matches,
+            errors={},
+            meta={
+                "total": result.total,
+            },
+        )
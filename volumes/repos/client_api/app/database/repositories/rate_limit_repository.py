@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import Final
+
+from redis.commands.core import AsyncScript
+from app.database.configs.dbs import get_redis_rate_limit
+from app.database.repositories.BaseAppRepository import RepoResponse
+from app.library.Metrics import REDIS_COMMAND_DURATION
+from app.library.RequestContext import record_redis_time
+
+
+log = logging.getLogger(__name__)
+
+
+# Refills the bucket for the time since it was last touched, then takes the cost from it if
+# it holds enough. Runs atomically in Redis, so every worker shares one bucket per client, and
+# uses the Redis clock, so the workers' clocks do not need to agree. Fractional values are
+# returned as strings because Redis truncates Lua numbers to integers.
+TOKEN_BUCKET_SCRIPT: Final[str] = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+-- A bucket left alone until it is full again is the same as no bucket
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RateLimitRepository:
+    """
+    Token buckets kept in the Redis cache, one per client key, through the rate
+    limiter's own asyncio connection (see get_redis_rate_limit).
+    """
+    KEY_PREFIX: Final[str] = 'ratelimit'
+
+    def __init__(self):
+        self.redis_rate_limit = get_redis_rate_limit()
+        # EVALSHA, loading the script on the first NOSCRIPT
+        self.token_bucket: AsyncScript = self.redis_rate_limit.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take_token(self, client_key: str, rate: float, capacity: float, cost: float = 1.0) -> RepoResponse:
+        """
+        Take cost tokens from the client's bucket, in one round trip.
+        :param client_key:
+        :param rate: Tokens added per second
+        :param capacity: The most tokens the bucket holds, i.e. the largest burst
+        :param cost:
+        :return: RepoResponse - status is whether the tokens were taken; data holds the
+                 tokens remaining and the seconds until enough are back
+        """
+        started = time.perf_counter()
+        try:
+            allowed, remaining, retry_after = await self.token_bucket(
+                keys=[f"{self.KEY_PREFIX}:{client_key}"],
+                args=[rate, capacity, cost],
+            )
+        finally:
+            # Timed like the cache's commands (see TimedRedis)
+            seconds = time.perf_counter() - started
+            record_redis_time(seconds)
+            REDIS_COMMAND_DURATION.labels("EVALSHA").observe(seconds)
+
+        return RepoResponse(
+            status=bool(allowed),
+            data={
+                "remaining": float(remaining),
+                "retry_after": float(retry_after),
+            },
+            errors={},
+            meta={},
+        )
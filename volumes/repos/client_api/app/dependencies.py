@@ -1,5 +1,9 @@
 from typing import Annotated
-from fastapi import Header, HTTPException, status
+from fastapi import Header, HTTPException, Query, status
+from config import get_app_env_config
+
+app_env_config = get_app_env_config()
+
 
 
 async def get_x_token_header(x_token: Annotated[str, Header()]):
@@ -10,5 +14,13 @@ async def get_accept_version_header(accept_version: Annotated[str, Header()]):
     if accept_version != "0.0.1":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The acceptable version requested via the header is invalid or has been deprecated.")
 
-async def filter_parameters(q: str | None = None, skip: int = 0, limit: int = 100):
-    return {"q": q, "skip": skip, "limit": limit}
\ No newline at end of file
+async def filter_parameters(
+        q: str | None = None,
+        cursor: str | None = None,
+        limit: Annotated[int, Query(ge=1, le=app_env_config.POSTS_PAGE_SIZE_MAX)] = app_env_config.POSTS_PAGE_SIZE_DEFAULT,
+):
+    """
+    Keyset pagination parameters. The cursor is the opaque 'next_cursor' returned
+    in the meta of the previous page; offsets (skip) are not supported.
+    """
+    return {"q": q, "cursor": cursor, "limit": limit}
\ No newline at end of file
@@ -29,6 +29,28 @@ def add_data_exception_handlers(app: FastAPI) -> None:
         )
 
 
+    @app.exception_handler(DeadlineExceededException)
+    async def deadline_exceeded_exception_handler(request: Request, exc: DeadlineExceededException):
+        log.warning(f"Deadline exceeded: {exc}")
+
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": False,
+                "message": "The request ran out of time.",
+                "data": {
+                    "err_msg": f"{exc}"
+                },
+            },
+        )
+
+
 class DatabaseConnectionException(Exception):
     def __init__(self, name: str):
-        self.name = name
\ No newline at end of file
+        self.name = name
+
+
+class DeadlineExceededException(TimeoutError):
+    """
+    Raised instead of sending a query or command once the request's deadline has passed.
+    """
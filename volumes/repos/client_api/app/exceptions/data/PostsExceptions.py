@@ -45,7 +45,7 @@ def add_posts_exception_handlers(app: FastAPI) -> None:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "status": False,
-                "message": "Could not retrieve a Post. Check the uuid and/or cache key. Also, try removing the key.",
+                "message": "Could not retrieve a Post. Check the uuid.",
             },
         )
 
@@ -62,19 +62,6 @@ def add_posts_exception_handlers(app: FastAPI) -> None:
             },
         )
 
-    @app.exception_handler(CacheKeyPostUuidMismatchException)
-    async def cache_key_post_uuid_mismatch_exception_handler(
-            request: Request,
-            exc: CacheKeyPostUuidMismatchException
-    ):
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content={
-                "status": False,
-                "message": "The uuid sent does not match the uuid retrieved from the model found with the cache key sent.",
-            },
-        )
-
 
 class CreationException(Exception):
     def __init__(self, message: str):
@@ -96,11 +83,6 @@ class ReadOneCachedException(Exception):
         self.message = message
 
 
-class CacheKeyPostUuidMismatchException(Exception):
-    def __init__(self, message: str):
-        self.message = message
-
-
 class GetCachedPostFailurePostServiceException(Exception):
     def __init__(self, message: str):
         self.message = message
@@ -0,0 +1,27 @@
+import hashlib
+
+from starlette.types import Scope
+
+
+def client_key(scope: Scope, trust_forwarded_for: bool) -> str:
+    """
+    Tells clients apart by their X-Token and IP address, e.g. for rate limits.
+    :param scope:
+    :param trust_forwarded_for: Whether the IP comes from X-Forwarded-For; only behind a proxy that sets it
+    :return: A key made of a digest of the X-Token, so no token is stored, and the client's IP address
+    """
+    token = b""
+    forwarded_for = None
+    for name, value in scope["headers"]:
+        if name == b"x-token":
+            token = value
+        elif name == b"x-forwarded-for":
+            forwarded_for = value
+
+    if trust_forwarded_for and forwarded_for:
+        # The first address is the client, the rest are the proxies it went through
+        ip = forwarded_for.split(b",")[0].strip().decode("latin-1")
+    else:
+        ip = scope["client"][0] if scope.get("client") else "-"
+
+    return f"{hashlib.blake2b(token, digest_size=8).hexdigest()}:{ip}"
@@ -0,0 +1,184 @@
+import gzip
+import logging
+import zlib
+from functools import lru_cache
+from typing import Callable, Protocol
+
+from app.library.LocalCache import LocalCache
+from config import get_app_env_config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Logging
+log = logging.getLogger(__name__)
+app_env_config = get_app_env_config()
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        """
+        :return: The end of the stream; the compressor cannot be used after it
+        """
+        ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int) -> None:
+        # wbits 31 writes the gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_compressors() -> dict[str, Callable[[], Compressor]]:
+    """
+    The content codings this worker can produce, in the order they are preferred when a
+    client accepts several equally: zstd and brotli are smaller and, at these levels,
+    cheaper than gzip. Brotli and zstd are left out when their packages are missing.
+    :return: dict - content coding to a factory of compressors at the configured level
+    """
+    compressors = {}
+    if zstandard is not None:
+        compressors["zstd"] = lambda: ZstdCompressor(app_env_config.APP_COMPRESSION_ZSTD_LEVEL)
+    if brotli is not None:
+        compressors["br"] = lambda: BrotliCompressor(app_env_config.APP_COMPRESSION_BROTLI_LEVEL)
+    compressors["gzip"] = lambda: GzipCompressor(app_env_config.APP_COMPRESSION_GZIP_LEVEL)
+
+    return compressors
+
+
+# Every content coding this app knows; a strong ETag is suffixed with the one its body was compressed with
+CONTENT_CODINGS = ("zstd", "br", "gzip")
+
+
+def etag_for_coding(etag: str, coding: str) -> str:
+    """
+    A strong ETag must differ between the identity and each compressed representation,
+    or caches could hand a gzip body to a client that asked for brotli. Weak ETags
+    only promise equivalent content, so they are left as they are.
+    :param etag: e.g. "abc"
+    :param coding: e.g. gzip
+    :return: str - e.g. "abc-gzip"
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+
+    return f'{etag[:-1]}-{coding}"'
+
+
+def etag_without_coding(etag: str) -> str:
+    """
+    The ETag a route computed, from the one a client echoes back in If-None-Match.
+    :param etag: e.g. "abc-gzip"
+    :return: str - e.g. "abc"
+    """
+    for coding in CONTENT_CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return f'{etag[:-len(suffix)]}"'
+
+    return etag
+
+
+def negotiate_encoding(accept_encoding: str | None, codings) -> str | None:
+    """
+    Pick the content coding for a response from the request's Accept-Encoding.
+    :param accept_encoding: e.g. "gzip, deflate, br;q=0.9, zstd"
+    :param codings: The codings on offer, most preferred first
+    :return: The coding with the highest q value, ties going to the most preferred; None for identity
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in codings:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    compressor = available_compressors()[coding]()
+    return compressor.compress(body) + compressor.flush()
+
+
+def decompress(body: bytes, coding: str) -> bytes:
+    """
+    For tests and benchmarks.
+    """
+    if coding == "gzip":
+        return gzip.decompress(body)
+    if coding == "br":
+        return brotli.decompress(body)
+
+    return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+@lru_cache(maxsize=None)
+def get_precompressed_cache() -> LocalCache | None:
+    """
+    Compressed bodies of GET responses that carry a strong ETag, keyed by
+    (path and query, ETag, content coding), so a hot post or page is compressed once
+    per version instead of on every hit. A new version has a new ETag, so nothing stale
+    is served. Kept next to the local posts cache, per worker.
+    :return: LocalCache | None - None when APP_COMPRESSION_CACHE_ENABLED is off
+    """
+    if not app_env_config.APP_COMPRESSION_CACHE_ENABLED:
+        return None
+
+    return LocalCache(
+        name="precompressed_responses",
+        max_items=app_env_config.APP_COMPRESSION_CACHE_MAX_ITEMS,
+        ttl_seconds=app_env_config.APP_COMPRESSION_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,120 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable
+
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from app.library.Compression import etag_without_coding
+
+
+def post_etag(post_uuid, updated_at: datetime.datetime) -> str:
+    """
+    A strong ETag for one version of a post: it changes whenever the post is updated.
+    The same for the post whether it comes from Postgres or from a cache tier.
+    :param post_uuid:
+    :param updated_at:
+    :return: str - quoted, ready for the ETag header
+    """
+    version = f"{post_uuid}:{updated_at.astimezone(datetime.timezone.utc).isoformat()}"
+    return f'"{hashlib.blake2b(version.encode("utf-8"), digest_size=16).hexdigest()}"'
+
+
+def collection_etag(posts: Iterable, next_cursor: str | None) -> str:
+    """
+    A strong ETag for a page of posts: it changes whenever a post joins, leaves or is
+    updated on the page, or the page's next cursor moves.
+    :param posts: Anything with uuid and updated_at attributes
+    :param next_cursor:
+    :return: str - quoted, ready for the ETag header
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for post in posts:
+        digest.update(f"{post.uuid}:{post.updated_at.astimezone(datetime.timezone.utc).isoformat()};".encode("utf-8"))
+    digest.update(f"next:{next_cursor}".encode("utf-8"))
+
+    return f'"{digest.hexdigest()}"'
+
+
+def is_conditional(headers: Headers) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def is_not_modified(headers: Headers, etag: str, last_modified: datetime.datetime | None) -> bool:
+    """
+    Whether a GET can be answered with a 304, per RFC 9110: If-None-Match wins when both
+    are sent, and is compared weakly so W/ copies of our ETag still match, as are the
+    copies CompressionMiddleware suffixed with a content coding.
+    :param headers: The request's headers
+    :param etag:
+    :param last_modified:
+    :return: bool
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+
+        return etag in (etag_without_coding(tag.strip().removeprefix("W/")) for tag in if_none_match.split(","))
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            # An invalid date is ignored, per the RFC
+            return False
+
+        # HTTP dates have a resolution of one second
+        return since.tzinfo is not None and last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def validator_headers(etag: str, last_modified: datetime.datetime | None, cache_control: str) -> dict[str, str]:
+    """
+    :param etag:
+    :param last_modified:
+    :param cache_control:
+    :return: The headers shared by a 200 and the 304 for the same representation
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        # The response depends on the API version, and a shared cache must not hand a
+        # response to a caller whose token was never checked
+        "Vary": "X-Token, Accept-Version",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+
+    return headers
+
+
+def per_request_headers(started_at: str, service_meta: dict) -> tuple[dict, dict[str, str]]:
+    """
+    Move what differs from one request to the next out of a response's meta and into
+    headers: when it started and completed, and which tier served it. What is left of
+    the body only depends on the representation its strong ETag names, so the
+    compressed body can be reused for the next request (see CompressionMiddleware).
+    :param started_at: When the route started
+    :param service_meta: The meta of the ServiceResponse
+    :return: (the service meta without them, the headers)
+    """
+    service_meta = dict(service_meta)
+    headers = {"X-Started-At": started_at}
+    completed = service_meta.pop("completed", None)
+    if completed is not None:
+        headers["X-Completed-At"] = completed["at"]
+    if service_meta.get("model"):
+        service_meta["model"] = dict(service_meta["model"])
+        source = service_meta["model"].pop("source", None)
+        if source is not None:
+            headers["X-Served-From"] = source
+
+    return service_meta, headers
+
+
+def not_modified_response(etag: str, last_modified: datetime.datetime | None, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified, cache_control))
@@ -0,0 +1,34 @@
+import base64
+import binascii
+import datetime
+import json
+
+
+def encode_cursor(
+        created_at: datetime.datetime,
+        model_id: int,
+) -> str:
+    """
+    Encode the (created_at, id) keyset position of the last item on a page
+    into an opaque, url safe cursor.
+    :param created_at:
+    :param model_id:
+    :return: str
+    """
+    payload = json.dumps({"created_at": created_at.isoformat(), "id": model_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """
+    Decode a cursor made by encode_cursor.
+    :param cursor:
+    :return: tuple - (created_at, id)
+    :raises ValueError: when the cursor was not made by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.datetime.fromisoformat(payload["created_at"]), int(payload["id"])
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise ValueError(f"The cursor '{cursor}' is invalid.")
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop runs a callback that should run every interval
+    seconds. Blocking calls and a backlog of ready callbacks both show up as lag, so it is
+    a direct measure of how long a newly arrived request waits before it is looked at.
+    The lag is smoothed so that one long callback does not trip load shedding on its own.
+    """
+
+    def __init__(self, interval_seconds: float, smoothing: float = 0.5) -> None:
+        """
+        :param interval_seconds:
+        :param smoothing: Weight of the newest sample in the moving average
+        """
+        self.interval_seconds = interval_seconds
+        self.smoothing = smoothing
+        self.lag_seconds = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, time.perf_counter() - started - self.interval_seconds)
+            self.lag_seconds += self.smoothing * (lag - self.lag_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.lag_seconds = 0.0
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class CacheStats:
+    """
+    Hit and miss counters for one cache tier.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self) -> dict:
+        """
+        A point in time view of the counters.
+        :return: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# One CacheStats per cache tier, keyed by the tier's name
+CACHE_STATS: dict[str, CacheStats] = {}
+
+
+def register_cache_stats(stats: CacheStats) -> CacheStats:
+    CACHE_STATS[stats.name] = stats
+    return stats
+
+
+def get_cache_stats() -> dict:
+    """
+    Snapshot the counters of every cache tier registered so far.
+    :return: dict
+    """
+    return {name: stats.snapshot() for name, stats in CACHE_STATS.items()}
+
+
+class LocalCacheStats(CacheStats):
+    """
+    CacheStats plus the reasons entries left a LocalCache.
+    """
+
+    def __init__(self, name: str, cache: "LocalCache") -> None:
+        super().__init__(name)
+        self.cache = cache
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        output = super().snapshot()
+        with self._lock:
+            output |= {
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+        return output | {
+            "size": len(self.cache),
+            "max_items": self.cache.max_items,
+        }
+
+
+class LocalCache:
+    """
+    A bounded, in-process LRU cache whose entries also expire after a TTL.
+    It is per worker process; keeping several workers coherent is up to the caller.
+    Thread safe, so entries can be invalidated from a listener thread.
+    """
+
+    def __init__(self, name: str, max_items: int, ttl_seconds: float) -> None:
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.stats = register_cache_stats(LocalCacheStats(name, self))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        :param key:
+        :return: The cached value, or None when it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.hit()
+                    return value
+
+                del self._entries[key]
+                self.stats.increment("expirations")
+
+        self.stats.miss()
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.stats.increment("evictions")
+
+    def delete(self, *keys: Hashable) -> int:
+        """
+        :param keys:
+        :return: The number of keys that were cached
+        """
+        deleted = 0
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    deleted += 1
+                    self.stats.increment("invalidations")
+
+        return deleted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,152 @@
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+# Set PROMETHEUS_MULTIPROC_DIR (to an empty directory, before the workers start) when
+# running several workers; every worker then writes its samples there and a scrape of
+# any one worker aggregates all of them.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0)
+FAST_LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1.0)
+
+
+# Routes
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_DEADLINE_EXCEEDED = Counter(
+    "http_request_deadline_exceeded_total",
+    "Requests answered with a 503 or 504 because they ran past their deadline, by route template.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_REJECTED = Counter(
+    "http_requests_rejected_total",
+    "Requests turned away before reaching a route: rate_limited (429), in_flight or loop_lag (503).",
+    ["reason"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+    multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "Smoothed delay of the event loop in running a scheduled callback.",
+    multiprocess_mode="livemax",
+)
+
+# Compression
+HTTP_RESPONSE_BYTES = Counter(
+    "http_response_bytes_total",
+    "Response body bytes before (identity) and after compression, by content coding.",
+    ["encoding", "stage"],
+)
+HTTP_RESPONSE_COMPRESSION_CPU = Counter(
+    "http_response_compression_cpu_seconds_total",
+    "CPU time spent compressing response bodies, by content coding.",
+    ["encoding"],
+)
+HTTP_RESPONSES_COMPRESSED = Counter(
+    "http_responses_compressed_total",
+    "Responses sent compressed: compressed (on this request) or precompressed (from the cache).",
+    ["encoding", "source"],
+)
+
+# PostService
+POSTS_CACHE_REQUESTS = Counter(
+    "posts_cache_requests_total",
+    "How PostService reads were served: hit_local, hit_redis, miss (read from the database), "
+    "refresh (read early from the database), fallback (a stale copy served after a failed refresh) "
+    "or bypass (a filtered page the cache cannot serve).",
+    ["operation", "result"],
+)
+
+# SQLAlchemy pools
+DB_POOL_EVENTS = Counter(
+    "db_pool_events_total",
+    "Connection pool events: connects, checkouts, checkins, invalidations and timeouts.",
+    ["engine", "event"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for the pool to hand out a connection.",
+    ["engine"],
+    buckets=FAST_LATENCY_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections currently checked in (idle) or checked out (in use), per pool.",
+    ["engine", "state"],
+    multiprocess_mode="livesum",
+)
+
+# Postgres read replicas
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total",
+    "Where the reads marked for a replica went: replica, primary_sticky (the client wrote "
+    "recently) or primary_unhealthy (no replica passed its health check).",
+    ["replica_set", "target"],
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy",
+    "1 while the replica passes its health checks, 0 while reads skip it.",
+    ["replica_set", "replica"],
+    multiprocess_mode="livemin",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "How far the replica's replay was behind the primary at its last health check.",
+    ["replica_set", "replica"],
+    multiprocess_mode="livemax",
+)
+
+# Redis
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Round trip time of Redis commands; pipelines are reported as PIPELINE.",
+    ["command"],
+    buckets=FAST_LATENCY_BUCKETS,
+)
+
+
+def get_metrics_registry() -> CollectorRegistry:
+    """
+    :return: CollectorRegistry - one aggregating every worker in multiprocess mode
+    """
+    if not MULTIPROCESS:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def make_metrics_endpoint():
+    """
+    A plain Starlette endpoint for /metrics, so scrapers are not subject to the
+    API's X-Token and Accept-Version header dependencies.
+    """
+    registry = get_metrics_registry()
+
+    async def metrics(request: Request) -> Response:
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+    return metrics
+
+
+def mark_worker_dead() -> None:
+    """
+    Drop this worker's live gauges from the aggregate when it exits.
+    :return: None
+    """
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,75 @@
+import time
+from contextvars import ContextVar
+from app.exceptions.data.AppExceptions import DeadlineExceededException
+
+
+class RequestContext:
+    """
+    What one request has done so far: its id, and the time it spent waiting on
+    Postgres and Redis, plus the time.monotonic() deadline it must respond by, if any,
+    and who sent it and whether its reads must stay on the Postgres primary.
+    Mutated in place, so copies of the context (e.g. the greenlets SQLAlchemy runs
+    its events in) all report into the same one.
+    """
+    __slots__ = (
+        "request_id", "postgres_seconds", "postgres_queries", "redis_seconds", "redis_commands", "deadline",
+        "client_key", "reads_primary",
+    )
+
+    def __init__(self, request_id: str, client_key: str | None = None) -> None:
+        self.request_id = request_id
+        self.postgres_seconds = 0.0
+        self.postgres_queries = 0
+        self.redis_seconds = 0.0
+        self.redis_commands = 0
+        self.deadline: float | None = None
+        self.client_key = client_key
+        # None until ReadYourWritesMiddleware has looked the client up
+        self.reads_primary: bool | None = None
+
+
+# The context of the request being handled, None outside of a request
+REQUEST_CONTEXT: ContextVar[RequestContext | None] = ContextVar("request_context", default=None)
+
+
+def get_request_id() -> str:
+    context = REQUEST_CONTEXT.get()
+    return context.request_id if context is not None else "-"
+
+
+def record_postgres_time(seconds: float) -> None:
+    context = REQUEST_CONTEXT.get()
+    if context is not None:
+        context.postgres_seconds += seconds
+        context.postgres_queries += 1
+
+
+def record_redis_time(seconds: float, commands: int = 1) -> None:
+    context = REQUEST_CONTEXT.get()
+    if context is not None:
+        context.redis_seconds += seconds
+        context.redis_commands += commands
+
+
+def get_remaining_seconds() -> float | None:
+    """
+    :return: What is left of the current request's deadline, None when it has none
+    """
+    context = REQUEST_CONTEXT.get()
+    if context is None or context.deadline is None:
+        return None
+
+    return context.deadline - time.monotonic()
+
+
+def get_remaining_budget(operation: str) -> float | None:
+    """
+    What is left of the current request's deadline for one more query or command.
+    :param operation: What was about to run, for the exception's message
+    :return: The remaining seconds, None when the request has no deadline
+    """
+    remaining = get_remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededException(f"No time was left to run {operation}.")
+
+    return remaining
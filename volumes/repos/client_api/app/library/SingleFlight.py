@@ -0,0 +1,54 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within one worker: the first caller
+    runs the call and every caller that arrives while it is in flight awaits the
+    same result instead of repeating the work.
+    Not thread safe; it is meant for coroutines sharing one event loop.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        :param key:
+        :param call: Only awaited when no call for key is already in flight
+        :return: The result of the call, shared by every caller for key
+        """
+        while (future := self._calls.get(key)) is not None:
+            try:
+                # Shielded so a caller that goes away does not cancel the call for the others
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The caller running the call went away before it finished; take over
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting, so mark the exception as retrieved to keep the loop quiet
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,29 +1,142 @@
+import atexit
+import copy
 import logging
-from datetime import datetime
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from app.library.RequestContext import get_request_id
 from config import get_app_env_config
 
 app_env_config = get_app_env_config()
 
+# One JSON line per request is logged here, into its own file
+REQUEST_LOGGER_NAME = "app.requests"
 
-def get_app_logger():
+# The listener writing queued records to the log file, once get_app_logger has run
+_queue_listener: QueueListener | None = None
 
-    fh = logging.FileHandler('./app/log/logs/app/app-{:%Y-%m-%d}.log'.format(datetime.now()))
-    formatter = logging.Formatter('%(asctime)s | %(levelname)-8s | %(lineno)04d | %(message)s')
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps every record with the id of the request it was logged during, or "-".
+    Must run where the record is created, before it is queued, for the contextvar to be visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = get_request_id()
+        return True
+
+
+class DeferredFormatQueueHandler(QueueHandler):
+    """
+    A QueueHandler that leaves all formatting to the listener's handlers: the caller only
+    copies the record, where QueueHandler.prepare merges its message and args first.
+    The args are formatted later on the listener's thread, so log a snapshot of a value
+    that may still change, e.g. dict(model.__dict__), rather than the value itself.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    A RotatingFileHandler that also rolls the file over every interval_seconds,
+    whichever comes first. Backups are numbered like RotatingFileHandler's.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, interval_seconds: int, backup_count: int) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval_seconds = interval_seconds
+        self.rollover_at = time.time() + interval_seconds
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval_seconds > 0 and time.time() >= self.rollover_at:
+            return True
+
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval_seconds
+
+
+def get_app_logger() -> QueueListener:
+    """
+    Route every record through a queue so the caller (usually the event loop) only
+    enqueues it; a background thread formats and writes it to a rotating log file.
+    Calling it again replaces the previous pipeline.
+    :return: QueueListener - stop it on shutdown to flush what is still queued
+    """
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+
+    os.makedirs(os.path.dirname(app_env_config.APP_LOG_FILE), exist_ok=True)
+    fh = SizeAndTimeRotatingFileHandler(
+        app_env_config.APP_LOG_FILE,
+        max_bytes=app_env_config.APP_LOG_MAX_BYTES,
+        interval_seconds=app_env_config.APP_LOG_ROTATE_INTERVAL_SECONDS,
+        backup_count=app_env_config.APP_LOG_BACKUP_COUNT,
+    )
+    formatter = logging.Formatter('%(asctime)s | %(levelname)-8s | %(request_id)s | %(lineno)04d | %(message)s')
     fh.setFormatter(formatter)
+    fh.addFilter(lambda record: record.name != REQUEST_LOGGER_NAME)
+
+    # Request lines are already JSON, so they are written as they are
+    os.makedirs(os.path.dirname(app_env_config.APP_REQUEST_LOG_FILE), exist_ok=True)
+    rh = SizeAndTimeRotatingFileHandler(
+        app_env_config.APP_REQUEST_LOG_FILE,
+        max_bytes=app_env_config.APP_LOG_MAX_BYTES,
+        interval_seconds=app_env_config.APP_LOG_ROTATE_INTERVAL_SECONDS,
+        backup_count=app_env_config.APP_LOG_BACKUP_COUNT,
+    )
+    rh.setFormatter(logging.Formatter('%(message)s'))
+    rh.addFilter(logging.Filter(REQUEST_LOGGER_NAME))
+
+    log_queue = queue.SimpleQueue()
+    qh = DeferredFormatQueueHandler(log_queue)
+    qh.addFilter(RequestIdFilter())
 
     logging.basicConfig(
         level=app_env_config.APP_LOG_LEVEL.value,
-        #filename='./app/log/logs/app.log',
-        #filemode='a',
-        format='%(asctime)s - %(levelname)-8s - %(message)s',
         force=True,
-        handlers=[fh],
+        handlers=[qh],
     )
 
+    _queue_listener = QueueListener(log_queue, fh, rh, respect_handler_level=True)
+    _queue_listener.start()
+
+    # Request lines are kept whatever APP_LOG_LEVEL is, unless they are turned off
+    request_logger = logging.getLogger(REQUEST_LOGGER_NAME)
+    request_logger.setLevel(logging.INFO)
+    request_logger.disabled = not app_env_config.APP_REQUEST_LOG_ENABLED
+
     logger = logging.getLogger(__name__)
     logger.propagate = False
 
+    return _queue_listener
+
+
+def stop_app_logger() -> None:
+    """
+    Write out every queued record and stop the background writer.
+    :return: None
+    """
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+# Also flush when the process exits without running the app's shutdown
+atexit.register(stop_app_logger)
+
+
 def log_exception(log, e: Exception):
     log.debug("Exception name is %s", e.__class__.__name__)
     log.debug("e.args =")
@@ -1,38 +1,146 @@
+import asyncio
 import datetime
 import logging
 import os
 import json
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, status
+from fastapi.responses import ORJSONResponse
 from redis_om import Migrator
+from app.database.configs.dbs import get_postgres_async_db_sessionmaker
+from app.database.configs.pool_metrics import get_pool_metrics
+from app.database.configs.replicas import get_replica_status, keep_replicas_checked
+from app.database.repositories.posts_cache_repository import PostsCacheRepository
+from app.database.repositories.posts_search_repository import PostsSearchRepository
+from app.library.Compression import get_precompressed_cache
+from app.library.EventLoopLag import EventLoopLagMonitor
+from app.library.LocalCache import get_cache_stats
+from app.library.Metrics import make_metrics_endpoint, mark_worker_dead
 from app.dependencies import get_x_token_header, get_accept_version_header
 from app.exceptions.AppExceptionHandlers import add_app_exception_handlers
 from app.exceptions.data.AppExceptions import add_data_exception_handlers
-from app.log.loggers.app_logger import get_app_logger
+from app.log.loggers.app_logger import get_app_logger, stop_app_logger
+from app.middleware.CompressionMiddleware import CompressionMiddleware
+from app.middleware.DeadlineMiddleware import DeadlineMiddleware
+from app.middleware.LoadSheddingMiddleware import LoadSheddingMiddleware
+from app.middleware.RateLimitMiddleware import RateLimitMiddleware
+from app.middleware.ReadYourWritesMiddleware import ReadYourWritesMiddleware
+from app.middleware.RequestLogMiddleware import RequestLogMiddleware
 from app.routers import PostsRouter
 from app.schemas.AppSchemas import AppResponse
+from app.services.PostService import PostService
 from config import get_app_env_config
 
 app_env_config = get_app_env_config()
+loop_lag = EventLoopLagMonitor(app_env_config.APP_LOAD_SHED_LOOP_LAG_INTERVAL_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load shedding watches how far behind the event loop is running
+    if app_env_config.APP_LOAD_SHED_ENABLED:
+        loop_lag.start()
+
+    # Other workers publish the posts they change so this worker's local cache drops them
+    invalidation_listener = PostsCacheRepository.listen_for_invalidations()
+
+    # Bulk load Postgres into Redis so the list endpoint can be served from the posts index
+    warm_up_task = None
+    if app_env_config.REDIS_CACHE_WARM_UP_ENABLED:
+        warm_up_task = asyncio.create_task(PostService.keep_cache_warm(
+            app_env_config.REDIS_CACHE_WARM_UP_BATCH_SIZE,
+            app_env_config.REDIS_CACHE_WARM_UP_INTERVAL_SECONDS,
+        ))
+
+    # Reads skip the replicas that cannot be reached or lag too far behind
+    replicas_task = None
+    if app_env_config.POSTGRESDB_REPLICA_DSNS:
+        get_postgres_async_db_sessionmaker()
+        replicas_task = asyncio.create_task(keep_replicas_checked(
+            app_env_config.POSTGRESDB_REPLICA_HEALTH_CHECK_SECONDS,
+        ))
+
+    yield
+
+    loop_lag.stop()
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    if replicas_task is not None:
+        replicas_task.cancel()
+    if invalidation_listener is not None:
+        invalidation_listener.stop()
+    # Flush the records still queued for the log file
+    stop_app_logger()
+    mark_worker_dead()
+
 
 app = FastAPI(
     title=app_env_config.APP_PROJECT_NAME,
     description=app_env_config.APP_PROJECT_DESCRIPTION,
-    dependencies=[Depends(get_x_token_header), Depends(get_accept_version_header)]
+    dependencies=[Depends(get_x_token_header), Depends(get_accept_version_header)],
+    lifespan=lifespan,
+    # Response models are serialized by pydantic-core and dumped by orjson, skipping jsonable_encoder
+    default_response_class=ORJSONResponse,
 )
 
 # Logging
 get_app_logger()
 log = logging.getLogger(__name__)
 
+# Middleware
+# The last one added runs first: the request log sets the context the deadline is kept in
+# Innermost, so the requests shed or rate limited do not look their client up
+if app_env_config.POSTGRESDB_REPLICA_DSNS:
+    app.add_middleware(ReadYourWritesMiddleware, exempt_paths=app_env_config.APP_LOAD_PROTECTION_EXEMPT_PATHS)
+if app_env_config.APP_REQUEST_DEADLINE_ENABLED:
+    app.add_middleware(
+        DeadlineMiddleware,
+        routes=app.router.routes,
+        default_seconds=app_env_config.APP_REQUEST_DEADLINE_SECONDS,
+        route_seconds=app_env_config.APP_REQUEST_DEADLINE_ROUTES,
+    )
+if app_env_config.APP_RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        per_second=app_env_config.APP_RATE_LIMIT_PER_SECOND,
+        burst=app_env_config.APP_RATE_LIMIT_BURST,
+        trust_forwarded_for=app_env_config.APP_TRUST_FORWARDED_FOR,
+        exempt_paths=app_env_config.APP_LOAD_PROTECTION_EXEMPT_PATHS,
+    )
+# Shedding comes before rate limiting so an overloaded worker does not spend a Redis round trip first
+if app_env_config.APP_LOAD_SHED_ENABLED:
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        max_in_flight=app_env_config.APP_LOAD_SHED_MAX_IN_FLIGHT,
+        max_loop_lag_seconds=app_env_config.APP_LOAD_SHED_MAX_LOOP_LAG_SECONDS,
+        loop_lag=loop_lag,
+        exempt_paths=app_env_config.APP_LOAD_PROTECTION_EXEMPT_PATHS,
+    )
+# Compresses every response, the 429s and 503s above included; inside the request log so its latency counts
+if app_env_config.APP_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=app_env_config.APP_COMPRESSION_MIN_SIZE,
+        precompressed=get_precompressed_cache(),
+    )
+app.add_middleware(RequestLogMiddleware, trust_forwarded_for=app_env_config.APP_TRUST_FORWARDED_FOR)
+
 # Exception Handlers
 add_app_exception_handlers(app)
 add_data_exception_handlers(app)
 
 # Routes
 app.include_router(PostsRouter.router)
+if app_env_config.APP_METRICS_ENABLED:
+    # Outside the API's routers so Prometheus can scrape it without the X-Token and Accept-Version headers
+    app.add_route("/metrics", make_metrics_endpoint(), include_in_schema=False)
 
 # Redis Cache models
 Migrator().run()
+PostsSearchRepository().create_index()
+if app_env_config.REDIS_CACHE_REKEY_ON_STARTUP:
+    # Posts cached under random ULID pks move to their uuid key
+    PostsCacheRepository().rekey_legacy_posts()
 
 
 @app.get("/", status_code=status.HTTP_200_OK, response_model=AppResponse)
@@ -79,5 +187,10 @@ async def health_check():
     return AppResponse(
         status=True,
         message="Health check endpoint is up and running.",
-        data="But Jesus looked at them and said, \"With man this is impossible, but with God all things are possible\"."
+        data="But Jesus looked at them and said, \"With man this is impossible, but with God all things are possible\".",
+        meta={
+            "db_pools": get_pool_metrics(),
+            "db_replicas": get_replica_status(),
+            "caches": get_cache_stats(),
+        }
     )
@@ -0,0 +1,192 @@
+import logging
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.library.Compression import Compressor, available_compressors, etag_for_coding, negotiate_encoding
+from app.library.LocalCache import LocalCache
+from app.library.Metrics import HTTP_RESPONSE_BYTES, HTTP_RESPONSE_COMPRESSION_CPU, HTTP_RESPONSES_COMPRESSED
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+# JSON from the API, NDJSON from the export and anything textual; images and the like are compressed already
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least minimum_size bytes with the best content
+    coding the client accepts: zstd, then brotli, then gzip. Smaller bodies fit in a
+    packet or two anyway, so compressing them only costs CPU.
+    Streamed responses, like the export, are compressed chunk by chunk. The compressed
+    body of a GET answered with a strong ETag is kept in the precompressed cache, keyed by
+    the path, the ETag and the coding, so the next hit on the same version of a post or
+    page is sent without compressing it again. Such a body must only depend on its ETag,
+    so the routes send what differs per request in headers (see per_request_headers).
+    A plain ASGI middleware, so streamed responses are not buffered.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, precompressed: LocalCache | None) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.precompressed = precompressed
+        self.compressors = available_compressors()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.compressors)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self, scope, send, coding)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """
+    The send of one request: holds the response start back until the first body chunk
+    shows whether, and how, the response is compressed.
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, send: Send, coding: str) -> None:
+        self.middleware = middleware
+        self.scope = scope
+        self._send = send
+        self.coding = coding
+        self.start_message: Message | None = None
+        # passthrough, compress (chunk by chunk), or precompressed (the app's body is dropped)
+        self.mode: str | None = None
+        self.compressor: Compressor | None = None
+        self.cache_key: tuple | None = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            if message["status"] == 304:
+                self.mode = "passthrough"
+                await self._send(self.not_modified(message))
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.mode is None:
+            await self.start(message)
+        elif self.mode == "passthrough":
+            await self._send(message)
+        elif self.mode == "compress":
+            await self.send_compressed(message)
+        # In precompressed mode the cached body was sent in full with the start
+
+    async def start(self, message: Message) -> None:
+        headers = MutableHeaders(raw=self.start_message.setdefault("headers", []))
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        content_type = headers.get("content-type", "")
+        if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+            await self.passthrough(message)
+            return
+
+        # Whether or not this one is compressed, the response depends on Accept-Encoding
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body and len(body) < self.middleware.minimum_size:
+            await self.passthrough(message)
+            return
+
+        etag = headers.get("etag")
+        precompressed = self.middleware.precompressed
+        if (
+                precompressed is not None
+                and not more_body
+                and self.scope["method"] == "GET"
+                and self.start_message["status"] == 200
+                and etag is not None
+                and not etag.startswith("W/")
+        ):
+            self.cache_key = (self.scope["path"], self.scope["query_string"], etag, self.coding)
+            compressed = precompressed.get(self.cache_key)
+            if compressed is not None:
+                self.mode = "precompressed"
+                HTTP_RESPONSES_COMPRESSED.labels(self.coding, "precompressed").inc()
+                HTTP_RESPONSE_BYTES.labels(self.coding, "compressed").inc(len(compressed))
+                await self.send_start(headers, len(compressed))
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+        self.mode = "compress"
+        self.compressor = self.middleware.compressors[self.coding]()
+        HTTP_RESPONSES_COMPRESSED.labels(self.coding, "compressed").inc()
+        if more_body:
+            # Streamed: the compressed length is unknown until the end
+            await self.send_start(headers, None)
+            await self.send_compressed(message)
+            return
+
+        compressed = self.compress(body, final=True)
+        if self.cache_key is not None:
+            precompressed.set(self.cache_key, compressed)
+        await self.send_start(headers, len(compressed))
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def passthrough(self, message: Message) -> None:
+        self.mode = "passthrough"
+        await self._send(self.start_message)
+        await self._send(message)
+
+    async def send_start(self, headers: MutableHeaders, content_length: int | None) -> None:
+        self.add_coding_headers(headers)
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        await self._send(self.start_message)
+
+    async def send_compressed(self, message: Message) -> None:
+        more_body = message.get("more_body", False)
+        body = self.compress(message.get("body", b""), final=not more_body)
+        if body or not more_body:
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def add_coding_headers(self, headers: MutableHeaders) -> None:
+        headers["content-encoding"] = self.coding
+        etag = headers.get("etag")
+        if etag is not None:
+            headers["etag"] = etag_for_coding(etag, self.coding)
+
+    def not_modified(self, message: Message) -> Message:
+        """
+        A 304 carries the validators of the 200 it stands for: when the client's copy was
+        compressed with this coding, so is its ETag. A body under the minimum size was
+        sent with the plain ETag, and the client echoes that one back instead.
+        :param message: The response start
+        :return: Message
+        """
+        headers = MutableHeaders(raw=message.setdefault("headers", []))
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag is not None:
+            coded_etag = etag_for_coding(etag, self.coding)
+            if coded_etag in Headers(scope=self.scope).get("if-none-match", ""):
+                headers["etag"] = coded_etag
+
+        return message
+
+    def compress(self, body: bytes, final: bool) -> bytes:
+        # Thread CPU time, so the log listener and pool threads are not counted
+        started = time.thread_time()
+        compressed = self.compressor.compress(body)
+        if final:
+            compressed += self.compressor.flush()
+        HTTP_RESPONSE_COMPRESSION_CPU.labels(self.coding).inc(time.thread_time() - started)
+        HTTP_RESPONSE_BYTES.labels(self.coding, "identity").inc(len(body))
+        HTTP_RESPONSE_BYTES.labels(self.coding, "compressed").inc(len(compressed))
+
+        return compressed
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+
+from fastapi.responses import ORJSONResponse
+from starlette import status
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.library.Metrics import HTTP_REQUEST_DEADLINE_EXCEEDED
+from app.library.RequestContext import REQUEST_CONTEXT
+from app.schemas.AppSchemas import AppResponse
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware:
+    """
+    Gives every request a deadline, per route template with a default for the rest,
+    and stores it in the request context so Postgres transactions and Redis commands
+    are given no more than what is left of it.
+    A handler still running at the deadline is cancelled and answered with a 504; one
+    that answers with a 5xx after the deadline (a query or command ran out of the
+    budget) is answered with a 503. Both are in the AppResponse format and counted.
+    The deadline covers the time to the start of the response, so a streamed body is
+    not cut off half way. Must run inside RequestLogMiddleware, which sets the context.
+    """
+
+    def __init__(self, app: ASGIApp, routes: list[BaseRoute], default_seconds: float, route_seconds: dict[str, float]) -> None:
+        """
+        :param app:
+        :param routes: The app's routes, to find the template the request will match
+        :param default_seconds:
+        :param route_seconds: Overrides keyed by "METHOD /route/template"; 0 turns the deadline off
+        """
+        self.app = app
+        self.routes = routes
+        self.default_seconds = default_seconds
+        self.route_seconds = route_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_path_for(scope)
+        seconds = self.route_seconds.get(f"{scope['method']} {route}", self.default_seconds)
+        if seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        context = REQUEST_CONTEXT.get()
+        deadline = time.monotonic() + seconds
+        if context is not None:
+            context.deadline = deadline
+
+        response_started = False
+        response_replaced = False
+
+        async def send_within_deadline(message: Message) -> None:
+            nonlocal response_started, response_replaced
+            if response_replaced:
+                # The app's own late error response was swapped for a 503
+                return
+
+            if message["type"] == "http.response.start":
+                response_started = True
+                if message["status"] >= 500 and time.monotonic() >= deadline:
+                    response_replaced = True
+                    await self.deadline_response(scope, status.HTTP_503_SERVICE_UNAVAILABLE, route, seconds)(scope, receive, send)
+                    return
+
+                # From here on the response is streaming; let it finish
+                timeout.reschedule(None)
+                if context is not None:
+                    context.deadline = None
+
+            await send(message)
+
+        try:
+            async with asyncio.timeout(seconds) as timeout:
+                await self.app(scope, receive, send_within_deadline)
+        except Exception:
+            if response_started:
+                raise
+
+            if timeout.expired():
+                response_status = status.HTTP_504_GATEWAY_TIMEOUT
+            elif time.monotonic() >= deadline:
+                response_status = status.HTTP_503_SERVICE_UNAVAILABLE
+            else:
+                raise
+
+            await self.deadline_response(scope, response_status, route, seconds)(scope, receive, send)
+
+    def route_path_for(self, scope: Scope) -> str | None:
+        """
+        The template of the route the router will match, found the way the router does.
+        :param scope:
+        :return: The route's path template, None when no route matches
+        """
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+
+        return None
+
+    @staticmethod
+    def deadline_response(scope: Scope, status_code: int, route: str | None, seconds: float) -> ORJSONResponse:
+        log.warning("%s %s did not complete within its %.3fs deadline.", scope["method"], scope["path"], seconds)
+        HTTP_REQUEST_DEADLINE_EXCEEDED.labels(scope["method"], route or "unmatched", status_code).inc()
+
+        return ORJSONResponse(
+            status_code=status_code,
+            content=AppResponse(
+                status=False,
+                message="The request did not complete within its deadline.",
+                data={
+                    "err_msg": f"{scope['method']} {scope['path']} did not complete within {seconds} seconds."
+                },
+                errors={},
+                meta={
+                    "deadline_seconds": seconds,
+                },
+            ).model_dump(),
+        )
@@ -0,0 +1,82 @@
+import logging
+
+from fastapi.responses import ORJSONResponse
+from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.library.EventLoopLag import EventLoopLagMonitor
+from app.library.Metrics import EVENT_LOOP_LAG, HTTP_REQUESTS_IN_FLIGHT, HTTP_REQUESTS_REJECTED
+from app.schemas.AppSchemas import AppResponse
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+
+class LoadSheddingMiddleware:
+    """
+    Turns requests away with a 503 and a Retry-After header, before any work is done on
+    them, while this worker already has max_in_flight requests in hand or its event loop
+    lags by more than max_loop_lag_seconds. Past either point every extra request only
+    makes all of them slower, so refusing some keeps the latency of the rest bounded and
+    lets a load balancer send them elsewhere.
+    The loop lag monitor must be started, e.g. in the app's lifespan; until it is only
+    the in-flight limit applies.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            max_in_flight: int,
+            max_loop_lag_seconds: float,
+            loop_lag: EventLoopLagMonitor,
+            exempt_paths: list[str],
+    ) -> None:
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag_seconds = max_loop_lag_seconds
+        self.loop_lag = loop_lag
+        self.exempt_paths = frozenset(exempt_paths)
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        EVENT_LOOP_LAG.set(self.loop_lag.lag_seconds)
+        if self.in_flight >= self.max_in_flight:
+            await self.shed(scope, receive, send, "in_flight", f"{self.in_flight} requests are already in flight.")
+            return
+        if self.loop_lag.lag_seconds > self.max_loop_lag_seconds:
+            await self.shed(scope, receive, send, "loop_lag", f"The event loop lags by {self.loop_lag.lag_seconds:.3f}s.")
+            return
+
+        self.in_flight += 1
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+    @staticmethod
+    async def shed(scope: Scope, receive: Receive, send: Send, reason: str, err_msg: str) -> None:
+        log.warning("Shed %s %s: %s", scope["method"], scope["path"], err_msg)
+        HTTP_REQUESTS_REJECTED.labels(reason).inc()
+
+        response = ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={
+                "Retry-After": "1",
+            },
+            content=AppResponse(
+                status=False,
+                message="The service is overloaded, try again shortly.",
+                data={
+                    "err_msg": err_msg,
+                },
+                errors={},
+                meta={},
+            ).model_dump(),
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,79 @@
+import logging
+import math
+
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
+from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.database.repositories.rate_limit_repository import RateLimitRepository
+from app.library.ClientKey import client_key
+from app.library.Metrics import HTTP_REQUESTS_REJECTED
+from app.schemas.AppSchemas import AppResponse
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+
+class RateLimitMiddleware:
+    """
+    Limits every client, identified by its X-Token and IP address, to a token bucket of
+    burst requests refilled at per_second requests a second, and answers the requests
+    over it with a 429 and a Retry-After header. The buckets live in Redis so the limit
+    holds across every worker. Costs one Redis round trip per request, awaited on an
+    asyncio connection; when Redis cannot be reached, or does not answer within
+    APP_RATE_LIMIT_REDIS_TIMEOUT_SECONDS, requests are let through rather than failing
+    the whole API with it.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            per_second: float,
+            burst: float,
+            trust_forwarded_for: bool,
+            exempt_paths: list[str],
+    ) -> None:
+        self.app = app
+        self.per_second = per_second
+        self.burst = burst
+        self.trust_forwarded_for = trust_forwarded_for
+        self.exempt_paths = frozenset(exempt_paths)
+        self.rate_limits = RateLimitRepository()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            repo_res = await self.rate_limits.take_token(client_key(scope, self.trust_forwarded_for), self.per_second, self.burst)
+        except RedisError as e:
+            log.warning("Rate limiting is off for this request, Redis failed: %s", e)
+            await self.app(scope, receive, send)
+            return
+
+        if repo_res.status:
+            await self.app(scope, receive, send)
+            return
+
+        HTTP_REQUESTS_REJECTED.labels("rate_limited").inc()
+        retry_after = math.ceil(repo_res.data["retry_after"])
+        response = ORJSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={
+                "Retry-After": str(retry_after),
+            },
+            content=AppResponse(
+                status=False,
+                message="Too many requests.",
+                data={
+                    "err_msg": f"The rate limit of {self.per_second:g} requests a second was exceeded.",
+                },
+                errors={},
+                meta={
+                    "retry_after": retry_after,
+                },
+            ).model_dump(),
+        )
+        await response(scope, receive, send)
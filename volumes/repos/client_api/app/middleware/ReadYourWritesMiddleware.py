@@ -0,0 +1,28 @@
+import logging
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.database.configs.replicas import ReadYourWrites
+
+
+# Logging
+log = logging.getLogger(__name__)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Looks up once per request whether its client wrote to the Postgres primary within
+    the last POSTGRESDB_REPLICA_STICKY_SECONDS, and records it in the request context,
+    so routing a read to a replica (ReplicaRoutingSession.get_bind) never waits on Redis.
+    Costs one Redis round trip per request, like the rate limit; only added when there
+    are replicas. Must run inside RequestLogMiddleware, which sets the context.
+    """
+
+    def __init__(self, app: ASGIApp, exempt_paths: list[str]) -> None:
+        self.app = app
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] not in self.exempt_paths:
+            ReadYourWrites.resolve()
+
+        await self.app(scope, receive, send)
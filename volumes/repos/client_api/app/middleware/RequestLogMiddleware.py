@@ -0,0 +1,82 @@
+import logging
+import time
+import uuid
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.library.ClientKey import client_key
+from app.library.Metrics import HTTP_REQUEST_DURATION
+from app.library.RequestContext import REQUEST_CONTEXT, RequestContext
+from app.log.loggers.app_logger import REQUEST_LOGGER_NAME
+
+
+# Logging
+log = logging.getLogger(REQUEST_LOGGER_NAME)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+
+class RequestLogMiddleware:
+    """
+    Gives every request an id (the caller's X-Request-ID when it sends one), makes it
+    available to every log record through the request context, returns it in the
+    X-Request-ID response header, and logs one JSON line per request with its route,
+    status and latency, and the time it spent in Postgres and Redis. The latency also
+    goes to the per route http_request_duration_seconds histogram.
+    A plain ASGI middleware, so streamed responses are not buffered.
+    """
+
+    def __init__(self, app: ASGIApp, trust_forwarded_for: bool = False) -> None:
+        self.app = app
+        self.trust_forwarded_for = trust_forwarded_for
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = self.request_id_from(scope) or uuid.uuid4().hex
+        context = RequestContext(request_id, client_key(scope, self.trust_forwarded_for))
+        token = REQUEST_CONTEXT.set(context)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"].append((REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            latency = time.perf_counter() - started
+            route = scope.get("route")
+            # Unmatched paths share one label so they cannot blow up the number of series
+            HTTP_REQUEST_DURATION.labels(scope["method"], getattr(route, "path", "unmatched"), status_code).observe(latency)
+            log.info(orjson.dumps({
+                "request_id": request_id,
+                "method": scope["method"],
+                # The route template keeps lines for the same endpoint groupable
+                "route": getattr(route, "path", None),
+                "path": scope["path"],
+                "status": status_code,
+                "latency_ms": round(latency * 1000, 3),
+                "postgres_ms": round(context.postgres_seconds * 1000, 3),
+                "postgres_queries": context.postgres_queries,
+                "redis_ms": round(context.redis_seconds * 1000, 3),
+                "redis_commands": context.redis_commands,
+            }).decode("utf-8"))
+            REQUEST_CONTEXT.reset(token)
+
+    @staticmethod
+    def request_id_from(scope: Scope) -> str | None:
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode("latin-1"):
+                # Only trust short, printable ids from callers
+                request_id = value.decode("latin-1")
+                return request_id if 0 < len(request_id) <= 128 and request_id.isprintable() else None
+
+        return None
@@ -2,25 +2,44 @@ import logging
 import uuid
 from datetime import datetime
 from typing import Annotated
-from fastapi import APIRouter, Response, status
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4, AfterValidator
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.configs.dbs import get_postgres_async_db
+from app.dependencies import filter_parameters
+from app.library.ConditionalRequests import (
+    collection_etag,
+    is_conditional,
+    is_not_modified,
+    not_modified_response,
+    per_request_headers,
+    post_etag,
+    validator_headers,
+)
 from app.schemas.AppSchemas import AppResponse
 from app.schemas.PostRequestsSchemas import (
     CreatePostRequestDataSchema,
     CreatePostInsertDataSchema,
-    PatchDataSchema
+    GetPostsRequestDataSchema,
+    PatchDataSchema,
+    PatchPostsBulkItemDataSchema,
+    SearchPostsRequestDataSchema,
 )
 from app.services.PostService import PostService
+from config import get_app_env_config
 
 #
-#    Especially for here, implement middleware that ensures request handling
-#    fails after one second. Implement in code (req timeouts) and
-#    in platform (k8s proxy-send-timeout). Also do this with databases and caches.
-#   Of course use k6 to test out load and implement ddos protection
+#    Request handling fails after APP_REQUEST_DEADLINE_SECONDS (see DeadlineMiddleware),
+#    and the same budget bounds Postgres statements and Redis commands.
+#    Still to do in platform (k8s proxy-send-timeout).
+#   Load is tested with benchmarks/posts_api_benchmark.py (and k6 against a deployed stack);
+#   RateLimitMiddleware and LoadSheddingMiddleware protect against bursts and floods.
 #
 
 # Logging
 log = logging.getLogger(__name__)
+app_env_config = get_app_env_config()
 
 
 router = APIRouter(
@@ -29,10 +48,11 @@ router = APIRouter(
 )
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=AppResponse)
 async def create_post(
         request_post_data: CreatePostRequestDataSchema,
-        response: Response
+        response: Response,
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
 ):
     started_at = datetime.now().isoformat()
     log.info("HIT: create post.")
@@ -47,8 +67,8 @@ async def create_post(
     # Process (and validate) insert data
     insert_post_data = CreatePostInsertDataSchema(**insert_data)
 
-    service = PostService()
-    service_res = service.create_post(insert_post_data)
+    service = PostService(postgresdb)
+    service_res = await service.create_post(insert_post_data)
     meta = {
         "started": {
             "at": started_at,
@@ -72,30 +92,199 @@ async def create_post(
     )
 
 
-@router.get("/{post_uuid}", status_code=status.HTTP_200_OK)
+@router.post("/bulk", status_code=status.HTTP_201_CREATED, response_model=AppResponse)
+async def create_posts(
+        request_posts_data: Annotated[list[CreatePostRequestDataSchema], Body(min_length=1, max_length=app_env_config.POSTS_BULK_MAX_ITEMS)],
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
+):
+    started_at = datetime.now().isoformat()
+    log.info("HIT: create posts in bulk.")
+
+    insert_posts_data = [
+        CreatePostInsertDataSchema(
+            title=request_post_data.title,
+            content=request_post_data.content,
+            published=request_post_data.published,
+            rating=request_post_data.rating if request_post_data.rating is not None else 0.0,
+        )
+        for request_post_data in request_posts_data
+    ]
+
+    service = PostService(postgresdb)
+    service_res = await service.create_posts(insert_posts_data)
+    meta = {
+        "started": {
+            "at": started_at,
+            "with": {
+                "count": len(request_posts_data),
+            }
+        },
+        "response": {} | service_res.meta
+    }
+
+    return AppResponse(
+        status=service_res.status,
+        message=f"Successfully created {len(service_res.data)} posts.",
+        data=service_res.data,
+        errors=service_res.errors,
+        meta=meta
+    )
+
+
+@router.patch("/bulk", status_code=status.HTTP_200_OK, response_model=AppResponse)
+async def patch_posts(
+        patch_posts_data: Annotated[list[PatchPostsBulkItemDataSchema], Body(min_length=1, max_length=app_env_config.POSTS_BULK_MAX_ITEMS)],
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
+):
+    started_at = datetime.now().isoformat()
+    log.info("HIT: patch posts in bulk.")
+
+    service = PostService(postgresdb)
+    service_res = await service.patch_posts(patch_posts_data)
+    meta = {
+        "started": {
+            "at": started_at,
+            "with": {
+                "count": len(patch_posts_data),
+            }
+        },
+        "response": {} | service_res.meta
+    }
+
+    return AppResponse(
+        status=service_res.status,
+        message=f"Patched {service_res.meta['model']['patched']} of {len(patch_posts_data)} posts.",
+        data=service_res.data,
+        errors=service_res.errors,
+        meta=meta
+    )
+
+
+@router.delete("/bulk", status_code=status.HTTP_200_OK, response_model=AppResponse)
+async def delete_posts(
+        post_uuids: Annotated[list[UUID4], Body(min_length=1, max_length=app_env_config.POSTS_BULK_MAX_ITEMS)],
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
+):
+    started_at = datetime.now().isoformat()
+    log.info("HIT: delete posts in bulk.")
+
+    service = PostService(postgresdb)
+    service_res = await service.delete_posts(post_uuids)
+    meta = {
+        "started": {
+            "at": started_at,
+            "with": {
+                "count": len(post_uuids),
+            }
+        },
+        "response": {} | service_res.meta
+    }
+
+    return AppResponse(
+        status=service_res.status,
+        message=f"Deleted {service_res.meta['model']['deleted']} of {len(post_uuids)} posts.",
+        data=service_res.data,
+        errors=service_res.errors,
+        meta=meta
+    )
+
+
+@router.get("/export", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_posts():
+    """
+    Stream every post as NDJSON (one JSON document per line).
+    Declared before /{post_uuid} so 'export' is not taken for a post uuid.
+    """
+    log.info("HIT: export posts.")
+
+    return StreamingResponse(
+        PostService.export_posts(app_env_config.POSTS_EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=AppResponse)
+async def search_posts(
+        q: Annotated[str, Query(min_length=1, max_length=app_env_config.POSTS_SEARCH_QUERY_MAX_LENGTH)],
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
+        limit: Annotated[int, Query(ge=1, le=app_env_config.POSTS_PAGE_SIZE_MAX)] = app_env_config.POSTS_PAGE_SIZE_DEFAULT,
+        offset: Annotated[int, Query(ge=0, le=app_env_config.POSTS_SEARCH_MAX_OFFSET)] = 0,
+        published: bool | None = None,
+        rating_min: Annotated[float | None, Query(ge=0)] = None,
+        rating_max: Annotated[float | None, Query(ge=0)] = None,
+):
+    """
+    Full text search of the posts' titles and contents, best match first.
+    Offset paginated: results are ordered by score, which has no stable keyset.
+    Declared before /{post_uuid} so 'search' is not taken for a post uuid.
+    """
+    started_at = datetime.now().isoformat()
+    log.info("HIT: search posts")
+
+    search_request = SearchPostsRequestDataSchema(
+        q=q,
+        limit=limit,
+        offset=offset,
+        published=published,
+        rating_min=rating_min,
+        rating_max=rating_max,
+    )
+
+    service = PostService(postgresdb)
+    service_res = await service.search_posts(search_request)
+    meta = {
+            "started": {
+                "at": started_at,
+                "with": search_request.model_dump()
+            },
+            "response": {} | service_res.meta
+        }
+
+    return AppResponse(
+        status=service_res.status,
+        message=f"Found {service_res.meta['page']['total']} posts matching the search.",
+        data=service_res.data,
+        errors=service_res.errors,
+        meta=meta
+    )
+
+
+@router.get("/{post_uuid}", status_code=status.HTTP_200_OK, response_model=AppResponse)
 async def get_post(
         post_uuid: str | UUID4 | Annotated[str, AfterValidator(lambda x: uuid.UUID(x, version=4))],
+        request: Request,
         response: Response,
-        ckey: str | None = None,
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
 ):
     started_at = datetime.now().isoformat()
     log.info("HIT: get post.")
 
-    service = PostService()
-    service_res = service.get_post(uuid.UUID(str(post_uuid)), ckey)
+    service = PostService(postgresdb)
+
+    # A client revalidating a cached post is answered from the cache tiers, without a body
+    if is_conditional(request.headers):
+        validators = service.get_cached_post_validators(uuid.UUID(str(post_uuid)))
+        if validators is not None and is_not_modified(request.headers, *validators):
+            return not_modified_response(*validators, app_env_config.POSTS_CACHE_CONTROL)
+
+    service_res = await service.get_post(uuid.UUID(str(post_uuid)))
+    service_meta, headers = per_request_headers(started_at, service_res.meta)
+    response.headers.update(headers)
     meta = {
             "started": {
-                "at": started_at,
                 "with": {
                     "post_uuid": post_uuid,
-                    "ckey": ckey,
                 }
             },
-            "response": {} | service_res.meta
+            "response": {} | service_meta
         }
 
     if service_res.status is True:
         message = f"Successfully retrieved the post identified by uuid: {post_uuid}."
+        etag = post_etag(service_res.data.uuid, service_res.data.updated_at)
+        if is_not_modified(request.headers, etag, service_res.data.updated_at):
+            return not_modified_response(etag, service_res.data.updated_at, app_env_config.POSTS_CACHE_CONTROL)
+        response.headers.update(validator_headers(etag, service_res.data.updated_at, app_env_config.POSTS_CACHE_CONTROL))
     else:
         response.status_code = status.HTTP_400_BAD_REQUEST
         message = f"Could not retrieve the post identified by uuid: {post_uuid}."
@@ -111,26 +300,47 @@ async def get_post(
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=AppResponse)
 async def get_posts(
-        response: Response
+        request: Request,
+        response: Response,
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
+        page_parameters: Annotated[dict, Depends(filter_parameters)],
+        published: bool | None = None,
+        rating_min: Annotated[float | None, Query(ge=0)] = None,
+        rating_max: Annotated[float | None, Query(ge=0)] = None,
 ):
     started_at = datetime.now().isoformat()
     log.info("HIT: get posts")
 
-    service = PostService()
-    service_res = service.get_posts()
+    page_request = GetPostsRequestDataSchema(
+        cursor=page_parameters["cursor"],
+        limit=page_parameters["limit"],
+        title=page_parameters["q"],
+        published=published,
+        rating_min=rating_min,
+        rating_max=rating_max,
+    )
+
+    service = PostService(postgresdb)
+    service_res = await service.get_posts(page_request)
+    service_meta, headers = per_request_headers(started_at, service_res.meta)
+    response.headers.update(headers)
     meta = {
             "started": {
-                "at": started_at,
-                "with": {}
+                "with": page_request.model_dump()
             },
-            "response": {} | service_res.meta
+            "response": {} | service_meta
         }
 
     if service_res.status is True:
-        message = "Successfully retrieved all posts."
+        message = "Successfully retrieved a page of posts."
+        # No Last-Modified: a post leaving the page would not move it, only the ETag catches that
+        etag = collection_etag(service_res.data, service_res.meta["page"]["next_cursor"])
+        if is_not_modified(request.headers, etag, None):
+            return not_modified_response(etag, None, app_env_config.POSTS_CACHE_CONTROL)
+        response.headers.update(validator_headers(etag, None, app_env_config.POSTS_CACHE_CONTROL))
     else:
         response.status_code = status.HTTP_400_BAD_REQUEST
-        message = "Could not retrieve all posts."
+        message = "Could not retrieve a page of posts."
 
     return AppResponse(
         status=service_res.status,
@@ -144,13 +354,14 @@ async def get_posts(
 @router.delete("/{post_uuid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
         post_uuid: str | UUID4 | Annotated[str, AfterValidator(lambda x: uuid.UUID(x, version=4))],
-        response: Response
+        response: Response,
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
 ):
     started_at = datetime.now().isoformat()
     log.info("HIT: delete post.")
 
-    service = PostService()
-    service_res = service.delete_post(uuid.UUID(str(post_uuid)))
+    service = PostService(postgresdb)
+    service_res = await service.delete_post(uuid.UUID(str(post_uuid)))
     meta = {
             "started": {
                 "at": started_at,
@@ -174,17 +385,18 @@ async def delete_post(
         )
 
 
-@router.patch("/{post_uuid}", status_code=status.HTTP_200_OK)
+@router.patch("/{post_uuid}", status_code=status.HTTP_200_OK, response_model=AppResponse)
 async def patch_post(
         post_uuid: str | UUID4 | Annotated[str, AfterValidator(lambda x: uuid.UUID(x, version=4))],
         patch_post_data: PatchDataSchema,
-        response: Response
+        response: Response,
+        postgresdb: Annotated[AsyncSession, Depends(get_postgres_async_db)],
 ):
     started_at = datetime.now().isoformat()
     log.info("HIT: patch post.")
 
-    service = PostService()
-    service_res = service.patch_post(uuid.UUID(str(post_uuid)), patch_post_data)
+    service = PostService(postgresdb)
+    service_res = await service.patch_post(uuid.UUID(str(post_uuid)), patch_post_data)
     meta = {
             "started": {
                 "at": started_at,
@@ -1,6 +1,6 @@
 import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, SerializeAsAny
 
 
 class AppResponse(BaseModel):
@@ -9,6 +9,7 @@ class AppResponse(BaseModel):
     """
     status: bool
     message: str
-    data: dict | list | bool | str = {}
+    # A response schema is serialized as its own class, not as a bare BaseModel
+    data: dict | list | bool | str | SerializeAsAny[BaseModel] = {}
     errors: dict = None
     meta: dict = {}
\ No newline at end of file
@@ -1,7 +1,8 @@
 import datetime
-from typing import Optional
+import uuid
+from typing import Any, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, UUID4, field_validator
 
 
 # Create
@@ -23,10 +24,13 @@ class CreatePostInsertDataSchema(BaseModel):
     published: bool = True
     rating: Optional[float] = None
 
-class CreatePostResponseDataSchema(BaseModel):
+class PostResponseDataSchema(BaseModel):
     """
-    This is the post data that will be returned to the API user after they have created a Post
+    The post data returned to the API user. Built in one step from a PostsModel row
+    or a PostsCacheModel with model_validate, instead of field by field.
     """
+    model_config = ConfigDict(from_attributes=True)
+
     uuid: str
     title: str
     content: str
@@ -36,20 +40,64 @@ class CreatePostResponseDataSchema(BaseModel):
     updated_at: datetime.datetime
     deleted_at: Optional[datetime.datetime] = None
 
+    @field_validator("uuid", mode="before")
+    @classmethod
+    def uuid_to_str(cls, value: Any) -> Any:
+        return str(value) if isinstance(value, uuid.UUID) else value
+
+    @field_validator("deleted_at", mode="before")
+    @classmethod
+    def cached_null_to_none(cls, value: Any) -> Any:
+        # The cache stores a missing deleted_at as "NULL"
+        return None if value in ("NULL", "") else value
+
+
+class CreatePostResponseDataSchema(PostResponseDataSchema):
+    """
+    This is the post data that will be returned to the API user after they have created a Post
+    """
+
 
 # Read
-class GetPostResponseDataSchema(BaseModel):
+class GetPostResponseDataSchema(PostResponseDataSchema):
     """
     This is the post data that will be returned to the API user when they request a Post
     """
-    uuid: str
-    title: str
-    content: str
-    published: bool
-    rating: float
-    created_at: datetime.datetime
-    updated_at: datetime.datetime
-    deleted_at: Optional[datetime.datetime] = None
+
+
+class GetPostsRequestDataSchema(BaseModel):
+    """
+    This is the page and the filters requested when listing Posts
+    """
+    cursor: Optional[str] = None
+    limit: int
+    title: Optional[str] = None
+    published: Optional[bool] = None
+    rating_min: Optional[float] = None
+    rating_max: Optional[float] = None
+
+
+class SearchPostsRequestDataSchema(BaseModel):
+    """
+    This is the full text query, the page and the filters requested when searching Posts
+    """
+    q: str
+    limit: int
+    offset: int = 0
+    published: Optional[bool] = None
+    rating_min: Optional[float] = None
+    rating_max: Optional[float] = None
+
+
+class SearchPostResponseDataSchema(BaseModel):
+    """
+    One search result: the post and how well it matched. Scores are only comparable
+    within one search, and differ between the search engines.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    post: GetPostResponseDataSchema
+    score: float
 
 
 # Update
@@ -63,9 +111,22 @@ class PutDataSchema(BaseModel):
     rating: float = None
 
 class PatchDataSchema(BaseModel):
-    title: Optional[str]
-    content: Optional[str]
-    published: Optional[bool] = True
+    """
+    Only the fields that are sent are updated
+    """
+    title: Optional[str] = None
+    content: Optional[str] = None
+    published: Optional[bool] = None
+    rating: Optional[float] = None
+
+class PatchPostsBulkItemDataSchema(BaseModel):
+    """
+    One item of a bulk patch. Only the fields that are sent are updated.
+    """
+    uuid: UUID4
+    title: Optional[str] = None
+    content: Optional[str] = None
+    published: Optional[bool] = None
     rating: Optional[float] = None
 
 
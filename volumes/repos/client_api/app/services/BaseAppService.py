@@ -6,7 +6,7 @@ from pydantic import BaseModel
 class ServiceResponse(BaseModel):
     status: bool
     message: Optional[str] = None
-    data: dict | int | list[Any]
+    data: dict | int | list[Any] | BaseModel
     errors: dict
     meta: Optional[dict] = None
 
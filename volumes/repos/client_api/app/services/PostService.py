@@ -1,28 +1,48 @@
+import asyncio
 import datetime
 import json
 import logging
+import time
 import uuid
 from datetime import timezone
-from typing import Any
-from pydantic import ValidationError
+from typing import Any, AsyncIterator, Mapping
+from pydantic import TypeAdapter, ValidationError
+from redis.exceptions import RedisError
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.configs.dbs import get_postgres_async_db_sessionmaker
 from app.database.models.ClientCache.PostsModel import PostsCacheModel
 from app.database.models.CustomerData.PostsModel import PostsModel
 from app.database.repositories.posts_cache_repository import PostsCacheRepository
-from app.database.repositories.posts_repository import PostsRepository
+from app.database.repositories.posts_async_repository import PostsAsyncRepository, row_fields
+from app.database.repositories.posts_search_repository import PostsSearchRepository
 from app.exceptions.data.PostsExceptions import (
     CreationException, DeleteException, StorageException,
-    CacheException, ReadOneException, CacheKeyPostUuidMismatchException,
-    ReadOneCachedException
+    CacheException, ReadOneException, ReadOneCachedException
 )
 from app.log.loggers.app_logger import log_exception
+from app.library.ConditionalRequests import post_etag
+from app.library.Cursors import decode_cursor, encode_cursor
+from app.library.Metrics import POSTS_CACHE_REQUESTS
+from app.library.SingleFlight import SingleFlight
 from app.schemas.PostRequestsSchemas import CreatePostInsertDataSchema, GetPostResponseDataSchema, \
-    CreatePostResponseDataSchema, PatchDataSchema
+    CreatePostResponseDataSchema, PatchDataSchema, GetPostsRequestDataSchema, PatchPostsBulkItemDataSchema, \
+    SearchPostsRequestDataSchema, SearchPostResponseDataSchema
 from app.services.BaseAppService import ServiceResponse
+from config import get_app_env_config
 
 
 # Logging
 log = logging.getLogger(__name__)
+app_env_config = get_app_env_config()
+
+# Database reads of posts missing from the cache, coalesced per uuid across the requests of this worker
+POST_LOADS = SingleFlight()
+
+# Validates a whole page of PostsModel entities or Rows and/or PostsCacheModels in one call
+POSTS_PAGE_ADAPTER = TypeAdapter(list[GetPostResponseDataSchema])
+SEARCH_RESULTS_ADAPTER = TypeAdapter(list[SearchPostResponseDataSchema])
 
 
 class PostService:
@@ -30,13 +50,15 @@ class PostService:
     This is the PostService class which handles all CRUD operations
     and related functionality for Posts.
     """
-    posts_repo: PostsRepository
+    posts_repo: PostsAsyncRepository
     posts_cache_repo: PostsCacheRepository
 
-    def __init__(self) -> None:
+    def __init__(self, postgresdb: AsyncSession) -> None:
         super().__init__()
-        self.posts_repo = PostsRepository()
+        # Nothing here changes the posts it reads, so they are read as lightweight Rows
+        self.posts_repo = PostsAsyncRepository(postgresdb, as_rows=app_env_config.POSTS_READ_AS_ROWS)
         self.posts_cache = PostsCacheRepository()
+        self.posts_search = PostsSearchRepository()
 
 
     @staticmethod
@@ -75,6 +97,22 @@ class PostService:
 
         return utc_timestamp
 
+    @staticmethod
+    def post_attributes(post: PostsModel | Row) -> Mapping:
+        """
+        :param post: A post read as a PostsModel entity or as a Row
+        :return: Its column values by name, as the cache repository takes them
+        """
+        return row_fields(post) if isinstance(post, Row) else post.__dict__
+
+    @staticmethod
+    def response_fields(post: PostsModel | Row | PostsCacheModel) -> Any:
+        """
+        :param post: A post read from the database or the cache
+        :return: What the response schemas validate fastest: a Row as a dict, anything else as it is
+        """
+        return row_fields(post) if isinstance(post, Row) else post
+
     @staticmethod
     def convert_model_to_cacheable_data(posts):
         log.debug("Converting models to dicts for insertion to cache.")
@@ -100,30 +138,22 @@ class PostService:
 
 
     # Create
-    def create_post(self, new_post_data: CreatePostInsertDataSchema):
-        log.debug(f'The %s has initiated creating a post.', self.__class__.__name__)
+    async def create_post(self, new_post_data: CreatePostInsertDataSchema):
+        log.debug('The %s has initiated creating a post.', self.__class__.__name__)
 
         try:
-            stored_model = self.store_post_in_db(new_post_data)
+            stored_model = await self.store_post_in_db(new_post_data)
 
             if stored_model is None:
                 raise Exception("Could not store the post in the db.")
 
             log.debug('%s - The new model is:', self.__class__.__name__)
-            log.debug(stored_model.__dict__)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(dict(stored_model.__dict__))
 
             cached_model = self.store_post_in_cache(stored_model)
 
-            output_data = CreatePostResponseDataSchema(
-                uuid=str(stored_model.uuid),
-                title=stored_model.title,
-                content=stored_model.content,
-                rating=stored_model.rating,
-                published=stored_model.published,
-                created_at=stored_model.created_at,
-                updated_at=stored_model.updated_at,
-                deleted_at=None if stored_model.deleted_at == "" else stored_model.deleted_at,
-            ).model_dump()
+            output_data = CreatePostResponseDataSchema.model_validate(stored_model)
 
             status = True
             data = output_data
@@ -150,7 +180,7 @@ class PostService:
             log_exception(log, e)
             raise CreationException('Could not create a post in the posts service layer.')
 
-    def store_post_in_db(self, new_post_data: CreatePostInsertDataSchema):
+    async def store_post_in_db(self, new_post_data: CreatePostInsertDataSchema):
         """
         Store a single post in the database.
         :param new_post_data: CreatePostInsertDataSchema
@@ -159,9 +189,10 @@ class PostService:
         log.debug('%s - Storing a post in the database.', self.__class__.__name__)
 
         try:
-            repo_res = self.posts_repo.insert(**new_post_data.model_dump())
+            repo_res = await self.posts_repo.insert(**new_post_data.model_dump())
             log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(repo_res.dict())
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(repo_res.dict())
 
             if not repo_res.status:
                 output_model = None
@@ -176,20 +207,22 @@ class PostService:
             log_exception(log, e)
             raise StorageException("The service could not store a post in the posts repository.")
 
-    def store_post_in_cache(self, post: PostsModel):
+    def store_post_in_cache(self, post: PostsModel | Row, compute_seconds: float = 0.0):
         """
         Store a single post in the cache.
         Returns a PostsCacheModel including the pk which can be used to get the model later.
         There are other indexes on the PostsCacheModel available for searching
         :param post:
+        :param compute_seconds: How long it took to load the post from the database
         :return: PostsCacheModel | None
         """
         log.debug('%s - Storing a post in the cache.', self.__class__.__name__)
 
         try:
-            cache_res = self.posts_cache.store_post(post.__dict__)
+            cache_res = self.posts_cache.store_post(self.post_attributes(post), compute_seconds)
             log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(cache_res.dict())
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(cache_res.dict())
 
             if not cache_res.status:
                 output_model = None
@@ -204,23 +237,76 @@ class PostService:
             log_exception(log, e)
             raise CacheException("The service could not store posts in the cache repository.")
 
+    async def create_posts(self, new_posts_data: list[CreatePostInsertDataSchema]):
+        """
+        Create many posts with one multi-row INSERT ... RETURNING and cache them
+        with one Redis pipeline. The insert is all or nothing.
+        :param new_posts_data:
+        :return: ServiceResponse - data holds one result per item, in request order
+        """
+        log.debug('The %s has initiated creating %s posts.', self.__class__.__name__, len(new_posts_data))
+
+        try:
+            repo_res = await self.posts_repo.insert_many([new_post_data.model_dump() for new_post_data in new_posts_data])
+            stored_models = repo_res.data
+
+            cache_res = self.posts_cache.store_posts([stored_model.__dict__ for stored_model in stored_models])
+            cached_models = cache_res.data
+
+            results = []
+            for index, (stored_model, cached_model) in enumerate(zip(stored_models, cached_models)):
+                results.append({
+                    "index": index,
+                    "status": True,
+                    "data": CreatePostResponseDataSchema.model_validate(stored_model),
+                    "cache_key": cached_model.pk,
+                })
+
+            return ServiceResponse(
+                status=True,
+                data=results,
+                errors={},
+                meta={
+                    "completed": {
+                        "at": datetime.datetime.now().isoformat(),
+                    },
+                    "model": {
+                        "created": len(results),
+                    },
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise CreationException('Could not create many posts in the posts service layer.')
+
     # Read
-    def get_post(self, post_uuid: uuid, cache_key: str = None):
+    async def get_post(self, post_uuid: uuid):
         log.debug('The %s is retrieving data for the post with uuid = %s.', self.__class__.__name__, post_uuid)
 
         try:
-            # Check if the cache key provided will find a cached mode
-            # of course check if the returned model has the same uuid as the sent post uuid
-            cached_model = None if cache_key is None else self.get_post_from_cache_wt_key(cache_key, post_uuid)
+            # Hot posts come from this worker's local cache, the rest cost a single HGETALL
+            cached_model, cache_tier = self.get_post_from_cache_wt_uuid(post_uuid)
+
+            refresh_early = cached_model is not None and self.posts_cache.should_refresh_early(cached_model)
+            cache_result = "refresh" if refresh_early else "miss" if cached_model is None else f"hit_{cache_tier}"
 
             # if the cached model is still None, we get the model from the db
             # of course we store the newly retrieved model in the cache as well
-            if cached_model is None:
-                repo_res = self.posts_repo.find_one_by_uuid(post_uuid)
-                log.debug('%s - Repo Response: ', self.__class__.__name__)
-                log.debug(repo_res.dict())
-
-                if repo_res.data is None:
+            if cached_model is None or refresh_early:
+                try:
+                    # Concurrent misses for the same uuid in this worker share one database read
+                    output_model, loaded_model = await POST_LOADS.do(str(post_uuid), lambda: self.load_post_into_cache(post_uuid))
+                except Exception as e:
+                    if not refresh_early:
+                        raise
+                    # The cached post is still valid, serve it and let a later request refresh it
+                    log_exception(log, e)
+                    output_model, loaded_model = cached_model, cached_model
+                    cache_result = "fallback"
+
+                POSTS_CACHE_REQUESTS.labels("get_post", cache_result).inc()
+
+                if output_model is None:
                     status = False
                     data = {
                         "err_msg": f"No model with the uuid {post_uuid} was found."
@@ -239,30 +325,22 @@ class PostService:
                         errors=errors,
                         meta=meta
                     )
-                else:
-                    output_model = repo_res.data
-                    # Use uuid to find a cached model first - Just in case the cache key was wrong. If that doesn't exist, then store
-                    # otherwise u create dup data with different cache keys
-                    cached_model = self.get_post_from_cache_wt_uuid(post_uuid)
 
-                    if cached_model is None or cached_model == 0:
-                        cached_model = self.store_post_in_cache(output_model)
+                cached_model = loaded_model
+                if not isinstance(output_model, PostsCacheModel):
+                    cache_tier = "db"
+                elif cache_tier is None:
+                    # Another worker loaded it while this one waited
+                    cache_tier = "redis"
 
             else:
+                POSTS_CACHE_REQUESTS.labels("get_post", cache_result).inc()
                 output_model = cached_model
                 log.debug("The retrieved cached model is:")
-                log.debug(output_model.__dict__)
-
-            output_data = GetPostResponseDataSchema(
-                uuid=str(output_model.uuid),
-                title=output_model.title,
-                content=output_model.content,
-                rating=output_model.rating,
-                published=output_model.published,
-                created_at=output_model.created_at,
-                updated_at=output_model.updated_at,
-                deleted_at=None if output_model.deleted_at is None or 'NULL' else output_model.deleted_at,
-            ).model_dump()
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(dict(output_model.__dict__))
+
+            output_data = GetPostResponseDataSchema.model_validate(self.response_fields(output_model))
 
             status = True
             data = output_data
@@ -271,7 +349,8 @@ class PostService:
                     "at": datetime.datetime.now().isoformat(),
                 },
                 "model": {
-                    "cache_key": cached_model.pk
+                    "cache_key": cached_model.pk,
+                    "source": cache_tier,
                 }
             }
             errors = {}
@@ -285,47 +364,79 @@ class PostService:
 
         except Exception as e:
             log_exception(log, e)
-            raise ReadOneException(f'The {self.__class__.__name__} could not retrieve the post with uuid = {post_uuid} and cache key = {cache_key}.')
+            raise ReadOneException(f'The {self.__class__.__name__} could not retrieve the post with uuid = {post_uuid}.')
 
-    def get_post_from_cache_wt_key(self, cache_key: str | None, post_uuid: uuid):
+    async def load_post_into_cache(self, post_uuid: uuid) -> tuple[PostsModel | Row | PostsCacheModel | None, PostsCacheModel | None]:
         """
-        Get a single post from the cache. Ensure the uuid of the retrieved post using the cache key
-        matches the uuid sent as an argument from the request
+        Read a post from the database and cache it. Across workers, only the worker
+        holding the post's Redis lock reads it; the others wait for it to show up in
+        the cache and only read the database themselves if it does not.
         :param post_uuid:
-        :param cache_key:
-        :return: PostsCacheModel | None
+        :return: The post, or None when it does not exist, and its cache model
         """
-        log.debug('%s - Retrieving a post from the cache using its cache key.', self.__class__.__name__)
+        lock = None
+        if app_env_config.REDIS_CACHE_LOCK_ENABLED:
+            lock = self.posts_cache.lock_post(post_uuid)
+            if lock is None:
+                log.debug('%s - Another worker is loading the post with uuid = %s.', self.__class__.__name__, post_uuid)
+                cached_model = await self.wait_for_cached_post(post_uuid)
+                if cached_model is not None:
+                    return cached_model, cached_model
 
         try:
-
-            if cache_key is None:
-                log.debug("Cache key is None.")
-                cache_res = None
-            else:
-                log.debug('Service is searching in the cache for the post using its cache key %s.', cache_key)
-                repo_res = self.posts_cache.find_one_wt_cache_key(cache_key)
-                log.debug('%s - Repo Response: ', self.__class__.__name__)
+            started = time.perf_counter()
+            # From the primary: a replica that has not replayed a delete yet would have it cached for hours
+            repo_res = await self.posts_repo.find_one_by_uuid(post_uuid, read_replica=False)
+            compute_seconds = time.perf_counter() - started
+            log.debug('%s - Repo Response: ', self.__class__.__name__)
+            if log.isEnabledFor(logging.DEBUG):
                 log.debug(repo_res.dict())
 
-                log.debug("UUID from the request: %s", post_uuid)
-                log.debug("UUID from the cached model: %s", repo_res.data.uuid)
+            if repo_res.data is None:
+                return None, None
 
-                if repo_res.data.uuid != str(post_uuid):
-                    raise CacheKeyPostUuidMismatchException(f"The post uuid retrieved from the model found with the cache key does not match the post uuid sent in the request.")
-                else:
-                    cache_res = repo_res.data
-                    log.debug("Cache Results are: ")
-                    log.debug(cache_res)
-                    log.debug(type(cache_res))
+            # The key is deterministic, so storing again can never create a duplicate
+            return repo_res.data, self.store_post_in_cache(repo_res.data, compute_seconds)
 
-            return cache_res
+        finally:
+            if lock is not None:
+                self.posts_cache.unlock_post(lock)
 
-        except Exception as e:
-            log_exception(log, e)
-            raise ReadOneCachedException("The service could not get a post from the cache repository.")
+    async def wait_for_cached_post(self, post_uuid: uuid) -> PostsCacheModel | None:
+        """
+        Poll the cache for a post another worker is loading, for at most REDIS_CACHE_LOCK_WAIT_SECONDS.
+        :param post_uuid:
+        :return: PostsCacheModel | None
+        """
+        deadline = time.monotonic() + app_env_config.REDIS_CACHE_LOCK_WAIT_SECONDS
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(app_env_config.REDIS_CACHE_LOCK_POLL_SECONDS)
+            cached_model, _ = self.get_post_from_cache_wt_uuid(post_uuid)
+            if cached_model is not None:
+                return cached_model
+
+        return None
+
+    def get_cached_post_validators(self, post_uuid: uuid) -> tuple[str, datetime.datetime] | None:
+        """
+        The ETag and Last-Modified of a post from the cache tiers alone, so a conditional
+        request for an unchanged post is answered without a database read or a body.
+        :param post_uuid:
+        :return: (etag, updated_at), or None when the post is not cached
+        """
+        cached_model, _ = self.get_post_from_cache_wt_uuid(post_uuid)
+        if cached_model is None:
+            return None
+
+        updated_at = datetime.datetime.fromisoformat(cached_model.updated_at)
+        return post_etag(cached_model.uuid, updated_at), updated_at
 
-    def get_post_from_cache_wt_uuid(self, post_uuid: uuid)-> PostsCacheModel | None:
+    def get_post_from_cache_wt_uuid(self, post_uuid: uuid)-> tuple[PostsCacheModel | None, str | None]:
+        """
+        :param post_uuid:
+        :return: The cached post, or None, and the cache tier ("local" or "redis") that had it
+        """
         log.debug('%s - Retrieving a post from the cache using its uuid.', self.__class__.__name__)
 
         try:
@@ -333,54 +444,47 @@ class PostService:
             log.debug('%s - Cache Repo Response: ', self.__class__.__name__)
             log.debug(type(cache_repo_res))
 
-            return cache_repo_res.data
+            return cache_repo_res.data, cache_repo_res.meta["tier"]
 
         except Exception as e:
             log_exception(log, e)
             raise ReadOneCachedException(f"The service could not get a post from the cache repository with the uuid {post_uuid}.")
 
-    def get_posts(self):
-        log.debug('The %s is retrieving all posts.', self.__class__.__name__)
-
-        repo_res = self.posts_cache.find_all()
-        log.debug('%s - Repo Response: ', self.__class__.__name__)
-        log.debug(repo_res.dict())
-
-        if repo_res.meta['count'] == 0:
-            log.debug('%s - No posts exist in cache. Retrieving from the repo instead.', self.__class__.__name__)
-            repo_posts = self.get_posts_from_repo()
-            log.debug("Retrieved all posts from the repo.")
-            log.debug(repo_posts)
-            log.debug(type(repo_posts))
-
-            output_posts = []
-            for repo_post in repo_posts:
-                cleaned_post = GetPostResponseDataSchema(
-                    uuid=str(repo_post.uuid),
-                    title=repo_post.title,
-                    content=repo_post.content,
-                    published=repo_post.published,
-                    rating=repo_post.rating,
-                    created_at=repo_post.created_at,
-                    updated_at=repo_post.updated_at,
-                    deleted_at=None if repo_post.deleted_at is None or 'NULL' else repo_post.deleted_at,
-                )
-                output_posts.append(cleaned_post)
+    async def get_posts(self, page_request: GetPostsRequestDataSchema):
+        log.debug('The %s is retrieving a page of posts.', self.__class__.__name__)
+
+        cursor = None if page_request.cursor is None else decode_cursor(page_request.cursor)
+        page_filters = {
+            "limit": page_request.limit,
+            "cursor": cursor,
+            "title": page_request.title,
+            "published": page_request.published,
+            "rating_min": page_request.rating_min,
+            "rating_max": page_request.rating_max,
+        }
 
+        filtered = any(page_filters[name] is not None for name in ("title", "published", "rating_min", "rating_max"))
+
+        # The posts index holds every post once warmed up, but only in (created_at, id) order
+        if not filtered and self.posts_cache.index_is_ready():
+            page_models = await self.get_posts_from_cache_index(page_request.limit, cursor)
+            source = "cache"
         else:
-            output_posts = []
-            for cached_post in repo_res.data:
-                cleaned_post = GetPostResponseDataSchema(
-                    uuid=cached_post.uuid,
-                    title=cached_post.title,
-                    content=cached_post.content,
-                    published=cached_post.published,
-                    rating=cached_post.rating,
-                    created_at=cached_post.created_at,
-                    updated_at=cached_post.updated_at,
-                    deleted_at=None if cached_post.deleted_at is None or 'NULL' else cached_post.deleted_at,
-                )
-                output_posts.append(cleaned_post)
+            log.debug('%s - Retrieving a page of posts from the repo.', self.__class__.__name__)
+            page_models = await self.get_posts_from_repo(page_filters)
+            source = "db"
+        # Filtered pages always come from the database; only unfiltered ones could have been a hit
+        POSTS_CACHE_REQUESTS.labels("get_posts", "hit_redis" if source == "cache" else "bypass" if filtered else "miss").inc()
+
+        output_posts = POSTS_PAGE_ADAPTER.validate_python(
+            [self.response_fields(page_model) for page_model in page_models],
+            from_attributes=True,
+        )
+
+        # One more post than the limit is fetched to know whether a next page exists
+        has_more = len(output_posts) > page_request.limit
+        output_posts = output_posts[:page_request.limit]
+        next_cursor = encode_cursor(output_posts[-1].created_at, page_models[page_request.limit - 1].id) if has_more else None
 
         status = True
         data = output_posts
@@ -390,8 +494,15 @@ class PostService:
                 "at": datetime.datetime.now().isoformat(),
             },
             "model": {
-                "total_posts": len(output_posts)
-            }
+                "total_posts": len(output_posts),
+                "source": source,
+            },
+            "page": {
+                "limit": page_request.limit,
+                "cursor": page_request.cursor,
+                "next_cursor": next_cursor,
+                "has_more": has_more,
+            },
         }
         return ServiceResponse(
             status=status,
@@ -400,30 +511,221 @@ class PostService:
             meta=meta
         )
 
-    def get_posts_from_repo(self):
-        log.debug("Retrieving posts from the repo.")
+    async def get_posts_from_cache_index(self, limit: int, cursor: tuple[datetime.datetime, int] | None) -> list[PostsCacheModel | PostsModel | Row]:
+        """
+        Read a page of the posts index, then the cached posts on it in one pipelined
+        round trip. Posts whose cache entry expired are read back from the database
+        in one query and cached again; posts that no longer exist leave the index.
+        :param limit:
+        :param cursor: The (created_at, id) of the last post of the previous page
+        :return: list - limit + 1 posts at most, the extra one signals a next page
+        """
+        log.debug('%s - Retrieving a page of posts from the cache index.', self.__class__.__name__)
+
+        try:
+            # Removing missing posts can pull more posts onto the page, so read it again; bounded just in case
+            for _ in range(3):
+                page = self.posts_cache.find_index_page(limit, cursor)
+                cached_posts, _ = self.posts_cache.find_many_by_pks([post_uuid for _, post_uuid in page])
+                posts_by_uuid = {cached_post.uuid: cached_post for cached_post in cached_posts}
+
+                missing_uuids = [post_uuid for _, post_uuid in page if post_uuid not in posts_by_uuid]
+                if not missing_uuids:
+                    break
+
+                # From the primary, as they are cached again and the ones it lacks leave the index
+                stored_posts = (await self.posts_repo.find_many_by_uuid(missing_uuids, read_replica=False)).data
+                if stored_posts:
+                    self.posts_cache.store_posts([self.post_attributes(stored_post) for stored_post in stored_posts])
+                posts_by_uuid |= {str(stored_post.uuid): stored_post for stored_post in stored_posts}
+
+                gone = [(post_id, post_uuid) for post_id, post_uuid in page if post_uuid not in posts_by_uuid]
+                if not gone:
+                    break
+                self.posts_cache.remove_from_index(gone)
+
+            return [posts_by_uuid[post_uuid] for _, post_uuid in page if post_uuid in posts_by_uuid]
+
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The service could not get a page of posts from the cache index.")
+
+    async def get_posts_from_repo(self, page_filters: dict):
+        log.debug("Retrieving a page of posts from the repo.")
         try:
-            return self.posts_repo.find_all().data
+            return (await self.posts_repo.find_page(**page_filters)).data
         except Exception as e:
             log_exception(log, e)
-            raise Exception("The service could not get all stored posts from the repo.")
+            raise Exception("The service could not get a page of stored posts from the repo.")
+
+    async def search_posts(self, search_request: SearchPostsRequestDataSchema):
+        """
+        Full text search of the posts' titles and contents. Served by RediSearch once the
+        cache holds every post; while it is cold, or when RediSearch fails, by the text
+        search of Postgres. Both rank the best matches first, but score them differently.
+        :param search_request:
+        :return: ServiceResponse - data is the page of results
+        """
+        log.debug('The %s is searching posts.', self.__class__.__name__)
+
+        search_filters = {
+            "limit": search_request.limit,
+            "offset": search_request.offset,
+            "published": search_request.published,
+            "rating_min": search_request.rating_min,
+            "rating_max": search_request.rating_max,
+        }
+
+        repo_res = None
+        if self.posts_cache.index_is_ready():
+            try:
+                repo_res = self.posts_search.search(search_request.q, **search_filters)
+                engine = "redisearch"
+                POSTS_CACHE_REQUESTS.labels("search_posts", "hit_redis").inc()
+            except RedisError as e:
+                log.warning("Searching posts in Postgres, RediSearch failed: %s", e)
+                POSTS_CACHE_REQUESTS.labels("search_posts", "fallback").inc()
+        else:
+            POSTS_CACHE_REQUESTS.labels("search_posts", "miss").inc()
+
+        if repo_res is None:
+            try:
+                repo_res = await self.posts_repo.search(search_request.q, **search_filters)
+                engine = "postgres"
+            except Exception as e:
+                log_exception(log, e)
+                raise Exception("The service could not search the stored posts in the repo.")
+
+        results = SEARCH_RESULTS_ADAPTER.validate_python(
+            [{"post": self.response_fields(post), "score": score} for post, score in repo_res.data],
+            from_attributes=True,
+        )
+        total = repo_res.meta["total"]
+        next_offset = search_request.offset + len(results)
+        # Deep pages are not served; past POSTS_SEARCH_MAX_OFFSET the query must be narrowed
+        has_more = next_offset < total and next_offset <= app_env_config.POSTS_SEARCH_MAX_OFFSET
+
+        return ServiceResponse(
+            status=True,
+            data=results,
+            errors={},
+            meta={
+                "completed": {
+                    "at": datetime.datetime.now().isoformat(),
+                },
+                "model": {
+                    "total_posts": len(results),
+                    "source": engine,
+                },
+                "page": {
+                    "limit": search_request.limit,
+                    "offset": search_request.offset,
+                    "next_offset": next_offset if has_more else None,
+                    "has_more": has_more,
+                    "total": total,
+                },
+            }
+        )
+
+
+
+    @staticmethod
+    async def export_posts(batch_size: int) -> AsyncIterator[bytes]:
+        """
+        Export every post as NDJSON, one line per post, straight from a Postgres
+        server side cursor. The request scoped session is closed before a streamed
+        body is sent, so the export opens and owns its own session.
+        :param batch_size:
+        :return: AsyncIterator[bytes]
+        """
+        log.debug('The PostService is exporting all posts.')
+
+        async with get_postgres_async_db_sessionmaker()() as postgresdb:
+            async for post in PostsAsyncRepository(postgresdb, as_rows=app_env_config.POSTS_READ_AS_ROWS).stream_all(batch_size):
+                yield GetPostResponseDataSchema.model_validate(PostService.response_fields(post)).model_dump_json().encode("utf-8") + b"\n"
+
+
+
+    @staticmethod
+    async def warm_up_cache(batch_size: int) -> int:
+        """
+        Bulk load every post from Postgres into Redis, batch_size posts per pipelined
+        round trip, then mark the posts index as complete. Only one worker warms up at
+        a time. The rows streamed can be as old as the warm-up, so a post already cached
+        (written through by a create or patch since) is kept, and a post deleted since
+        is skipped by its tombstone; see PostsCacheRepository.warm_up_posts.
+        :param batch_size:
+        :return: The number of posts cached, 0 when another worker is warming up
+        """
+        posts_cache = PostsCacheRepository()
+        lock = posts_cache.lock_warm_up()
+        if lock is None:
+            log.debug('Another worker is warming up the posts cache.')
+            return 0
+
+        log.info('Warming up the posts cache.')
+        warmed = 0
+
+        try:
+            async with get_postgres_async_db_sessionmaker()() as postgresdb:
+                batch = []
+                posts_repo = PostsAsyncRepository(postgresdb, as_rows=app_env_config.POSTS_READ_AS_ROWS)
+                async for post in posts_repo.stream_all(batch_size):
+                    batch.append(PostService.post_attributes(post))
+                    if len(batch) == batch_size:
+                        warmed += posts_cache.warm_up_posts(batch).meta["count"]
+                        batch = []
+                if batch:
+                    warmed += posts_cache.warm_up_posts(batch).meta["count"]
+
+            posts_cache.mark_index_ready()
+            log.info('Warmed up the posts cache with %s posts.', warmed)
+
+            return warmed
+
+        finally:
+            posts_cache.unlock_post(lock)
+
+    @staticmethod
+    async def keep_cache_warm(batch_size: int, interval_seconds: float) -> None:
+        """
+        Warm the cache up now, then check every interval_seconds that the posts index
+        is still complete (e.g. Redis was flushed) and warm it up again if not.
+        Meant to run as a background task for the lifetime of the app.
+        :param batch_size:
+        :param interval_seconds: 0 to only warm up once
+        :return: None
+        """
+        while True:
+            try:
+                if not PostsCacheRepository.index_is_ready():
+                    await PostService.warm_up_cache(batch_size)
+            except Exception as e:
+                log_exception(log, e)
+
+            if interval_seconds <= 0:
+                return
+
+            await asyncio.sleep(interval_seconds)
 
 
 
     # Delete
-    def delete_post(self, post_uuid: uuid):
+    async def delete_post(self, post_uuid: uuid):
         log.debug('The %s is deleting the post with uuid = %s.', self.__class__.__name__, post_uuid)
 
         try:
-            repo_res = self.posts_repo.delete_post_by_uuid(post_uuid)
+            repo_res = await self.posts_repo.delete_post_by_uuid(post_uuid)
             log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(repo_res.dict())
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(repo_res.dict())
 
-            output_model = repo_res.data
-            log.debug("output_model = ")
-            log.debug(output_model)
+            deleted_id = repo_res.data
+            log.debug("deleted_id = ")
+            log.debug(deleted_id)
 
-            self.posts_cache.delete_post_by_uuid(post_uuid)
+            self.posts_cache.delete_post_by_uuid(post_uuid, deleted_id)
+            self.posts_cache.invalidate_local_posts([post_uuid])
 
             return ServiceResponse(
                 status=True,
@@ -436,39 +738,80 @@ class PostService:
             raise DeleteException("The service could not delete a post from the posts repository.")
 
 
-    # Update
-    def patch_post(self, post_uuid: uuid, patch_post_data: PatchDataSchema):
-        log.debug('The %s is patching the data for the post with uuid = %s.', self.__class__.__name__, post_uuid)
+    async def delete_posts(self, post_uuids: list[uuid.UUID]):
+        """
+        Delete many posts with one DELETE ... RETURNING and one cache delete.
+        :param post_uuids:
+        :return: ServiceResponse - data holds one result per item, in request order
+        """
+        log.debug('The %s is deleting %s posts.', self.__class__.__name__, len(post_uuids))
 
         try:
-            current_model = self.posts_repo.find_one_by_uuid(post_uuid)
-            patched_data_model = patch_post_data.model_dump() | {"updated_at": datetime.datetime.now()}
-            patched_merged_model = current_model.data.__dict__ | patched_data_model
-            log.debug("patched_merged_model = ")
-            log.debug(patched_merged_model)
+            repo_res = await self.posts_repo.delete_many_by_uuid(post_uuids)
+            deleted_uuids = set(repo_res.data)
 
-            # Update the model in the db
-            self.patch_post_in_db(post_uuid, patched_merged_model)
+            if deleted_uuids:
+                self.posts_cache.delete_posts_by_uuid(repo_res.data)
+                self.posts_cache.invalidate_local_posts(list(deleted_uuids))
 
-            # Update the model in the cache
-            self.patch_post_in_cache(post_uuid, patched_merged_model)
+            results = []
+            for index, post_uuid in enumerate(post_uuids):
+                result = {"index": index, "uuid": str(post_uuid), "status": post_uuid in deleted_uuids}
+                if not result["status"]:
+                    result["errors"] = {"err_msg": f"No model with the uuid {post_uuid} was found."}
+                results.append(result)
 
-            # Get the newly updated post details
-            updated_post_res = self.posts_repo.find_one_by_uuid(post_uuid)
-            log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(updated_post_res.dict())
+            return ServiceResponse(
+                status=True,
+                data=results,
+                errors={},
+                meta={
+                    "completed": {
+                        "at": datetime.datetime.now().isoformat(),
+                    },
+                    "model": {
+                        "deleted": len(deleted_uuids),
+                    },
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise DeleteException("The service could not delete many posts from the posts repository.")
+
+
+    # Update
+    async def patch_post(self, post_uuid: uuid, patch_post_data: PatchDataSchema):
+        log.debug('The %s is patching the data for the post with uuid = %s.', self.__class__.__name__, post_uuid)
+
+        try:
+            # Only the fields sent in the request are updated. Every column is NOT NULL, so nulls are skipped too
+            patch = patch_post_data.model_dump(exclude_unset=True, exclude_none=True)
+            log.debug("patch = ")
+            log.debug(patch)
+
+            # Update the model in the db and get the new row back in the same round trip
+            updated_post = await self.patch_post_in_db(post_uuid, patch)
+
+            if updated_post is None:
+                return ServiceResponse(
+                    status=False,
+                    data={
+                        "err_msg": f"No model with the uuid {post_uuid} was found."
+                    },
+                    errors={},
+                    meta={
+                        "completed": {
+                            "at": datetime.datetime.now().isoformat(),
+                        },
+                        "model": None
+                    },
+                )
+
+            # Refresh the model in the cache from the returned row
+            self.patch_post_in_cache(updated_post)
 
             status = True
-            data = GetPostResponseDataSchema(
-                uuid=str(updated_post_res.data.uuid),
-                title=updated_post_res.data.title,
-                content=updated_post_res.data.content,
-                published=updated_post_res.data.published,
-                rating=updated_post_res.data.rating,
-                created_at=updated_post_res.data.created_at,
-                updated_at=updated_post_res.data.updated_at,
-                deleted_at=None if updated_post_res.data.deleted_at is None or 'NULL' else updated_post_res.data.deleted_at,
-            ).model_dump()
+            data = GetPostResponseDataSchema.model_validate(updated_post)
             meta = {
                 "completed": {
                     "at": datetime.datetime.now().isoformat(),
@@ -487,31 +830,75 @@ class PostService:
             log_exception(log, e)
             raise Exception("The service could not patch a post from the posts repository.")
 
-    def patch_post_in_db(self, post_uuid, patched_merged_model):
+    async def patch_post_in_db(self, post_uuid, patch: dict) -> PostsModel | None:
         log.debug('The %s is patching the data for the post with uuid = %s in the database.', self.__class__.__name__, post_uuid)
 
         try:
-            update_db_res = self.posts_repo.patch_one_by_uuid(post_uuid, patched_merged_model)
+            update_db_res = await self.posts_repo.patch_one_by_uuid(post_uuid, patch)
             log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(update_db_res.dict())
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(update_db_res.dict())
 
-            if update_db_res.data != 1:
-                raise Exception(f"The service did not patch the data for the post with uuid = {post_uuid} in the database.")
+            return update_db_res.data
 
         except Exception as e:
+            log_exception(log, e)
             raise Exception("The service could not patch the db stored data.")
 
-    def patch_post_in_cache(self, post_uuid, patched_merged_model) -> None:
-        log.debug('The %s is patching the data for the post with uuid = %s in the cache.', self.__class__.__name__, post_uuid)
+    def patch_post_in_cache(self, updated_post: PostsModel) -> None:
+        log.debug('The %s is refreshing the cached post with uuid = %s.', self.__class__.__name__, updated_post.uuid)
 
         try:
-            update_cache_res = self.posts_cache.patch_one_by_uuid(post_uuid, patched_merged_model)
-            log.debug('%s - Repo Response: ', self.__class__.__name__)
-            log.debug(update_cache_res.dict())
-
-            if update_cache_res.data is not True:
-                raise Exception("The service did not patch the data for the post in the cache.")
+            self.posts_cache.store_post(updated_post.__dict__)
+            self.posts_cache.invalidate_local_posts([updated_post.uuid])
 
         except Exception as e:
             log_exception(log, e)
             raise Exception("The service could not patch the cached data.")
+
+
+    async def patch_posts(self, patch_posts_data: list[PatchPostsBulkItemDataSchema]):
+        """
+        Patch many posts in one transaction, only touching the fields sent for each,
+        then refresh their cached copies in one pipeline.
+        :param patch_posts_data:
+        :return: ServiceResponse - data holds one result per item, in request order
+        """
+        log.debug('The %s is patching %s posts.', self.__class__.__name__, len(patch_posts_data))
+
+        try:
+            patches = [patch_post_data.model_dump(exclude_unset=True, exclude_none=True) | {"uuid": patch_post_data.uuid} for patch_post_data in patch_posts_data]
+            repo_res = await self.posts_repo.patch_many_by_uuid(patches)
+            updated_models = repo_res.data
+
+            updated_rows = [updated_model.__dict__ for updated_model in updated_models.values() if updated_model is not None]
+            if updated_rows:
+                self.posts_cache.store_posts(updated_rows)
+                self.posts_cache.invalidate_local_posts([updated_row["uuid"] for updated_row in updated_rows])
+
+            results = []
+            for index, patch_post_data in enumerate(patch_posts_data):
+                updated_model = updated_models.get(patch_post_data.uuid)
+                result = {"index": index, "uuid": str(patch_post_data.uuid), "status": updated_model is not None}
+                if updated_model is None:
+                    result["errors"] = {"err_msg": f"No model with the uuid {patch_post_data.uuid} was found."}
+                else:
+                    result["data"] = GetPostResponseDataSchema.model_validate(updated_model)
+                results.append(result)
+
+            return ServiceResponse(
+                status=True,
+                data=results,
+                errors={},
+                meta={
+                    "completed": {
+                        "at": datetime.datetime.now().isoformat(),
+                    },
+                    "model": {
+                        "patched": len(updated_rows),
+                    },
+                },
+            )
+        except Exception as e:
+            log_exception(log, e)
+            raise Exception("The service could not patch many posts in the posts repository.")
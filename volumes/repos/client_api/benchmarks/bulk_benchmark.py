@@ -0,0 +1,159 @@
+"""
+Benchmark of the throughput of the bulk endpoints against the single post ones, in posts
+per second, for each write:
+    create   N x POST /posts/          against POST /posts/bulk in batches
+    patch    N x PATCH /posts/{uuid}   against PATCH /posts/bulk in batches
+    delete   N x DELETE /posts/{uuid}  against DELETE /posts/bulk in batches
+The single post requests are sent by --concurrency clients, one at a time each (1, the
+default, is an ingest job posting one post after the other); the bulk requests one
+batch of --batch-size posts after the other. Each pass creates the posts it patches and
+deletes, so the run leaves the database as it found it.
+
+Requests go through httpx's ASGI transport straight into app.main:app, as in
+posts_api_benchmark, with the same backends: services (Postgres and Redis as
+configured) or stand-ins (fakeredis and an in-memory posts table whose round trips
+sleep --db-latency-ms).
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.bulk_benchmark
+    python3 -m benchmarks.bulk_benchmark --posts 5000 --batch-size 500 --concurrency 10
+    python3 -m benchmarks.bulk_benchmark --backend services
+"""
+import argparse
+import asyncio
+import contextlib
+import time
+
+import httpx
+
+from benchmarks.posts_api_benchmark import HEADERS, load_app
+
+
+def new_post_body(number: int) -> dict:
+    return {
+        "title": f"Bulk benchmark post {number}",
+        "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+        "published": number % 2 == 0,
+        "rating": number % 50 / 10,
+    }
+
+
+def checked(response: httpx.Response) -> dict | None:
+    response.raise_for_status()
+    # A deleted post is answered with 204 and no body
+    if response.status_code == 204:
+        return None
+
+    body = response.json()
+    if not body["status"]:
+        raise SystemExit(f"{response.request.method} {response.request.url.path} failed: {body}")
+
+    return body
+
+
+async def one_by_one(send, items: list, concurrency: int) -> list:
+    """
+    Send one request per item from concurrency clients.
+    :return: The responses' bodies, in the order of items
+    """
+    results = [None] * len(items)
+    remaining = iter(range(len(items)))
+
+    async def client():
+        for index in remaining:
+            results[index] = checked(await send(items[index]))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    return results
+
+
+async def in_batches(send, items: list, batch_size: int) -> list:
+    """
+    :return: The data of every batch's response, concatenated
+    """
+    data = []
+    for start in range(0, len(items), batch_size):
+        data += checked(await send(items[start:start + batch_size]))["data"]
+
+    return data
+
+
+async def single_pass(client: httpx.AsyncClient, posts: int, concurrency: int) -> dict[str, float]:
+    seconds = {}
+
+    started = time.perf_counter()
+    created = await one_by_one(lambda body: client.post("/posts/", json=body, headers=HEADERS), [new_post_body(i) for i in range(posts)], concurrency)
+    seconds["create"] = time.perf_counter() - started
+    post_uuids = [body["data"]["uuid"] for body in created]
+
+    started = time.perf_counter()
+    await one_by_one(lambda post_uuid: client.patch(f"/posts/{post_uuid}", json={"rating": 4.5}, headers=HEADERS), post_uuids, concurrency)
+    seconds["patch"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await one_by_one(lambda post_uuid: client.delete(f"/posts/{post_uuid}", headers=HEADERS), post_uuids, concurrency)
+    seconds["delete"] = time.perf_counter() - started
+
+    return seconds
+
+
+async def bulk_pass(client: httpx.AsyncClient, posts: int, batch_size: int) -> dict[str, float]:
+    seconds = {}
+
+    started = time.perf_counter()
+    created = await in_batches(lambda bodies: client.post("/posts/bulk", json=bodies, headers=HEADERS), [new_post_body(i) for i in range(posts)], batch_size)
+    seconds["create"] = time.perf_counter() - started
+    # One result per item, in request order
+    post_uuids = [result["data"]["uuid"] for result in created]
+
+    started = time.perf_counter()
+    await in_batches(
+        lambda batch: client.patch("/posts/bulk", json=[{"uuid": post_uuid, "rating": 4.5} for post_uuid in batch], headers=HEADERS),
+        post_uuids, batch_size,
+    )
+    seconds["patch"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await in_batches(lambda batch: client.request("DELETE", "/posts/bulk", json=batch, headers=HEADERS), post_uuids, batch_size)
+    seconds["delete"] = time.perf_counter() - started
+
+    return seconds
+
+
+async def benchmark(args: argparse.Namespace) -> tuple[dict[str, float], dict[str, float]]:
+    app = load_app(args.backend, args.db_latency_ms / 1000, "async")
+
+    lifespan = app.router.lifespan_context(app) if args.backend == "services" else contextlib.nullcontext()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+    async with lifespan, client:
+        # Unmeasured, so the pools and the compiled statements are warm
+        await single_pass(client, min(args.posts, 10), 1)
+        await bulk_pass(client, min(args.posts, 10), args.batch_size)
+
+        single = await single_pass(client, args.posts, args.concurrency)
+        bulk = await bulk_pass(client, args.posts, args.batch_size)
+
+    return single, bulk
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("stand-ins", "services"), default="stand-ins")
+    parser.add_argument("--posts", type=int, default=2000, help="Posts created, patched and deleted per pass")
+    parser.add_argument("--batch-size", type=int, default=500, help="Posts per bulk request, at most POSTS_BULK_MAX_ITEMS")
+    parser.add_argument("--concurrency", type=int, default=1, help="Clients sending the single post requests")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="Round trip of the stand-in database")
+    args = parser.parse_args()
+
+    single, bulk = asyncio.run(benchmark(args))
+
+    print(f"{args.posts} posts, single requests from {args.concurrency} clients, bulk batches of {args.batch_size}")
+    print(f"{'write':>7} {'single posts/s':>15} {'bulk posts/s':>13} {'speedup':>8}")
+    for write in single:
+        single_rate, bulk_rate = args.posts / single[write], args.posts / bulk[write]
+        print(f"{write:>7} {single_rate:>15.1f} {bulk_rate:>13.1f} {bulk_rate / single_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark of the Redis round trips and the latency of reading many cached posts, as a
+function of the number of posts read:
+    one by one   PostsCacheModel.get() per post, one HGETALL round trip each, as
+                 PostsCacheRepository.find_all used to read them
+    pipelined    PostsCacheRepository.find_many_by_pks, one pipelined round trip per
+                 REDIS_CACHE_READ_BATCH_SIZE posts (or --batch-size)
+    index page   find_index_page and then find_many_by_pks, what a page of GET /posts/
+                 served from the posts index costs
+Round trips are counted as the commands or pipelines written to a Redis connection.
+
+Seeds the posts straight into the cache, dated in the future so they are the newest
+of the posts index, and deletes them at the end.
+
+Backends:
+    services   Redis as configured in the environment, e.g. the docker-compose container.
+               Point it at a scratch one, the seeded posts go into the posts index.
+    stand-ins  fakeredis, with every round trip sleeping --rtt-ms to stand for the network.
+               Needs only `pip install fakeredis`.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.cache_reads_benchmark
+    python3 -m benchmarks.cache_reads_benchmark --posts 10,100,1000,10000 --batch-size 200
+    python3 -m benchmarks.cache_reads_benchmark --backend services
+"""
+import argparse
+import datetime
+import statistics
+import sys
+import time
+import uuid
+
+from redis.connection import AbstractConnection
+
+
+class RoundTrips:
+    """
+    Counts what is written to every Redis connection: a command, or a whole pipeline.
+    """
+
+    def __init__(self, rtt_seconds: float) -> None:
+        self.count = 0
+        send_packed_command = AbstractConnection.send_packed_command
+
+        def counted_send_packed_command(connection, command, check_health=True):
+            self.count += 1
+            if rtt_seconds:
+                time.sleep(rtt_seconds)
+            return send_packed_command(connection, command, check_health)
+
+        AbstractConnection.send_packed_command = counted_send_packed_command
+
+
+def use_stand_ins() -> None:
+    """
+    Point the cache at fakeredis. Must run before the cache models are imported.
+    :return: None
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("The stand-ins backend needs fakeredis: pip install fakeredis")
+
+    from redis_om import Migrator
+    from app.database.configs import dbs
+    from app.database.configs.redis_timing import TimedRedis
+
+    fake_redis = TimedRedis(connection_pool=fakeredis.FakeRedis(decode_responses=True).connection_pool)
+    dbs.get_redis_cache = lambda: fake_redis
+    # fakeredis has no RediSearch, and the reads need no search index
+    Migrator.run = lambda self: None
+
+
+def make_posts(count: int) -> list[dict]:
+    now = datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {
+            "id": 2_000_000_000 + i, "uuid": uuid.uuid4(), "title": f"Cached post {i}",
+            "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            "published": True, "rating": 2.5,
+            "created_at": now + datetime.timedelta(seconds=i), "updated_at": now, "deleted_at": None,
+        }
+        for i in range(count)
+    ]
+
+
+def measure(read, round_trips: RoundTrips, repeat: int) -> tuple[int, float, int]:
+    """
+    :return: The round trips of one read, its median latency in milliseconds, and the posts it read
+    """
+    # Unmeasured, so the connection is open and its handshake is not counted
+    read()
+    latencies = []
+    for _ in range(repeat):
+        before = round_trips.count
+        started = time.perf_counter()
+        posts = read()
+        latencies.append(time.perf_counter() - started)
+        trips = round_trips.count - before
+
+    return trips, statistics.median(latencies) * 1000, len(posts)
+
+
+def benchmark(args: argparse.Namespace) -> list[dict]:
+    from app.database.models.ClientCache.PostsModel import PostsCacheModel
+    from app.database.repositories.posts_cache_repository import PostsCacheRepository
+
+    round_trips = RoundTrips(args.rtt_ms / 1000 if args.backend == "stand-ins" else 0.0)
+    posts_cache = PostsCacheRepository()
+    rows = []
+    for count in args.posts:
+        posts = make_posts(count)
+        posts_cache.store_posts(posts)
+        pks = [str(post["uuid"]) for post in posts]
+        try:
+            reads = {
+                "one by one": lambda: [PostsCacheModel.get(pk) for pk in pks],
+                "pipelined": lambda: posts_cache.find_many_by_pks(pks, args.batch_size)[0],
+                "index page": lambda: posts_cache.find_many_by_pks(
+                    [post_uuid for _, post_uuid in posts_cache.find_index_page(count - 1)], args.batch_size
+                )[0],
+            }
+            for read, run in reads.items():
+                # Reading posts one by one takes a round trip each; fewer repeats keep large counts short
+                repeat = max(1, args.repeat if read != "one by one" else min(args.repeat, 10_000 // count))
+                trips, latency_ms, read_count = measure(run, round_trips, repeat)
+                if read_count != count:
+                    raise SystemExit(f"{read} read {read_count} of the {count} posts.")
+                rows.append({"posts": count, "read": read, "round_trips": trips, "ms": latency_ms})
+        finally:
+            posts_cache.delete_posts_by_uuid({post["uuid"]: post["id"] for post in posts})
+
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("stand-ins", "services"), default="stand-ins")
+    parser.add_argument("--posts", type=lambda value: [int(count) for count in value.split(",")], default=[10, 100, 1000, 5000],
+                        help="Comma separated numbers of posts to read")
+    parser.add_argument("--batch-size", type=int, help="Posts per pipelined round trip, default REDIS_CACHE_READ_BATCH_SIZE")
+    parser.add_argument("--rtt-ms", type=float, default=0.2, help="Round trip of the stand-in Redis")
+    parser.add_argument("--repeat", type=int, default=5, help="Reads per variant; the median is reported")
+    args = parser.parse_args()
+
+    if args.backend == "stand-ins":
+        use_stand_ins()
+
+    rows = benchmark(args)
+
+    print(f"{'posts':>6} {'read':>11} {'round trips':>12} {'ms':>9} {'ms/post':>8}")
+    for row in rows:
+        print(f"{row['posts']:>6} {row['read']:>11} {row['round_trips']:>12} {row['ms']:>9.2f} {row['ms'] / row['posts']:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
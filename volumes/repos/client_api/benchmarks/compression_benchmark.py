@@ -0,0 +1,88 @@
+"""
+Microbenchmark of response compression: the CPU each content coding and level costs per
+response, and the bytes it puts on the wire, for a single post and pages of posts as the
+routes serialize them. The last column is what a hit on the precompressed cache costs
+instead, so the saving of keeping compressed bodies is visible next to each codec.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.compression_benchmark
+    python3 -m benchmarks.compression_benchmark --sizes 1 20 100 --repeat 200
+"""
+import argparse
+import time
+
+from app.library.Compression import (
+    BrotliCompressor,
+    GzipCompressor,
+    ZstdCompressor,
+    brotli,
+    decompress,
+    zstandard,
+)
+from app.library.LocalCache import LocalCache
+from benchmarks.serialization_benchmark import from_attributes, make_posts
+
+
+def codecs() -> list[tuple[str, int, type]]:
+    """
+    :return: (content coding, level, compressor class), for the installed codecs at the levels worth comparing
+    """
+    levels = [("gzip", level, GzipCompressor) for level in (1, 6, 9)]
+    if brotli is not None:
+        levels += [("br", level, BrotliCompressor) for level in (1, 4, 6, 11)]
+    if zstandard is not None:
+        levels += [("zstd", level, ZstdCompressor) for level in (1, 3, 9)]
+
+    return levels
+
+
+def cpu_per_response(compressor_class: type, level: int, body: bytes, repeat: int) -> tuple[float, bytes]:
+    """
+    :return: The best of repeat runs, in CPU microseconds per response, and the compressed body
+    """
+    best = float("inf")
+    compressed = b""
+    for _ in range(repeat):
+        started = time.thread_time()
+        compressor = compressor_class(level)
+        compressed = compressor.compress(body) + compressor.flush()
+        best = min(best, time.thread_time() - started)
+
+    return best * 1_000_000, compressed
+
+
+def cpu_per_cache_hit(body: bytes, repeat: int) -> float:
+    """
+    :return: CPU microseconds to fetch a compressed body from a LocalCache, averaged over repeat hits
+    """
+    cache = LocalCache(name="compression_benchmark", max_items=16, ttl_seconds=60)
+    key = ("/posts/", b"limit=20", '"etag"', "zstd")
+    cache.set(key, body)
+    started = time.thread_time()
+    for _ in range(repeat):
+        cache.get(key)
+
+    return (time.thread_time() - started) / repeat * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 20, 100], help="Posts per response")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'posts':>6} {'bytes':>8} {'coding':>7} {'level':>6} {'wire bytes':>11} {'ratio':>7} {'cpu us':>9} {'cached us':>10}")
+    for size in args.sizes:
+        body = from_attributes(make_posts(size))
+        cache_hit = cpu_per_cache_hit(body, args.repeat)
+        for coding, level, compressor_class in codecs():
+            cpu, compressed = cpu_per_response(compressor_class, level, body, args.repeat)
+            assert decompress(compressed, coding) == body
+            print(
+                f"{size:>6} {len(body):>8} {coding:>7} {level:>6} {len(compressed):>11} "
+                f"{len(body) / len(compressed):>6.1f}x {cpu:>9.1f} {cache_hit:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
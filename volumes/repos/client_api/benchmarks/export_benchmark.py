@@ -0,0 +1,173 @@
+"""
+Check and benchmark of GET /posts/export over a large table: that the memory of the
+process stays flat however many posts are exported, and how fast they stream.
+
+Seeds --posts posts (1M by default), then sends one export request straight into
+app.main:app's ASGI callable and drops every chunk of the body as it arrives, so
+nothing but the app holds on to it (httpx's ASGI transport would keep the whole body).
+The resident set size (RSS) of the process is sampled as the body streams. Reported: the
+posts and bytes exported, the time to the first byte and to the last, the rate, and the
+RSS before, at every tenth of the export and at its peak. The script exits with 1 when
+the peak RSS grows by more than --max-rss-growth-mb over the RSS before the export,
+i.e. when the export no longer streams.
+
+Needs Postgres with the customerdb migrations applied, as configured in the environment,
+e.g. the docker-compose container. Seeding writes to that database: point it at a scratch
+one. --skip-seed exports the posts already stored.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.export_benchmark
+    python3 -m benchmarks.export_benchmark --skip-seed --accept-encoding zstd
+    python3 -m benchmarks.export_benchmark --posts 5000000 --max-rss-growth-mb 64
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+
+HEADERS = {
+    "X-Token": "fake-super-secret-token",
+    "Accept-Version": "0.0.1",
+}
+# RSS is read from /proc at most this often as the body arrives
+SAMPLE_SECONDS = 0.05
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+class ExportReader:
+    """
+    The ASGI send of the export request: counts what arrives and samples the RSS, keeping nothing.
+    """
+
+    def __init__(self) -> None:
+        self.status: int | None = None
+        self.headers: dict[str, str] = {}
+        self.chunks = 0
+        self.bytes = 0
+        self.lines = 0
+        self.started = time.perf_counter()
+        self.first_byte_seconds: float | None = None
+        # (posts, bytes) received so far and the RSS at that point
+        self.rss_samples: list[tuple[int, int, int]] = []
+        self.next_sample = 0.0
+        self.requested = False
+        self.done = asyncio.Event()
+
+    async def receive(self) -> dict:
+        if not self.requested:
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        # A streamed response listens for the client going away; it stays until the body is complete
+        await self.done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = {name.decode(): value.decode() for name, value in message.get("headers", [])}
+            return
+
+        body = message.get("body", b"")
+        if body and self.first_byte_seconds is None:
+            self.first_byte_seconds = time.perf_counter() - self.started
+        self.chunks += 1
+        self.bytes += len(body)
+        self.lines += body.count(b"\n")
+        now = time.perf_counter()
+        if now >= self.next_sample:
+            self.rss_samples.append((self.lines, self.bytes, rss_bytes()))
+            self.next_sample = now + SAMPLE_SECONDS
+        if not message.get("more_body", False):
+            self.done.set()
+
+
+def export_scope(accept_encoding: str) -> dict:
+    headers = HEADERS | {"Accept-Encoding": accept_encoding}
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/posts/export",
+        "raw_path": b"/posts/export",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> bool:
+    # One request; its rate limit is of no interest
+    os.environ.setdefault("APP_RATE_LIMIT_ENABLED", "False")
+    from app.main import app
+    from app.database.configs.dbs import get_postgres_async_db_engine
+    from benchmarks.index_plans_benchmark import seed
+
+    engine = get_postgres_async_db_engine()
+    if not args.skip_seed:
+        await seed(engine, args.posts)
+    async with engine.connect() as connection:
+        live_posts = (await connection.execute(text("SELECT count(*) FROM posts WHERE deleted_at IS NULL"))).scalar_one()
+
+    rss_before = rss_bytes()
+    reader = ExportReader()
+    await app(export_scope(args.accept_encoding), reader.receive, reader.send)
+    seconds = time.perf_counter() - reader.started
+    await engine.dispose()
+
+    # Sampled every SAMPLE_SECONDS; the kernel's own peak (ru_maxrss) may predate the export
+    peak = max([rss for _, _, rss in reader.rss_samples] + [rss_bytes()])
+    growth_mb = (peak - rss_before) / 2 ** 20
+    coding = reader.headers.get("content-encoding", "identity")
+
+    print(f"Status {reader.status}, content-encoding {coding}, {live_posts:,} live posts in the table")
+    # A compressed body's lines cannot be counted as it arrives, so its progress is in bytes
+    if coding == "identity":
+        print(f"Exported {reader.lines:,} posts, {reader.bytes / 2 ** 20:,.1f} MiB in {reader.chunks:,} chunks")
+    else:
+        print(f"Exported {reader.bytes / 2 ** 20:,.1f} MiB in {reader.chunks:,} chunks")
+    print(f"First byte after {(reader.first_byte_seconds or 0) * 1000:.1f} ms, last after {seconds:.1f} s, "
+          f"{live_posts / seconds:,.0f} posts/s")
+    print(f"RSS before {rss_before / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB (+{growth_mb:.1f} MiB)")
+    tenth = max(1, len(reader.rss_samples) // 10)
+    for lines, sent, rss in reader.rss_samples[tenth - 1::tenth]:
+        progress = f"{lines:>10,} posts" if coding == "identity" else f"{sent / 2 ** 20:>8.1f} MiB sent"
+        print(f"  after {progress}: {rss / 2 ** 20:.1f} MiB")
+
+    checks = {
+        "the export answered 200": reader.status == 200,
+        "every live post was exported": coding != "identity" or reader.lines == live_posts,
+        f"the RSS grew by at most {args.max_rss_growth_mb} MiB": growth_mb <= args.max_rss_growth_mb,
+    }
+    for check, passed in checks.items():
+        print(f"  {'ok  ' if passed else 'FAIL'} {check}")
+
+    return all(checks.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000, help="Posts to seed")
+    parser.add_argument("--skip-seed", action="store_true", help="Export the posts already stored")
+    parser.add_argument("--accept-encoding", default="identity", help="Accept-Encoding of the request, e.g. zstd")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=100.0, help="The RSS growth the export may cause")
+    args = parser.parse_args()
+
+    if not asyncio.run(benchmark(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Check of the query plans of the posts list, GET /posts/ read from Postgres, and benchmark
+of their execution time.
+
+Seeds --posts posts (500k by default, a few percent of them soft deleted), vacuums and
+analyzes the table, then runs EXPLAIN (ANALYZE, BUFFERS) on the statements of
+PostsAsyncRepository.find_page: the first page, a page deep into the table, and pages
+filtered by published, rating and title. Each must read its ids from one of the partial
+covering indexes of the live posts (ix_posts_live_created_at_id,
+ix_posts_live_published_created_at_id), with an index only scan unless it filters on the
+title, and never scan the whole table. Reported per page: the index used, the heap pages
+fetched by the index only scan, the buffers touched and the median execution time.
+The script exits with 1 when a plan does not pass, e.g. after a change to the statement
+or the indexes the planner can no longer match; tests/test_index_plans.py asserts the same
+checks under pytest (marked postgres).
+
+Needs Postgres with the customerdb migrations applied, as configured in the environment,
+e.g. the docker-compose container. Seeding writes to that database: point it at a scratch
+one. --skip-seed checks the posts already stored.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.index_plans_benchmark
+    python3 -m benchmarks.index_plans_benchmark --skip-seed --repeat 20
+    python3 -m benchmarks.index_plans_benchmark --posts 2000000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from sqlalchemy import text
+
+
+LIVE_INDEX = "ix_posts_live_created_at_id"
+LIVE_PUBLISHED_INDEX = "ix_posts_live_published_created_at_id"
+LIMIT = 20
+
+# The pages checked: find_page's filters, the indexes the page may be read from, and
+# whether the ids must come from an index only scan
+PAGES = {
+    "first": ({}, {LIVE_INDEX}, True),
+    "deep": ({"cursor": None}, {LIVE_INDEX}, True),
+    "unpublished": ({"published": False}, {LIVE_PUBLISHED_INDEX}, True),
+    "rating": ({"rating_min": 4.5}, {LIVE_INDEX}, True),
+    "published, rating": ({"published": True, "rating_min": 4.0}, {LIVE_INDEX, LIVE_PUBLISHED_INDEX}, True),
+    "title": ({"title": "post 12"}, {LIVE_INDEX}, False),
+}
+
+SEED_SQL = text(
+    "INSERT INTO posts (uuid, title, content, published, rating, created_at, updated_at, deleted_at) "
+    "SELECT gen_random_uuid(), 'Post ' || i, repeat('Lorem ipsum dolor sit amet. ', 20), random() < 0.8, "
+    "round((random() * 5)::numeric, 1), now() - make_interval(secs => i), now(), "
+    "CASE WHEN random() < 0.05 THEN now() END "
+    "FROM generate_series(1, :count) AS i"
+)
+# The last post of the page halfway through the live posts, the cursor of the deep page
+MIDDLE_CURSOR_SQL = text(
+    "SELECT created_at, id FROM posts WHERE deleted_at IS NULL "
+    "ORDER BY created_at DESC, id DESC OFFSET (SELECT count(*) / 2 FROM posts WHERE deleted_at IS NULL) LIMIT 1"
+)
+
+
+async def seed(engine, count: int) -> None:
+    started = time.perf_counter()
+    async with engine.begin() as connection:
+        await connection.execute(SEED_SQL, {"count": count})
+    print(f"Inserted {count:,} posts in {time.perf_counter() - started:.0f}s")
+
+
+async def vacuum(engine) -> None:
+    # Sets the visibility map, without which an index only scan still fetches every row
+    # from the table, and fresh statistics; VACUUM cannot run inside a transaction
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("VACUUM (ANALYZE) posts"))
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def explain(connection, statement) -> dict:
+    # Compiled with its values in place, as EXPLAIN takes no bound parameters
+    sql = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    explained = (await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar_one()
+
+    return (json.loads(explained) if isinstance(explained, str) else explained)[0]
+
+
+def check(explained: dict, indexes: set[str], index_only: bool) -> tuple[dict, list[str]]:
+    """
+    :return: What the plan read the page's ids from, and the checks it failed
+    """
+    nodes = list(plan_nodes(explained["Plan"]))
+    page_scans = [node for node in nodes if node.get("Index Name") in indexes]
+    failures = []
+
+    if any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "posts" for node in nodes):
+        failures.append("scans the whole posts table")
+    if not page_scans:
+        used = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+        failures.append(f"reads no ids from {' or '.join(sorted(indexes))}; indexes used: {', '.join(used) or 'none'}")
+    elif index_only and page_scans[0]["Node Type"] != "Index Only Scan":
+        failures.append(f"reads the ids with an {page_scans[0]['Node Type']}, not an Index Only Scan")
+
+    scan = page_scans[0] if page_scans else {}
+    return {
+        "index": scan.get("Index Name", "-"),
+        "heap_fetches": scan.get("Heap Fetches", 0),
+        "buffers": explained["Plan"].get("Shared Hit Blocks", 0) + explained["Plan"].get("Shared Read Blocks", 0),
+    }, failures
+
+
+async def benchmark(args: argparse.Namespace) -> bool:
+    from app.database.configs.dbs import get_postgres_async_db_engine
+    from app.database.repositories.posts_async_repository import PostsAsyncRepository
+
+    # The primary's engine: the seeded posts are read before a replica could have them
+    engine = get_postgres_async_db_engine()
+    if not args.skip_seed:
+        await seed(engine, args.posts)
+    await vacuum(engine)
+
+    posts_repo = PostsAsyncRepository(None, as_rows=True)
+    passed = True
+    print(f"{'page':>18} {'index':>38} {'heap fetches':>13} {'buffers':>8} {'p50 ms':>8}  checks")
+    async with engine.connect() as connection:
+        middle_cursor = tuple((await connection.execute(MIDDLE_CURSOR_SQL)).one())
+        for page, (filters, indexes, index_only) in PAGES.items():
+            filters = filters | ({"cursor": middle_cursor} if "cursor" in filters else {})
+            statement = posts_repo.page_statement(LIMIT, **filters)
+
+            runs = [await explain(connection, statement) for _ in range(args.repeat)]
+            result, failures = check(runs[-1], indexes, index_only)
+            passed = passed and not failures
+            print(
+                f"{page:>18} {result['index']:>38} {result['heap_fetches']:>13} {result['buffers']:>8} "
+                f"{statistics.median(run['Execution Time'] for run in runs):>8.3f}  {'; '.join(failures) or 'ok'}"
+            )
+            if failures and args.verbose:
+                print(json.dumps(runs[-1]["Plan"], indent=2))
+    await engine.dispose()
+
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=500_000, help="Posts to seed")
+    parser.add_argument("--skip-seed", action="store_true", help="Check the posts already stored")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each page; the median time is reported")
+    parser.add_argument("--verbose", action="store_true", help="Print the plans that do not pass")
+    args = parser.parse_args()
+
+    if not asyncio.run(benchmark(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
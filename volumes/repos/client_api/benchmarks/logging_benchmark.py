@@ -0,0 +1,149 @@
+"""
+Benchmark of request latency under the logging pipeline, at INFO and at DEBUG.
+
+Compares the previous pipeline (a FileHandler on the root logger writing inline, with
+repository responses dumped for log.debug whether or not DEBUG is on) with the current
+one (get_app_logger's QueueHandler/QueueListener and isEnabledFor guards). Requests go
+through an in-process ASGI app whose route logs the way PostService does, so no database
+or cache is needed. Log files are written to a temporary directory; --write-latency-ms adds
+a delay to every flush to stand in for slow or network backed storage.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.logging_benchmark
+    python3 -m benchmarks.logging_benchmark --requests 2000 --posts 100
+    python3 -m benchmarks.logging_benchmark --write-latency-ms 1
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import statistics
+import tempfile
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from app.database.repositories.BaseAppRepository import RepoResponse
+from app.log.loggers import app_logger
+from app.log.loggers.app_logger import get_app_logger, stop_app_logger
+from config import AppLogLevelEnum
+
+
+log = logging.getLogger("benchmarks.posts")
+
+
+def make_repo_response(posts: int) -> RepoResponse:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return RepoResponse(
+        status=True,
+        data=[
+            {
+                "id": post_id,
+                "uuid": str(uuid.uuid4()),
+                "title": f"Post number {post_id}",
+                "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+                "published": True,
+                "rating": 4.5,
+                "created_at": now,
+                "updated_at": now,
+                "deleted_at": None,
+            }
+            for post_id in range(posts)
+        ],
+        errors={},
+        meta={},
+    )
+
+
+def make_app(posts: int, guarded: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/posts")
+    async def get_posts():
+        log.info("HIT: get posts.")
+        repo_res = make_repo_response(posts)
+
+        log.debug('%s - Repo Response: ', "PostService")
+        if not guarded:
+            log.debug(repo_res.dict())
+        elif log.isEnabledFor(logging.DEBUG):
+            log.debug(repo_res.dict())
+
+        for post in repo_res.data:
+            log.debug("The retrieved model is %s", post["uuid"])
+
+        return {"status": True, "count": len(repo_res.data)}
+
+    return app
+
+
+def slow_down(handler: logging.StreamHandler, write_latency: float) -> None:
+    if write_latency <= 0:
+        return
+
+    flush = handler.flush
+
+    def slow_flush() -> None:
+        time.sleep(write_latency)
+        flush()
+
+    handler.flush = slow_flush
+
+
+def use_inline_logging(level: str, log_file: str, write_latency: float) -> None:
+    fh = logging.FileHandler(log_file)
+    fh.setFormatter(logging.Formatter('%(asctime)s | %(levelname)-8s | %(lineno)04d | %(message)s'))
+    slow_down(fh, write_latency)
+    logging.basicConfig(level=level, force=True, handlers=[fh])
+
+
+def use_queued_logging(level: str, log_file: str, write_latency: float) -> None:
+    app_logger.app_env_config.APP_LOG_FILE = log_file
+    app_logger.app_env_config.APP_LOG_LEVEL = AppLogLevelEnum(level)
+    for handler in get_app_logger().handlers:
+        slow_down(handler, write_latency)
+
+
+async def measure(app: FastAPI, requests: int) -> list[float]:
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get("/posts")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+
+    return latencies
+
+
+def percentile(latencies: list[float], pct: int) -> float:
+    return statistics.quantiles(latencies, n=100)[pct - 1] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=20, help="Posts in the logged repository response")
+    parser.add_argument("--write-latency-ms", type=float, default=0.0, help="Delay added to every log file flush")
+    args = parser.parse_args()
+
+    print(f"{'pipeline':>10} {'level':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        for pipeline in ("inline", "queued"):
+            for level in ("INFO", "DEBUG"):
+                log_file = f"{log_dir}/{pipeline}-{level}.log"
+                if pipeline == "inline":
+                    use_inline_logging(level, log_file, args.write_latency_ms / 1000)
+                else:
+                    use_queued_logging(level, log_file, args.write_latency_ms / 1000)
+
+                app = make_app(args.posts, guarded=pipeline == "queued")
+                latencies = asyncio.run(measure(app, args.requests))
+                stop_app_logger()
+
+                print(f"{pipeline:>10} {level:>6} {percentile(latencies, 50):>8.3f} {percentile(latencies, 95):>8.3f} {percentile(latencies, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
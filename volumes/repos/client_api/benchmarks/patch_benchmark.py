@@ -0,0 +1,161 @@
+"""
+Benchmark of the latency and the database round trips of patching one post, the way
+PATCH /posts/{uuid} used to and now does it:
+    before   find_one_by_uuid, an UPDATE of every column merged with the patch, its
+             commit, and find_one_by_uuid again for the response
+    after    PostsAsyncRepository.patch_one_by_uuid: one UPDATE ... RETURNING of the
+             patched fields, and its commit
+Each patch runs in a session of its own, as each request does. Round trips are the
+statements and commits sent to the database. The cache refresh that follows is left
+out: it used to be a RediSearch query and update, now a pipelined write (see
+cache_reads_benchmark for the cost of Redis round trips).
+
+Backends:
+    sqlite     An in-memory database, with every round trip sleeping --db-latency-ms
+               to stand for the network; the repository runs on a sync Session.
+    services   Postgres as configured in the environment, on asyncpg. Creates --posts
+               posts to patch, and deletes them at the end.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.patch_benchmark
+    python3 -m benchmarks.patch_benchmark --patches 5000 --db-latency-ms 1
+    python3 -m benchmarks.patch_benchmark --backend services
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from app.database.models.CustomerData.PostsModel import PostsModel
+from app.database.repositories.posts_async_repository import PostsAsyncRepository
+from benchmarks.posts_api_benchmark import BlockingSession
+from benchmarks.query_cache_benchmark import make_sqlite_engine
+
+
+class RoundTrips:
+    """
+    Counts the statements and commits sent through an engine, sleeping rtt_seconds for each.
+    """
+
+    def __init__(self, engine, rtt_seconds: float) -> None:
+        self.count = 0
+        self.rtt_seconds = rtt_seconds
+        event.listen(engine, "before_cursor_execute", self.round_trip)
+        event.listen(engine, "commit", self.round_trip)
+
+    def round_trip(self, *args, **kwargs) -> None:
+        self.count += 1
+        if self.rtt_seconds:
+            time.sleep(self.rtt_seconds)
+
+
+async def patch_before(postgresdb, post_uuid, patch: dict):
+    posts_repo = PostsAsyncRepository(postgresdb)
+    current = (await posts_repo.find_one_by_uuid(post_uuid, read_replica=False)).data
+    merged = {
+        "title": current.title,
+        "content": current.content,
+        "published": current.published,
+        "rating": current.rating,
+    } | patch | {"updated_at": datetime.datetime.now(datetime.timezone.utc)}
+    await postgresdb.execute(update(PostsModel).where(PostsModel.uuid == post_uuid).values(merged))
+    await postgresdb.commit()
+
+    return (await posts_repo.find_one_by_uuid(post_uuid, read_replica=False)).data
+
+
+async def patch_after(postgresdb, post_uuid, patch: dict):
+    return (await PostsAsyncRepository(postgresdb).patch_one_by_uuid(post_uuid, patch)).data
+
+
+PATCHES = {"before": patch_before, "after": patch_after}
+
+
+async def measure(open_session, round_trips: RoundTrips, post_uuids: list, patches: int, seed: int) -> dict[str, dict]:
+    chooser = random.Random(seed)
+    results = {}
+    for name, patch_post in PATCHES.items():
+        latencies = []
+        before = round_trips.count
+        for _ in range(patches):
+            post_uuid, patch = chooser.choice(post_uuids), {"rating": chooser.randrange(50) / 10}
+            started = time.perf_counter()
+            async with open_session() as postgresdb:
+                patched = await patch_post(postgresdb, post_uuid, patch)
+            latencies.append(time.perf_counter() - started)
+            if patched is None or patched.rating != patch["rating"]:
+                raise SystemExit(f"The {name} patch of {post_uuid} did not apply.")
+
+        results[name] = {
+            "round_trips": (round_trips.count - before) / patches,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": statistics.quantiles(latencies, n=20)[18] * 1000,
+        }
+
+    return results
+
+
+async def sqlite_results(args: argparse.Namespace) -> dict[str, dict]:
+    engine = make_sqlite_engine(posts=args.posts)
+    round_trips = RoundTrips(engine, args.db_latency_ms / 1000)
+
+    class SqliteSession:
+        async def __aenter__(self):
+            # As the app's async sessions, which do not expire what a commit returned
+            self.session = Session(engine, expire_on_commit=False)
+            return BlockingSession(self.session)
+
+        async def __aexit__(self, *exc_info):
+            self.session.close()
+
+    post_uuids = [uuid.UUID(int=i) for i in range(1, args.posts + 1)]
+    # Unmeasured, so the compiled statements are cached for both
+    await measure(SqliteSession, round_trips, post_uuids, 10, args.seed)
+
+    return await measure(SqliteSession, round_trips, post_uuids, args.patches, args.seed)
+
+
+async def services_results(args: argparse.Namespace) -> dict[str, dict]:
+    from app.database.configs.dbs import get_postgres_async_db_engine, get_postgres_async_db_sessionmaker
+
+    sessionmaker = get_postgres_async_db_sessionmaker()
+    round_trips = RoundTrips(get_postgres_async_db_engine().sync_engine, 0.0)
+    async with sessionmaker() as postgresdb:
+        created = (await PostsAsyncRepository(postgresdb).insert_many([
+            {"title": f"Patch benchmark post {i}", "content": "Lorem ipsum dolor sit amet. " * 10, "rating": 0.0, "published": True}
+            for i in range(args.posts)
+        ])).data
+        post_uuids = [post.uuid for post in created]
+
+    try:
+        await measure(sessionmaker, round_trips, post_uuids, 10, args.seed)
+        return await measure(sessionmaker, round_trips, post_uuids, args.patches, args.seed)
+    finally:
+        async with sessionmaker() as postgresdb:
+            await PostsAsyncRepository(postgresdb).delete_many_by_uuid(post_uuids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "services"), default="sqlite")
+    parser.add_argument("--posts", type=int, default=1000, help="Posts the patches are spread over")
+    parser.add_argument("--patches", type=int, default=2000, help="Patches per flow")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="Round trip of the sqlite database")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the patches, for repeatable runs")
+    args = parser.parse_args()
+
+    results = asyncio.run(sqlite_results(args) if args.backend == "sqlite" else services_results(args))
+
+    print(f"{'flow':>7} {'round trips':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, row in results.items():
+        print(f"{name:>7} {row['round_trips']:>12.1f} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+    print(f"The p50 after is {results['after']['p50_ms'] / results['before']['p50_ms']:.0%} of the one before.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""
+Load test of the Posts API, run in-process so it needs no network.
+
+Requests go through httpx's ASGI transport straight into app.main:app, so the full
+middleware, router, PostService and repository stack is exercised, but the sockets,
+the proxy and uvicorn are not. A configurable number of concurrent clients drive a
+weighted mix of create, get, list, patch and delete requests; latency percentiles
+throughput and the response bytes on the wire are reported per endpoint, with the CPU
+time per request, and written to a JSON file that a later run can be compared against
+with --compare. --accept-encoding sets the codings clients accept, to measure the cost
+and the saving of response compression; the CPU time includes the httpx clients'
+decompression and everything else in-process, so compare it between runs only.
+Clients are closed loop: each sends its next request as soon as its last one is answered.
+Everything shares one event loop, as in one uvicorn worker, so once the concurrency is
+more than the loop can serve the latencies include the wait behind other requests.
+
+Stacks, to compare the throughput under concurrency before and after the async data path:
+    async      PostService on PostsAsyncRepository over asyncpg, as the app runs.
+    sync       The baseline: every Postgres round trip blocks the event loop, as the
+               synchronous psycopg2 Session chain did. On services the repository's
+               statements run on the sync engine's Session; on stand-ins every round
+               trip is a time.sleep rather than an asyncio.sleep. Run both with the
+               same settings and --compare the results, e.g. at --concurrency 1 and 50.
+
+Backends:
+    services   Postgres and Redis as configured in the environment, e.g. the
+               docker-compose containers. Use this to compare PostsAsyncRepository
+               or query changes between commits.
+    stand-ins  Redis is fakeredis and Postgres is an in-memory PostsAsyncRepository
+               that sleeps --db-latency-ms per round trip. Needs only `pip install
+               fakeredis`; fakeredis cannot run Lua without lupa, so the cache locks
+               are turned off. Use this for PostService, cache and serialization changes.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.posts_api_benchmark
+    python3 -m benchmarks.posts_api_benchmark --concurrency 50 --requests 20000
+    python3 -m benchmarks.posts_api_benchmark --mix get=80,list=15,patch=5
+    python3 -m benchmarks.posts_api_benchmark --accept-encoding identity
+    python3 -m benchmarks.posts_api_benchmark --stack sync --concurrency 50 --output benchmarks/results/posts_api_sync.json
+    python3 -m benchmarks.posts_api_benchmark --concurrency 50 --compare benchmarks/results/posts_api_sync.json
+    python3 -m benchmarks.posts_api_benchmark --backend services --compare benchmarks/results/posts_api_1a2b3c4.json
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import httpx
+
+
+HEADERS = {
+    "X-Token": "fake-super-secret-token",
+    "Accept-Version": "0.0.1",
+}
+OPERATIONS = ("create", "get", "list", "patch", "delete")
+DEFAULT_MIX = "get=60,list=20,create=10,patch=5,delete=5"
+BULK_DELETE_SIZE = 100
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        operation, _, weight = part.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {operation}; expected one of {', '.join(OPERATIONS)}")
+        weights[operation] = int(weight)
+
+    return weights
+
+
+class BlockingSession:
+    """
+    The AsyncSession methods PostsAsyncRepository uses, over a sync Session: every await
+    runs the statement on psycopg2 and blocks the event loop until it returns, as the
+    synchronous stack did. Streams are not supported, the export is not in the mix.
+    """
+
+    def __init__(self, session) -> None:
+        self.session = session
+
+    def add(self, instance) -> None:
+        self.session.add(instance)
+
+    async def execute(self, *args, **kwargs):
+        return self.session.execute(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return self.session.scalars(*args, **kwargs)
+
+    async def commit(self) -> None:
+        self.session.commit()
+
+    async def rollback(self) -> None:
+        self.session.rollback()
+
+    async def refresh(self, instance) -> None:
+        self.session.refresh(instance)
+
+
+def use_stand_ins(db_latency: float, stack: str) -> None:
+    """
+    Point the app at fakeredis and an in-memory posts table. Must run before app.main is imported.
+    :param db_latency: Seconds every stand-in database round trip sleeps for
+    :param stack: sync to block the event loop for every round trip
+    :return: None
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("The stand-ins backend needs fakeredis: pip install fakeredis")
+
+    os.environ["REDIS_CACHE_LOCK_ENABLED"] = "False"
+    os.environ["REDIS_CACHE_WARM_UP_ENABLED"] = "False"
+
+    from redis_om import Migrator
+    from app.database.configs import dbs
+    from app.database.configs.redis_timing import TimedRedis
+    from app.database.repositories.BaseAppRepository import RepoResponse
+    from app.database.models.CustomerData.PostsModel import PostsModel
+
+    fake_redis = TimedRedis(connection_pool=fakeredis.FakeRedis(decode_responses=True).connection_pool)
+    # fakeredis answers in-process and has no socket timeouts to lower to the request deadline
+    fake_connection = fake_redis.connection_pool.get_connection()
+    type(fake_connection._sock).settimeout = lambda self, timeout: None
+    fake_redis.connection_pool.release(fake_connection)
+    dbs.get_redis_cache = lambda: fake_redis
+    # The rate limiter's asyncio connection, should APP_RATE_LIMIT_ENABLED be turned on
+    fake_rate_limit = fakeredis.FakeAsyncRedis(decode_responses=True)
+    dbs.get_redis_rate_limit = lambda: fake_rate_limit
+    # fakeredis has no RediSearch, and the posts hashes need no search index
+    Migrator.run = lambda self: None
+
+    posts: dict[uuid.UUID, PostsModel] = {}
+
+    async def round_trip() -> None:
+        if stack == "sync":
+            time.sleep(db_latency)
+        else:
+            await asyncio.sleep(db_latency)
+
+    class InMemoryPostsAsyncRepository:
+        """
+        The PostsAsyncRepository methods PostService uses, over a dict, one simulated round trip each.
+        """
+
+        next_id = 1
+
+        def __init__(self, postgresdb, as_rows: bool = False) -> None:
+            # Always entities: a dict of PostsModel has no Rows to return
+            self.postgresdb = postgresdb
+
+        @staticmethod
+        def response(data, meta: dict | None = None) -> RepoResponse:
+            return RepoResponse(status=True, data=data, errors={}, meta=meta or {})
+
+        @classmethod
+        def new_post(cls, title: str, content: str, rating: float, published: bool) -> PostsModel:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            post = PostsModel(
+                id=cls.next_id, uuid=uuid.uuid4(), title=title, content=content, rating=rating or 0.0,
+                published=published, created_at=now, updated_at=now, deleted_at=None,
+            )
+            cls.next_id += 1
+            posts[post.uuid] = post
+
+            return post
+
+        async def insert(self, title: str, content: str, rating: float, published: bool):
+            await round_trip()
+            return self.response(self.new_post(title, content, rating, published))
+
+        async def insert_many(self, new_posts: list[dict]):
+            await round_trip()
+            return self.response([self.new_post(**post) for post in new_posts], {"count": len(new_posts)})
+
+        async def find_page(self, limit: int, cursor=None, title=None, published=None, rating_min=None, rating_max=None):
+            await round_trip()
+            page = sorted(posts.values(), key=lambda post: (post.created_at, post.id), reverse=True)
+            if cursor is not None:
+                page = [post for post in page if (post.created_at, post.id) < cursor]
+            page = [
+                post for post in page
+                if (not title or title.lower() in post.title.lower())
+                and (published is None or post.published is published)
+                and (rating_min is None or post.rating >= rating_min)
+                and (rating_max is None or post.rating <= rating_max)
+            ]
+
+            return self.response(page[:limit + 1], {"count": min(len(page), limit)})
+
+        async def stream_all(self, batch_size: int) -> AsyncIterator[PostsModel]:
+            for post in list(posts.values()):
+                yield post
+
+        async def find_one_by_uuid(self, post_uuid, read_replica: bool = True):
+            await round_trip()
+            return self.response(posts.get(uuid.UUID(str(post_uuid))))
+
+        async def find_many_by_uuid(self, post_uuids: list, read_replica: bool = True):
+            await round_trip()
+            found = [posts[post_uuid] for post_uuid in map(lambda value: uuid.UUID(str(value)), post_uuids) if post_uuid in posts]
+            return self.response(found, {"count": len(found)})
+
+        async def delete_post_by_uuid(self, post_uuid):
+            await round_trip()
+            post = posts.pop(uuid.UUID(str(post_uuid)), None)
+            return self.response(None if post is None else post.id)
+
+        async def delete_many_by_uuid(self, post_uuids: list):
+            await round_trip()
+            deleted = {post.uuid: post.id for post in (posts.pop(uuid.UUID(str(value)), None) for value in post_uuids) if post}
+            return self.response(deleted, {"count": len(deleted)})
+
+        async def patch_one_by_uuid(self, post_uuid, patch: dict):
+            await round_trip()
+            post = posts.get(uuid.UUID(str(post_uuid)))
+            if post is not None:
+                for field, value in patch.items():
+                    setattr(post, field, value)
+                post.updated_at = datetime.datetime.now(datetime.timezone.utc)
+
+            return self.response(post)
+
+        async def patch_many_by_uuid(self, patches: list[dict]):
+            updated = {}
+            for patch in patches:
+                values = {key: value for key, value in patch.items() if key != "uuid"}
+                updated[patch["uuid"]] = (await self.patch_one_by_uuid(patch["uuid"], values)).data
+
+            return self.response(updated)
+
+    @contextlib.asynccontextmanager
+    async def null_session():
+        yield None
+
+    import app.services.PostService as post_service_module
+    post_service_module.PostsAsyncRepository = InMemoryPostsAsyncRepository
+    post_service_module.get_postgres_async_db_sessionmaker = lambda: null_session
+
+
+def load_app(backend: str, db_latency: float, stack: str):
+    # Every simulated client shares one X-Token and address, so they would share one rate limit
+    os.environ.setdefault("APP_RATE_LIMIT_ENABLED", "False")
+    if backend == "stand-ins":
+        use_stand_ins(db_latency, stack)
+
+    from app.main import app
+    from app.database.configs.dbs import get_postgres_async_db, get_postgres_db_sessionmaker
+
+    if backend == "stand-ins":
+        async def no_postgres_session():
+            yield None
+
+        app.dependency_overrides[get_postgres_async_db] = no_postgres_session
+    elif stack == "sync":
+        async def blocking_postgres_session():
+            with get_postgres_db_sessionmaker()() as postgres_session:
+                yield BlockingSession(postgres_session)
+
+        app.dependency_overrides[get_postgres_async_db] = blocking_postgres_session
+
+    return app
+
+
+class LoadRun:
+    """
+    The posts the run knows about and the latencies of every request it made.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, weights: dict[str, int], seed: int) -> None:
+        self.client = client
+        self.operations = list(weights)
+        self.weights = list(weights.values())
+        self.random = random.Random(seed)
+        self.post_uuids: list[str] = []
+        self.latencies: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+        self.errors: dict[str, int] = {operation: 0 for operation in OPERATIONS}
+        self.response_bytes: dict[str, int] = {operation: 0 for operation in OPERATIONS}
+
+    def new_post_body(self) -> dict:
+        number = self.random.randrange(1_000_000)
+        return {
+            "title": f"Benchmark post {number}",
+            "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            "published": number % 2 == 0,
+            "rating": number % 50 / 10,
+        }
+
+    async def create_post(self) -> httpx.Response:
+        response = await self.client.post("/posts/", json=self.new_post_body(), headers=HEADERS)
+        if response.status_code == 201:
+            self.post_uuids.append(response.json()["data"]["uuid"])
+
+        return response
+
+    async def get_post(self) -> httpx.Response:
+        return await self.client.get(f"/posts/{self.random.choice(self.post_uuids)}", headers=HEADERS)
+
+    async def list_posts(self) -> httpx.Response:
+        return await self.client.get("/posts/", params={"limit": 20}, headers=HEADERS)
+
+    async def patch_post(self) -> httpx.Response:
+        return await self.client.patch(
+            f"/posts/{self.random.choice(self.post_uuids)}",
+            json={"rating": self.random.randrange(50) / 10},
+            headers=HEADERS,
+        )
+
+    async def delete_post(self) -> httpx.Response:
+        post_uuid = self.post_uuids.pop(self.random.randrange(len(self.post_uuids)))
+        return await self.client.delete(f"/posts/{post_uuid}", headers=HEADERS)
+
+    async def request(self, operation: str) -> None:
+        if operation in ("get", "patch", "delete") and not self.post_uuids:
+            operation = "create"
+
+        send = {
+            "create": self.create_post,
+            "get": self.get_post,
+            "list": self.list_posts,
+            "patch": self.patch_post,
+            "delete": self.delete_post,
+        }[operation]
+
+        started = time.perf_counter()
+        response = await send()
+        self.latencies[operation].append(time.perf_counter() - started)
+        # The body as sent, i.e. compressed when the response was
+        self.response_bytes[operation] += response.num_bytes_downloaded
+        if response.status_code >= 400:
+            self.errors[operation] += 1
+
+    async def client_loop(self, requests: list[int]) -> None:
+        while requests[0] > 0:
+            requests[0] -= 1
+            await self.request(self.random.choices(self.operations, self.weights)[0])
+            # Requests served from the caches never wait on I/O in-process; without a yield one
+            # client would keep the loop to itself and starve the timers of the others
+            await asyncio.sleep(0)
+
+    async def run(self, concurrency: int, requests: int) -> tuple[float, float]:
+        """
+        :return: The wall clock and the process CPU seconds the requests took
+        """
+        # A shared countdown; the event loop is single threaded so no lock is needed
+        remaining = [requests]
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await asyncio.gather(*(self.client_loop(remaining) for _ in range(concurrency)))
+
+        return time.perf_counter() - started, time.process_time() - cpu_started
+
+
+def percentile(latencies: list[float], pct: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] * 1000 if latencies else 0.0
+
+    return statistics.quantiles(latencies, n=100)[pct - 1] * 1000
+
+
+def summarize(latencies: list[float], errors: int, seconds: float, response_bytes: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "bytes_per_response": round(response_bytes / len(latencies)) if latencies else 0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    app = load_app(args.backend, args.db_latency_ms / 1000, args.stack)
+
+    from app.database.repositories.posts_cache_repository import PostsCacheRepository
+
+    # The ASGI transport does not run the lifespan (the cache warm-up and invalidation listener).
+    # Stand-ins skip it: there is one worker to invalidate, and fakeredis' pubsub polls for messages
+    lifespan = app.router.lifespan_context(app) if args.backend == "services" else contextlib.nullcontext()
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://benchmark",
+        headers={"Accept-Encoding": args.accept_encoding},
+    )
+    async with lifespan, client:
+        seeding = LoadRun(client, {"create": 1}, args.seed)
+        await seeding.run(args.concurrency, args.seed_posts)
+        if args.backend == "stand-ins":
+            # Every seeded post went through the write-through, so the posts index is complete
+            PostsCacheRepository().mark_index_ready()
+
+        load = LoadRun(client, args.mix, args.seed)
+        load.post_uuids = seeding.post_uuids
+        seconds, cpu_seconds = await load.run(args.concurrency, args.requests)
+
+        # Delete what the run created, so the services' database is left as it was found
+        for start in range(0, len(load.post_uuids), BULK_DELETE_SIZE):
+            await client.request("DELETE", "/posts/bulk", json=load.post_uuids[start:start + BULK_DELETE_SIZE], headers=HEADERS)
+
+    all_latencies = [latency for latencies in load.latencies.values() for latency in latencies]
+
+    return {
+        "commit": git_commit(),
+        "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": {
+            "backend": args.backend,
+            "stack": args.stack,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed_posts": args.seed_posts,
+            "mix": args.mix,
+            "db_latency_ms": args.db_latency_ms if args.backend == "stand-ins" else None,
+            "seed": args.seed,
+            "accept_encoding": args.accept_encoding,
+        },
+        "seconds": round(seconds, 3),
+        "cpu_ms_per_request": round(cpu_seconds / len(all_latencies) * 1000, 3) if all_latencies else 0.0,
+        "total": summarize(all_latencies, sum(load.errors.values()), seconds, sum(load.response_bytes.values())),
+        "endpoints": {
+            operation: summarize(latencies, load.errors[operation], seconds, load.response_bytes[operation])
+            for operation, latencies in load.latencies.items()
+            if latencies
+        },
+    }
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    print(f"{'endpoint':>9} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'bytes/resp':>11}")
+    rows = results["endpoints"] | {"total": results["total"]}
+    for name, row in rows.items():
+        print(
+            f"{name:>9} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} {row['p50_ms']:>8.3f} "
+            f"{row['p95_ms']:>8.3f} {row['p99_ms']:>8.3f} {row.get('bytes_per_response', 0):>11}"
+        )
+
+        if baseline is not None:
+            before = baseline["endpoints"] | {"total": baseline["total"]}
+            if name in before:
+                changes = "".join(
+                    f" {field} {(row[field] - before[name][field]) / before[name][field] * 100:+.1f}%"
+                    for field in ("rps", "p50_ms", "p95_ms", "p99_ms", "bytes_per_response")
+                    if before[name].get(field)
+                )
+                print(f"{'':>9} vs {baseline['commit']} {baseline['settings'].get('stack', 'async')}:{changes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("stand-ins", "services"), default="stand-ins")
+    parser.add_argument("--stack", choices=("async", "sync"), default="async", help="sync for the blocking baseline")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests in the measured run")
+    parser.add_argument("--seed-posts", type=int, default=500, help="Posts created before the measured run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Operation weights, default {DEFAULT_MIX}")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="Round trip of the stand-in database")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the request mix, for repeatable runs")
+    parser.add_argument("--accept-encoding", default="zstd, br, gzip", help="Accept-Encoding of every request; identity for none")
+    parser.add_argument("--output", type=Path, help="Results file, default benchmarks/results/posts_api_<commit>.json")
+    parser.add_argument("--compare", type=Path, help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    results = asyncio.run(benchmark(args))
+
+    output = args.output or Path("benchmarks/results") / f"posts_api_{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+
+    print_results(results, baseline)
+    print(f"CPU per request: {results['cpu_ms_per_request']:.3f} ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Microbenchmark of the Python side cost of one post lookup by uuid, the way
+find_one_by_uuid has been and can be written:
+    query             session.query(...).filter(...).first(), the legacy ORM Query
+    select            session.scalars(select(...)), built on every call; its SQL comes from
+                      the engine's compiled cache, but the statement and its cache key do not
+    select uncached   the same with query_cache_size=0, so every call compiles the SQL too
+    lambda            session.scalars(lambda_stmt(...)), what the repositories use: built
+                      and cached once, later calls only bind the uuid
+    repository        PostsRepository.find_one_by_uuid, the lambda with logging and RepoResponse
+The sqlite backend (the default) runs them on an in-memory database, so next to nothing
+but SQLAlchemy and the driver is measured. The services backend runs the lambda lookup
+through asyncpg against the configured Postgres, with and without prepared statements
+(POSTGRESDB_ASYNC_PREPARED_STATEMENT_CACHE_SIZE and 0), which adds the round trips and the
+server's parsing and planning to the comparison.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.query_cache_benchmark
+    python3 -m benchmarks.query_cache_benchmark --lookups 20000 --repeat 5
+    python3 -m benchmarks.query_cache_benchmark --backend services
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import create_engine, lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from app.database.models.CustomerData.PostsModel import PostsModel
+from app.database.repositories.posts_repository import PostsRepository
+
+
+POSTS = 1000
+
+
+def query_lookup(session: Session, post_uuid: uuid.UUID):
+    return (session.query(PostsModel)
+            .filter(PostsModel.uuid == post_uuid, PostsModel.deleted_at.is_(None))
+            .first())
+
+
+def select_lookup(session: Session, post_uuid: uuid.UUID):
+    return session.scalars(
+        select(PostsModel)
+        .where(PostsModel.uuid == post_uuid, PostsModel.deleted_at.is_(None))
+        .limit(1)
+    ).first()
+
+
+def lambda_lookup(session: Session, post_uuid: uuid.UUID):
+    return session.scalars(lambda_stmt(
+        lambda: select(PostsModel)
+        .where(PostsModel.uuid == post_uuid, PostsModel.deleted_at.is_(None))
+        .limit(1)
+    )).first()
+
+
+def repository_lookup(session: Session, post_uuid: uuid.UUID):
+    return PostsRepository(session).find_one_by_uuid(post_uuid).data
+
+
+def make_sqlite_engine(query_cache_size: int = 500, posts: int = POSTS):
+    engine = create_engine("sqlite://", query_cache_size=query_cache_size)
+    with engine.begin() as connection:
+        # Created by hand: the model's server defaults are Postgres SQL
+        connection.exec_driver_sql(
+            "CREATE TABLE posts (id INTEGER PRIMARY KEY, uuid CHAR(32) UNIQUE, title VARCHAR, content VARCHAR, "
+            "published BOOLEAN, rating FLOAT, created_at TIMESTAMP, updated_at TIMESTAMP, deleted_at TIMESTAMP)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO posts VALUES (?, ?, ?, ?, 1, 2.5, '2024-01-01 00:00:00', '2024-01-01 00:00:00', NULL)",
+            [(i, uuid.UUID(int=i).hex, f"Post {i}", "Lorem ipsum dolor sit amet. " * 10) for i in range(1, posts + 1)],
+        )
+
+    return engine
+
+
+def time_lookups(lookup, engine, lookups: int, repeat: int) -> float:
+    """
+    :return: The best of repeat runs, in microseconds per lookup
+    """
+    post_uuids = [uuid.UUID(int=i % POSTS + 1) for i in range(lookups)]
+    best = float("inf")
+    with Session(engine) as session:
+        # Unmeasured, so every cache is warm
+        lookup(session, post_uuids[0])
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for post_uuid in post_uuids:
+                lookup(session, post_uuid)
+                # Otherwise every lookup after the first finds the post in the identity map
+                session.expunge_all()
+            best = min(best, time.perf_counter() - started)
+
+    return best / lookups * 1_000_000
+
+
+def sqlite_rows(lookups: int, repeat: int) -> list[tuple[str, float]]:
+    cached, uncached = make_sqlite_engine(500), make_sqlite_engine(0)
+    rows = [
+        ("query", time_lookups(query_lookup, cached, lookups, repeat)),
+        ("select", time_lookups(select_lookup, cached, lookups, repeat)),
+        ("select uncached", time_lookups(select_lookup, uncached, lookups, repeat)),
+        ("lambda", time_lookups(lambda_lookup, cached, lookups, repeat)),
+        ("repository", time_lookups(repository_lookup, cached, lookups, repeat)),
+    ]
+    cached.dispose()
+    uncached.dispose()
+
+    return rows
+
+
+async def time_async_lookups(prepared_statement_cache_size: int, lookups: int, repeat: int) -> float:
+    from config import get_app_env_config
+
+    app_env_config = get_app_env_config()
+    engine = create_async_engine(
+        f"{app_env_config.POSTGRESDB_ASYNC_DRIVERNAME}://{app_env_config.POSTGRESDB_USERNAME}:{app_env_config.POSTGRESDB_PASSWORD.get_secret_value()}@{app_env_config.POSTGRESDB_HOST}:{app_env_config.POSTGRESDB_PORT}/{app_env_config.POSTGRESDB_DATABASE}",
+        pool_size=1,
+        connect_args={"prepared_statement_cache_size": prepared_statement_cache_size},
+    )
+    try:
+        async with AsyncSession(engine) as session:
+            post_uuids = (await session.scalars(select(PostsModel.uuid).limit(POSTS))).all()
+            if not post_uuids:
+                raise SystemExit("The configured database has no posts; create some first.")
+
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for i in range(lookups):
+                    await session.run_sync(lambda_lookup, post_uuids[i % len(post_uuids)])
+                    session.expunge_all()
+                best = min(best, time.perf_counter() - started)
+    finally:
+        await engine.dispose()
+
+    return best / lookups * 1_000_000
+
+
+def services_rows(lookups: int, repeat: int) -> list[tuple[str, float]]:
+    from config import get_app_env_config
+
+    configured = get_app_env_config().POSTGRESDB_ASYNC_PREPARED_STATEMENT_CACHE_SIZE
+    sizes = sorted({0, configured})
+
+    return [
+        (f"lambda, {size} prepared", asyncio.run(time_async_lookups(size, lookups, repeat)))
+        for size in sizes
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "services"), default="sqlite")
+    parser.add_argument("--lookups", type=int, default=5000, help="Lookups per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best one is reported")
+    args = parser.parse_args()
+
+    rows = sqlite_rows(args.lookups, args.repeat) if args.backend == "sqlite" else services_rows(args.lookups, args.repeat)
+
+    fastest = min(us for _, us in rows)
+    print(f"{'lookup':>22} {'us/lookup':>10} {'vs fastest':>11}")
+    for name, us in rows:
+        print(f"{name:>22} {us:>10.1f} {us / fastest:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of the CPU each post costs when a large read is loaded and serialized, with the
+posts loaded as PostsModel entities (the ORM path) and as plain Rows (PostsAsyncRepository's
+as_rows, what PostService uses):
+    load        executing the repository's select and fetching every post: for entities
+                this includes the identity map, the instance state and the attribute
+                instrumentation of each one
+    serialize   validating the page into GetPostResponseDataSchema and dumping it with
+                orjson, as the routes do; Rows are validated as dicts of their columns
+                (row_fields), as PostService does, since pydantic reads a Row's attributes slowly
+CPU is process time, so it is the work of this process only, not waiting on the database.
+The sqlite backend (the default) reads an in-memory database with the repository's own
+statements. The services backend reads the configured Postgres with
+PostsAsyncRepository.find_page, so asyncpg's decoding is included; it needs at least
+--rows posts there.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.row_read_benchmark
+    python3 -m benchmarks.row_read_benchmark --rows 100000 --repeat 3
+    python3 -m benchmarks.row_read_benchmark --backend services
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy.orm import Session
+from app.database.repositories.posts_async_repository import PostsAsyncRepository, row_fields
+from benchmarks.query_cache_benchmark import make_sqlite_engine
+from benchmarks.serialization_benchmark import from_attributes
+
+
+PATHS = {"entities": False, "rows": True}
+
+
+def load_sqlite(engine, as_rows: bool, rows: int) -> list:
+    # The statement and the fetch of find_page, on a sync session
+    posts_repo = PostsAsyncRepository(None, as_rows=as_rows)
+    with Session(engine) as session:
+        result = session.execute(posts_repo.select_posts().limit(rows))
+        return (result if as_rows else result.scalars()).all()
+
+
+async def load_services(as_rows: bool, rows: int) -> list:
+    from app.database.configs.dbs import get_postgres_async_db_sessionmaker
+
+    async with get_postgres_async_db_sessionmaker()() as postgresdb:
+        return (await PostsAsyncRepository(postgresdb, as_rows=as_rows).find_page(limit=rows - 1)).data
+
+
+def serialize(posts: list, as_rows: bool) -> bytes:
+    return from_attributes([row_fields(post) for post in posts] if as_rows else posts)
+
+
+def measure(load, as_rows: bool, rows: int, repeat: int) -> tuple[float, float, bytes]:
+    """
+    :return: The best of repeat runs of loading and of serializing, in CPU microseconds per row, and the body
+    """
+    best_load = best_serialize = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        posts = load()
+        loaded = time.process_time()
+        body = serialize(posts, as_rows)
+        serialized = time.process_time()
+
+        if len(posts) < rows:
+            raise SystemExit(f"Only {len(posts)} posts were read, {rows} are needed.")
+        best_load = min(best_load, loaded - started)
+        best_serialize = min(best_serialize, serialized - loaded)
+
+    return best_load / rows * 1_000_000, best_serialize / rows * 1_000_000, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "services"), default="sqlite")
+    parser.add_argument("--rows", type=int, default=10_000, help="Posts per read")
+    parser.add_argument("--repeat", type=int, default=5, help="Reads per path; the best one is reported")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        engine = make_sqlite_engine(posts=args.rows)
+        loaders = {path: lambda as_rows=as_rows: load_sqlite(engine, as_rows, args.rows) for path, as_rows in PATHS.items()}
+    else:
+        # One loop for every read: the engine's pooled connections belong to the loop they were opened on
+        loop = asyncio.new_event_loop()
+        loaders = {
+            path: lambda as_rows=as_rows: loop.run_until_complete(load_services(as_rows, args.rows))
+            for path, as_rows in PATHS.items()
+        }
+
+    results = {path: measure(loaders[path], as_rows, args.rows, args.repeat) for path, as_rows in PATHS.items()}
+    # Both paths must produce the same document
+    assert json.loads(results["entities"][2]) == json.loads(results["rows"][2])
+
+    print(f"{'path':>9} {'load us/row':>12} {'serialize us/row':>17} {'total us/row':>13}")
+    for path, (load_us, serialize_us, _) in results.items():
+        print(f"{path:>9} {load_us:>12.2f} {serialize_us:>17.2f} {load_us + serialize_us:>13.2f}")
+    entities, rows = sum(results["entities"][:2]), sum(results["rows"][:2])
+    print(f"Rows take {rows / entities:.0%} of the CPU of entities per row.")
+
+
+if __name__ == "__main__":
+    main()
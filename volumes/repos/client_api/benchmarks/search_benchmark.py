@@ -0,0 +1,203 @@
+"""
+Benchmark of the two engines behind GET /posts/search: RediSearch over the cached posts,
+and the text search of Postgres over the ix_posts_search GIN index it falls back to.
+
+Seeds --posts posts (1M by default) of generated text whose words follow a Zipf
+distribution, like natural language, caches them all with the warm-up and waits for
+RediSearch to index them. Then runs the same searches against both engines, grouped by
+how many posts they match: a common word, a mid frequency word, a rare word, two mid
+frequency words, and a common word with the published and rating filters. Reported per
+group and engine: latency percentiles, the mean number of matches, and how many of the
+first page's posts the engines agree on (they score differently, so not all of them).
+
+Needs Postgres with the customerdb migrations applied and Redis Stack, as configured in
+the environment, e.g. the docker-compose containers. Seeding writes to that database:
+point it at a scratch one. Seeding 1M posts takes a few minutes; --skip-seed reuses them.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m benchmarks.search_benchmark
+    python3 -m benchmarks.search_benchmark --skip-seed --queries 100
+    python3 -m benchmarks.search_benchmark --posts 100000 --limit 50
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+
+SYLLABLES = ("ka", "lo", "mi", "ru", "te", "zan", "vor", "pel", "qui", "dro", "sha", "fen", "gu", "bix", "nol", "tar")
+VOCABULARY_SIZE = 20_000
+TITLE_WORDS = 6
+CONTENT_WORDS = 60
+SEED_BATCH_SIZE = 5000
+
+
+def make_vocabulary(size: int) -> list[str]:
+    """
+    :return: size made-up words, none of them a stop word of either engine
+    """
+    words = []
+    for length in itertools.count(3):
+        for syllables in itertools.product(SYLLABLES, repeat=length):
+            words.append("".join(syllables))
+            if len(words) == size:
+                return words
+
+
+class TextGenerator:
+    """
+    Random text whose word frequencies follow Zipf's law: the word of rank r appears
+    about 1/r as often as the most common one.
+    """
+
+    def __init__(self, vocabulary: list[str], seed: int) -> None:
+        self.vocabulary = vocabulary
+        self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        self.random = random.Random(seed)
+
+    def words(self, count: int) -> str:
+        return " ".join(self.random.choices(self.vocabulary, cum_weights=self.cum_weights, k=count))
+
+    def post(self) -> dict:
+        return {
+            "title": self.words(TITLE_WORDS).capitalize(),
+            "content": self.words(CONTENT_WORDS),
+            "published": self.random.random() < 0.8,
+            "rating": round(self.random.uniform(0, 5), 1),
+        }
+
+
+async def seed(count: int, generator: TextGenerator) -> None:
+    from app.database.configs.dbs import get_postgres_async_db_sessionmaker
+    from app.database.repositories.posts_async_repository import PostsAsyncRepository
+    from app.services.PostService import PostService
+
+    started = time.perf_counter()
+    async with get_postgres_async_db_sessionmaker()() as postgresdb:
+        posts_repo = PostsAsyncRepository(postgresdb)
+        for offset in range(0, count, SEED_BATCH_SIZE):
+            await posts_repo.insert_many([generator.post() for _ in range(min(SEED_BATCH_SIZE, count - offset))])
+            print(f"\rInserted {min(offset + SEED_BATCH_SIZE, count):,} of {count:,} posts", end="", flush=True)
+        # Fresh statistics, so the planner knows how selective each search is
+        await postgresdb.execute(text("ANALYZE posts"))
+    print(f"\nInserted in {time.perf_counter() - started:.0f}s")
+
+    started = time.perf_counter()
+    cached = await PostService.warm_up_cache(SEED_BATCH_SIZE)
+    print(f"Cached {cached:,} posts in {time.perf_counter() - started:.0f}s")
+
+
+def wait_for_search_index(posts_search) -> None:
+    while True:
+        info = posts_search.index.info()
+        if float(info["percent_indexed"]) >= 1 and int(info["indexing"]) == 0:
+            print(f"RediSearch holds {int(info['num_docs']):,} posts")
+            return
+
+        print(f"\rRediSearch has indexed {float(info['percent_indexed']) * 100:.0f}%", end="", flush=True)
+        time.sleep(1)
+
+
+def make_searches(vocabulary: list[str], queries: int, seed: int) -> dict[str, list[dict]]:
+    """
+    :return: Searches by group; the word ranks pick how many posts each one matches
+    """
+    chooser = random.Random(seed)
+    common, mid, rare = vocabulary[:20], vocabulary[200:2000], vocabulary[10_000:]
+
+    return {
+        "common": [{"text": chooser.choice(common)} for _ in range(queries)],
+        "mid": [{"text": chooser.choice(mid)} for _ in range(queries)],
+        "rare": [{"text": chooser.choice(rare)} for _ in range(queries)],
+        "two mid": [{"text": f"{chooser.choice(mid)} {chooser.choice(mid)}"} for _ in range(queries)],
+        "filtered": [
+            {"text": chooser.choice(common), "published": True, "rating_min": 4.0}
+            for _ in range(queries)
+        ],
+    }
+
+
+async def run_searches(searches: dict[str, list[dict]], limit: int) -> list[dict]:
+    from app.database.configs.dbs import get_postgres_async_db_sessionmaker
+    from app.database.repositories.posts_async_repository import PostsAsyncRepository
+    from app.database.repositories.posts_search_repository import PostsSearchRepository
+
+    posts_search = PostsSearchRepository()
+    rows = []
+    async with get_postgres_async_db_sessionmaker()() as postgresdb:
+        posts_repo = PostsAsyncRepository(postgresdb)
+        for group, group_searches in searches.items():
+            latencies = {"redisearch": [], "postgres": []}
+            totals = {"redisearch": [], "postgres": []}
+            overlaps = []
+            for search in group_searches:
+                started = time.perf_counter()
+                redis_res = posts_search.search(limit=limit, **search)
+                latencies["redisearch"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                postgres_res = await posts_repo.search(limit=limit, **search)
+                latencies["postgres"].append(time.perf_counter() - started)
+
+                totals["redisearch"].append(redis_res.meta["total"])
+                totals["postgres"].append(postgres_res.meta["total"])
+                redis_uuids = {post.uuid for post, _ in redis_res.data}
+                postgres_uuids = {str(post.uuid) for post, _ in postgres_res.data}
+                if redis_uuids or postgres_uuids:
+                    overlaps.append(len(redis_uuids & postgres_uuids) / max(len(redis_uuids), len(postgres_uuids)))
+
+            for engine in ("redisearch", "postgres"):
+                rows.append({
+                    "group": group,
+                    "engine": engine,
+                    "p50_ms": statistics.median(latencies[engine]) * 1000,
+                    "p95_ms": statistics.quantiles(latencies[engine], n=20)[18] * 1000,
+                    "matches": statistics.mean(totals[engine]),
+                    "overlap": statistics.mean(overlaps) if overlaps else 0.0,
+                })
+
+    return rows
+
+
+async def benchmark(args: argparse.Namespace) -> list[dict]:
+    from app.database.repositories.posts_search_repository import PostsSearchRepository
+
+    vocabulary = make_vocabulary(VOCABULARY_SIZE)
+    posts_search = PostsSearchRepository()
+    posts_search.create_index()
+    if not args.skip_seed:
+        await seed(args.posts, TextGenerator(vocabulary, args.seed))
+    wait_for_search_index(posts_search)
+
+    searches = make_searches(vocabulary, args.queries, args.seed)
+    # One unmeasured round, so both engines start with warm caches
+    await run_searches({group: group_searches[:5] for group, group_searches in searches.items()}, args.limit)
+
+    return await run_searches(searches, args.limit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000, help="Posts to seed")
+    parser.add_argument("--skip-seed", action="store_true", help="Search the posts already stored and cached")
+    parser.add_argument("--queries", type=int, default=200, help="Searches per group")
+    parser.add_argument("--limit", type=int, default=20, help="Results per search")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the text and the searches, for repeatable runs")
+    args = parser.parse_args()
+
+    rows = asyncio.run(benchmark(args))
+
+    print(f"{'group':>9} {'engine':>11} {'p50 ms':>9} {'p95 ms':>9} {'matches':>10} {'overlap':>8}")
+    for row in rows:
+        print(
+            f"{row['group']:>9} {row['engine']:>11} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+            f"{row['matches']:>10.0f} {row['overlap']:>7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Microbenchmark of the cost of serializing posts into an AppResponse body.
+
+Compares the previous path (a GetPostResponseDataSchema built field by field, dumped to
+a dict, wrapped in an AppResponse, then run through jsonable_encoder and the stdlib json
+encoder) with the current one (the page validated once from the rows with from_attributes,
+serialized by pydantic-core and dumped by orjson, which is what the routes now do).
+
+Run from the client_api directory:
+    python3 -m benchmarks.serialization_benchmark
+    python3 -m benchmarks.serialization_benchmark --sizes 10 1000 100000 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.database.models.CustomerData.PostsModel import PostsModel
+from app.schemas.AppSchemas import AppResponse
+from app.schemas.PostRequestsSchemas import GetPostResponseDataSchema
+
+
+POSTS_PAGE_ADAPTER = TypeAdapter(list[GetPostResponseDataSchema])
+APP_RESPONSE_ADAPTER = TypeAdapter(AppResponse)
+
+
+def make_posts(count: int) -> list[PostsModel]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        PostsModel(
+            id=post_id,
+            uuid=uuid.uuid4(),
+            title=f"Post number {post_id}",
+            content="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            published=post_id % 2 == 0,
+            rating=post_id % 5 + 0.5,
+            created_at=now,
+            updated_at=now,
+            deleted_at=None,
+        )
+        for post_id in range(1, count + 1)
+    ]
+
+
+def field_by_field(posts: list[PostsModel]) -> bytes:
+    data = [
+        GetPostResponseDataSchema(
+            uuid=str(post.uuid),
+            title=post.title,
+            content=post.content,
+            published=post.published,
+            rating=post.rating,
+            created_at=post.created_at,
+            updated_at=post.updated_at,
+            deleted_at=post.deleted_at,
+        ).model_dump()
+        for post in posts
+    ]
+    response = AppResponse(status=True, message="", data=data, errors={}, meta={})
+
+    return json.dumps(jsonable_encoder(response), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def from_attributes(posts: list[PostsModel]) -> bytes:
+    data = POSTS_PAGE_ADAPTER.validate_python(posts, from_attributes=True)
+    response = AppResponse(status=True, message="", data=data, errors={}, meta={})
+
+    return orjson.dumps(APP_RESPONSE_ADAPTER.dump_python(response, mode="json"))
+
+
+def time_per_post(serialize, posts: list[PostsModel], repeat: int) -> float:
+    """
+    :return: The best of repeat runs, in microseconds per post
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize(posts)
+        best = min(best, time.perf_counter() - started)
+
+    return best / len(posts) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'posts':>8} {'field by field us/post':>24} {'from_attributes us/post':>25} {'speedup':>8}")
+    for size in args.sizes:
+        posts = make_posts(size)
+        # Both paths must produce the same document
+        assert json.loads(field_by_field(posts)) == json.loads(from_attributes(posts))
+
+        before = time_per_post(field_by_field, posts, args.repeat)
+        after = time_per_post(from_attributes, posts, args.repeat)
+        print(f"{size:>8} {before:>24.2f} {after:>25.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
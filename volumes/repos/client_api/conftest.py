@@ -0,0 +1,2 @@
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs the Postgres configured in the environment; skipped when it cannot be reached")
@@ -0,0 +1,81 @@
+"""
+The plans of the posts list's statements (PostsAsyncRepository.find_page) must read the
+page's ids from the partial covering indexes of the live posts, with an Index Only Scan
+unless they filter on the title; see benchmarks/index_plans_benchmark.py for the timings.
+
+Needs Postgres with the customerdb migrations applied, as configured in the environment,
+and is skipped when it cannot be reached. Tops the posts table up to POSTS_FOR_PLANS posts
+and vacuums it first: point it at a scratch database.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m pytest -m postgres tests/test_index_plans.py
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from benchmarks.index_plans_benchmark import LIMIT, MIDDLE_CURSOR_SQL, PAGES, check, explain, seed, vacuum
+
+
+pytestmark = pytest.mark.postgres
+
+# Enough posts that the planner would rather not read the whole table
+POSTS_FOR_PLANS = 200_000
+
+
+async def connect_to_postgres() -> None:
+    from app.database.configs.dbs import get_postgres_async_db_engine
+
+    engine = get_postgres_async_db_engine()
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+
+
+async def explain_pages() -> dict[str, dict]:
+    """
+    :return: The EXPLAIN ANALYZE of each page of PAGES, keyed by its name
+    """
+    from app.database.configs.dbs import get_postgres_async_db_engine
+    from app.database.repositories.posts_async_repository import PostsAsyncRepository
+
+    # The primary's engine: the seeded posts are read before a replica could have them
+    engine = get_postgres_async_db_engine()
+    try:
+        async with engine.connect() as connection:
+            posts = (await connection.execute(text("SELECT count(*) FROM posts"))).scalar_one()
+        if posts < POSTS_FOR_PLANS:
+            await seed(engine, POSTS_FOR_PLANS - posts)
+        await vacuum(engine)
+
+        posts_repo = PostsAsyncRepository(None, as_rows=True)
+        explained = {}
+        async with engine.connect() as connection:
+            middle_cursor = tuple((await connection.execute(MIDDLE_CURSOR_SQL)).one())
+            for page, (filters, _, _) in PAGES.items():
+                filters = filters | ({"cursor": middle_cursor} if "cursor" in filters else {})
+                explained[page] = await explain(connection, posts_repo.page_statement(LIMIT, **filters))
+
+        return explained
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def explained_pages() -> dict[str, dict]:
+    try:
+        asyncio.run(asyncio.wait_for(connect_to_postgres(), timeout=5))
+    except (OSError, asyncio.TimeoutError) as e:
+        pytest.skip(f"Postgres cannot be reached: {e!r}")
+
+    return asyncio.run(explain_pages())
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_page_reads_its_ids_from_a_live_posts_index(explained_pages: dict[str, dict], page: str):
+    _, indexes, index_only = PAGES[page]
+    result, failures = check(explained_pages[page], indexes, index_only)
+
+    assert not failures, f"The {page} page's plan {'; '.join(failures)} (index: {result['index']})"
@@ -0,0 +1,146 @@
+"""
+Where the app sends reads and writes once Postgres read replicas are configured:
+ReplicaRoutingSession and ReadYourWrites, through db_read_routes_total and what each read
+finds. Runs against two plain Postgres instances standing in for the replicas; they do
+not replicate, so a post written to the primary is never on them, and whether a read
+sees it shows where the read went. Requests go through httpx's ASGI transport straight
+into app.main:app, with the lifespan; see benchmarks/replicas_benchmark.py for the timings.
+
+Needs the primary, the stand-ins (POSTGRESDB_REPLICA_DSNS, see the benchmark's docstring)
+and Redis as configured in the environment, and is skipped when they cannot be reached.
+Creates a post, and deletes it at the end.
+
+Run from the client_api directory, with the app's environment loaded:
+    python3 -m pytest -m postgres tests/test_replicas.py
+"""
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import text
+from benchmarks.replicas_benchmark import READER, WRITER, client_for, create_stand_in_tables, find_by_title, load_app, routed, routes
+
+
+pytestmark = pytest.mark.postgres
+
+
+async def connect_to_services() -> None:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.database.configs.dbs import get_postgres_async_db_engine, get_redis_cache
+    from config import get_app_env_config
+
+    engines = [get_postgres_async_db_engine()] + [
+        create_async_engine(dsn.get_secret_value().replace("postgresql://", "postgresql+asyncpg://", 1))
+        for dsn in get_app_env_config().POSTGRESDB_REPLICA_DSNS
+    ]
+    try:
+        for engine in engines:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+    finally:
+        for engine in engines:
+            await engine.dispose()
+    get_redis_cache().ping()
+
+
+async def read_routed_to(client: httpx.AsyncClient, title: str) -> tuple[bool, dict[str, float]]:
+    """
+    :return: Whether the client's read finds the post, and the reads routed to each target
+    """
+    before = routes()
+    found = await find_by_title(client, title)
+    return found, routed(before)
+
+
+def only_to(read_routes: dict[str, float], target: str) -> bool:
+    return read_routes[target] > 0 and all(count == 0 for other, count in read_routes.items() if other != target)
+
+
+async def route_reads_and_writes() -> dict[str, tuple[bool, dict[str, float]]]:
+    """
+    :return: For each step, whether its read found the post and where its reads went
+    """
+    app = load_app()
+
+    from app.database.configs.dbs import get_postgres_async_db_replicas
+    from config import get_app_env_config
+
+    app_env_config = get_app_env_config()
+    create_stand_in_tables()
+    steps = {}
+
+    async with app.router.lifespan_context(app), client_for(app, WRITER) as writer, client_for(app, READER) as reader:
+        replica_set = get_postgres_async_db_replicas()
+        await replica_set.check_health()
+
+        title = f"Read your writes {uuid.uuid4()}"
+        steps["not written"] = await read_routed_to(reader, title)
+
+        routes_before = routes()
+        response = await writer.post("/posts/", json={"title": title, "content": "On the primary only.", "rating": 1.0})
+        response.raise_for_status()
+        steps["write"] = (True, routed(routes_before))
+
+        try:
+            steps["writer"] = await read_routed_to(writer, title)
+            steps["other client"] = await read_routed_to(reader, title)
+
+            # Every replica fails its next health check, as if it lagged too far behind
+            max_lag_seconds, replica_set.max_lag_seconds = replica_set.max_lag_seconds, -1.0
+            await replica_set.check_health()
+            steps["no healthy replica"] = await read_routed_to(reader, title)
+            replica_set.max_lag_seconds = max_lag_seconds
+            await replica_set.check_health()
+
+            await asyncio.sleep(app_env_config.POSTGRESDB_REPLICA_STICKY_SECONDS + 0.5)
+            steps["writer after the sticky time"] = await read_routed_to(writer, title)
+        finally:
+            await writer.delete(f"/posts/{response.json()['data']['uuid']}")
+
+    return steps
+
+
+@pytest.fixture(scope="module")
+def steps() -> dict[str, tuple[bool, dict[str, float]]]:
+    from config import get_app_env_config
+
+    if not get_app_env_config().POSTGRESDB_REPLICA_DSNS:
+        pytest.skip("POSTGRESDB_REPLICA_DSNS names no replica stand-ins.")
+    try:
+        asyncio.run(asyncio.wait_for(connect_to_services(), timeout=5))
+    except (OSError, asyncio.TimeoutError) as e:
+        pytest.skip(f"Postgres or Redis cannot be reached: {e!r}")
+
+    return asyncio.run(route_reads_and_writes())
+
+
+def test_reads_of_a_client_that_has_not_written_go_to_a_replica(steps):
+    found, read_routes = steps["not written"]
+    assert only_to(read_routes, "replica"), read_routes
+
+
+def test_writes_go_to_the_primary(steps):
+    # A write is never offered to a replica, so it is not routed as a read
+    _, write_routes = steps["write"]
+    assert sum(write_routes.values()) == 0, write_routes
+
+
+def test_the_writers_reads_stay_on_the_primary(steps):
+    found, read_routes = steps["writer"]
+    assert found and only_to(read_routes, "primary_sticky"), read_routes
+
+
+def test_another_clients_reads_go_to_a_replica(steps):
+    found, read_routes = steps["other client"]
+    assert not found and only_to(read_routes, "replica"), read_routes
+
+
+def test_reads_go_to_the_primary_when_no_replica_is_healthy(steps):
+    found, read_routes = steps["no healthy replica"]
+    assert found and only_to(read_routes, "primary_unhealthy"), read_routes
+
+
+def test_the_writer_reads_a_replica_again_after_the_sticky_time(steps):
+    found, read_routes = steps["writer after the sticky time"]
+    assert not found and only_to(read_routes, "replica"), read_routes